@@ -0,0 +1,65 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from singleflight import SingleFlight
+
+# One thread per pooled reader plus one for the writer, so every in-flight
+# DB call owns a connection and none of them wait on the event loop.
+DB_EXECUTOR_WORKERS = database.READ_POOL_SIZE + 1
+
+_executor = None
+
+# A burst of scans for one uncached ID shares a single SQLite read.
+# (Concurrent registrations of one ID already collapse in write_behind.queue.)
+loads = SingleFlight("load")
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="smartshield-db")
+    return _executor
+
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    """Run a blocking database call on the bounded DB executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def get_merchant(upi_id):
+    # Cache hits are answered inline; only misses pay for the executor hop.
+    cached = database.get_cached_merchant(upi_id)
+    if cached is not None:
+        return None if cached is database.MISSING else cached
+    return await load_merchant(upi_id)
+
+
+async def load_merchant(upi_id):
+    """Read from SQLite, skipping the cache check; concurrent reads of one ID are coalesced."""
+    return await loads.do(upi_id, run_in_db_thread, database.load_merchant, upi_id)
+
+
+async def get_merchants_bulk(upi_ids):
+    return await run_in_db_thread(database.get_merchants_bulk, upi_ids)
+
+
+async def refresh_merchant_filter():
+    return await run_in_db_thread(database.refresh_merchant_filter)
+
+
+async def get_all_merchants():
+    return await run_in_db_thread(database.get_all_merchants)
+
+
+async def search_merchants(**filters):
+    return await run_in_db_thread(database.search_merchants, **filters)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
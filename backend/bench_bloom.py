@@ -0,0 +1,58 @@
+"""Bloom prefilter at scale: build rate, membership checks/sec, memory and observed FPR.
+
+Usage: python bench_bloom.py [--entries 10000000] [--fpr 0.01] [--probes 200000] [--db-rows 200000]
+
+The SQLite column is a pooled point lookup for an unknown ID against a
+--db-rows table: the work the filter saves on a "definitely not known" scan.
+"""
+import argparse
+import time
+
+import database
+from bench_utils import temp_database, synthetic_upi_id
+from bloom import BloomFilter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10_000_000)
+    parser.add_argument("--fpr", type=float, default=0.01)
+    parser.add_argument("--probes", type=int, default=200_000)
+    parser.add_argument("--db-rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    bloom = BloomFilter(args.entries, args.fpr)
+    print(f"📦 {args.entries:,} entries at target FPR {args.fpr}: {bloom.memory_bytes() / 1e6:.1f} MB, "
+          f"{bloom.hash_count} hashes")
+
+    start = time.perf_counter()
+    for i in range(args.entries):
+        bloom.add(synthetic_upi_id(i))
+    build = time.perf_counter() - start
+    print(f"   build:  {args.entries / build:>12,.0f} adds/s ({build:.1f}s)")
+
+    hits = [synthetic_upi_id(i * 7919 % args.entries) for i in range(args.probes)]
+    misses = [f"unknown_{i}@upi" for i in range(args.probes)]
+
+    start = time.perf_counter()
+    assert all(key in bloom for key in hits)
+    hit_rate = args.probes / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    false_positives = sum(key in bloom for key in misses)
+    miss_rate = args.probes / (time.perf_counter() - start)
+    print(f"   hits:   {hit_rate:>12,.0f} checks/s")
+    print(f"   misses: {miss_rate:>12,.0f} checks/s  observed FPR {false_positives / args.probes:.4f} "
+          f"(estimated {bloom.estimated_fpr():.4f})")
+
+    with temp_database(args.db_rows):
+        start = time.perf_counter()
+        for key in misses[:20000]:
+            database.load_merchant(key)
+        sqlite_rate = 20000 / (time.perf_counter() - start)
+    print(f"   sqlite: {sqlite_rate:>12,.0f} unknown lookups/s against {args.db_rows:,} rows "
+          f"({miss_rate / sqlite_rate:.1f}x slower than the filter)")
+
+
+if __name__ == "__main__":
+    main()
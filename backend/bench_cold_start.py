@@ -0,0 +1,94 @@
+"""Cold start to first verdict: spawn a fresh server, time until /scan_qr answers.
+
+Usage: python bench_cold_start.py [--runs 5] [--rows 100000]
+
+Each run starts `uvicorn main:app` in a new interpreter against a seeded
+throwaway DB and polls /scan_qr until the first verdict comes back, once for
+a whitelisted ID and once for an unknown one (which needs the scoring
+engine). The server's own breakdown comes from /startup/stats; the cache
+warm-up runs in the background after the server is ready, so it isn't in it.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_utils import temp_database, synthetic_upi_id
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def cold_start(db_path, qr_text, env_overrides):
+    """(ms from spawn to first verdict, server's /startup/stats timings)."""
+    port = free_port()
+    env = dict(os.environ, SMARTSHIELD_DB=db_path, SMARTSHIELD_SNAPSHOT="", **env_overrides)
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                status, verdict = request(port, "POST", "/scan_qr", {"qr_text": qr_text})
+                break
+            except (ConnectionRefusedError, ConnectionResetError):
+                if server.poll() is not None:
+                    raise SystemExit("❌ Server exited during startup")
+                time.sleep(0.005)
+        first_verdict_ms = (time.perf_counter() - started) * 1000
+        assert status == 200, verdict
+        _, stats = request(port, "GET", "/startup/stats")
+        return first_verdict_ms, stats["timings_ms"]
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with temp_database(args.rows) as db_path:
+        print(f"📊 Median of {args.runs} cold starts, {args.rows} merchants\n")
+        print(f"{'scan':<10} {'model':<9} {'first verdict':>14} {'import':>8} {'startup':>8} {'init_db':>8} {'filter':>8} {'1st req':>8}")
+        for label in ("known", "unknown"):
+            for preload in ("1", "0"):
+                results = []
+                for run in range(args.runs):
+                    # A fresh unknown ID every run: the previous server registered the last one
+                    upi_id = synthetic_upi_id(run) if label == "known" else f"newshop{preload}{run}@ybl"
+                    results.append(cold_start(db_path, f"upi://pay?pa={upi_id}", {"SMARTSHIELD_PRELOAD_MODEL": preload}))
+                median = lambda key: statistics.median(t.get(key, 0) for _, t in results)
+                print(f"{label:<10} {'preload' if preload == '1' else 'lazy':<9} "
+                      f"{statistics.median(ms for ms, _ in results):>12.0f}ms "
+                      f"{median('import'):>6.0f}ms {median('startup'):>6.0f}ms "
+                      f"{median('init_db'):>6.0f}ms {median('load_filter'):>6.0f}ms {median('first_request'):>6.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
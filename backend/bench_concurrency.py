@@ -0,0 +1,61 @@
+"""p50/p99 latency of /scan_qr as the number of concurrent clients grows.
+
+Runs the FastAPI app in-process over httpx's ASGI transport against a temp DB.
+Usage: python bench_concurrency.py [--clients 1 10 50 100] [--requests-per-client 50] [--unknown-ratio 0.2]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+import main
+from bench_utils import temp_database, synthetic_upi_id, percentile
+
+SEED_ROWS = 10000
+
+
+async def client_loop(client, rng, count, latencies, unknown_prefix, unknown_ratio):
+    for i in range(count):
+        if rng.random() >= unknown_ratio:
+            qr_text = synthetic_upi_id(rng.randrange(SEED_ROWS))
+        else:
+            qr_text = f"{unknown_prefix}_{i}@upi"
+        start = time.perf_counter()
+        response = await client.post("/scan_qr", json={"qr_text": qr_text})
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+
+
+async def run_level(clients, per_client, unknown_ratio):
+    latencies = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, random.Random(c), per_client, latencies, f"new_{clients}_{c}", unknown_ratio)
+            for c in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return percentile(latencies, 50), percentile(latencies, 99), len(latencies) / elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--requests-per-client", type=int, default=50)
+    parser.add_argument("--unknown-ratio", type=float, default=0.2,
+                        help="Share of never-seen IDs (each one triggers a registration)")
+    args = parser.parse_args()
+
+    with temp_database(SEED_ROWS):
+        print(f"{'clients':>8} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+        for clients in args.clients:
+            p50, p99, rps = asyncio.run(run_level(clients, args.requests_per_client, args.unknown_ratio))
+            print(f"{clients:>8} {p50:>9.2f} {p99:>9.2f} {rps:>9.0f}")
+
+
+if __name__ == "__main__":
+    main_cli()
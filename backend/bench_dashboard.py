@@ -0,0 +1,124 @@
+"""/stats from incremental counters versus the same numbers aggregated in SQL.
+
+Usage: python bench_dashboard.py [--rows 10000000] [--scans 10000000]
+
+  merchants  dashboard.merchant_stats() (trigger-kept merchant_counts) versus
+             GROUP BY category and list over a merchants table of --rows rows,
+             plus what the triggers cost bulk inserts
+  scans      dashboard top-K (Count-Min sketch + heap) versus GROUP BY upi_id
+             over a table holding --scans scan rows (Zipf-ish popularity):
+             time per query, per recorded scan, and how many of the exact
+             top 20 the sketch found
+Uses a throwaway database; building 10M rows takes a few minutes.
+"""
+import argparse
+import collections
+import random
+import time
+
+import dashboard
+import database
+from bench_utils import temp_database
+
+CATEGORIES = ["Retail", "Food", "Grocery", "Travel", "Finance", "Healthcare", "Fashion", "Electronics",
+              "Telecom", "Utilities", "Phishing", "Job Scam", "Loan Scam", "Uncategorized", "Fraud"]
+CHUNK = 200000
+
+
+def merchant_rows(start, count, rng):
+    for i in range(start, start + count):
+        score = rng.choice((100, 0, 50, 50, 50, 30, 70))
+        yield (f"merchant_{i}@bank", f"Merchant {i}", score, rng.choice(CATEGORIES), 1 if score == 100 else 0)
+
+
+def fill_merchants(rows, rng):
+    started = time.perf_counter()
+    with database.get_pool().writer() as conn:
+        for start in range(0, rows, CHUNK):
+            conn.executemany(database.SQL_ADD_MERCHANT, merchant_rows(start, min(CHUNK, rows - start), rng))
+    return time.perf_counter() - started
+
+
+def insert_rate(with_triggers, count, rng):
+    """Rows/s bulk-inserting into the full schema (indexes, search index), with or without the stats triggers."""
+    with temp_database():
+        if not with_triggers:
+            with database.get_pool().writer() as conn:
+                for event in ("insert", "update", "delete"):
+                    conn.execute(f"DROP TRIGGER merchants_stats_{event}")
+        return count / fill_merchants(count, rng)
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def sql_merchant_stats():
+    with database.get_pool().reader() as conn:
+        return conn.execute(f"SELECT category, {database._list_of('merchants')}, COUNT(*) FROM merchants "
+                            f"GROUP BY 1, 2").fetchall()
+
+
+def scan_stream(count, rng):
+    popularity = [1 / (rank + 1) for rank in range(100000)]
+    ids = rng.choices(range(len(popularity)), popularity, k=count)
+    return [f"merchant_{i}@bank" for i in ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--scans", type=int, default=10000000)
+    args = parser.parse_args()
+    rng = random.Random(23)
+
+    plain = insert_rate(False, CHUNK, rng)
+    triggered = insert_rate(True, CHUNK, rng)
+    print(f"📊 Bulk insert: {plain:,.0f} rows/s without the stats triggers, {triggered:,.0f} with "
+          f"({(1 - triggered / plain) * 100:.0f}% fewer)\n")
+
+    with temp_database():
+        seconds = fill_merchants(args.rows, rng)
+        print(f"Seeded {args.rows:,} merchants in {seconds:.0f}s")
+        counters_s, stats = best_of(dashboard.merchant_stats, 20)
+        sql_s, rows = best_of(sql_merchant_stats, 3)
+        assert stats["total"] == sum(row[2] for row in rows)
+        print(f"{'merchants by category/list':<30} {'counters ms':>12} {'GROUP BY ms':>12}")
+        print(f"{'':<30} {counters_s * 1000:>12.2f} {sql_s * 1000:>12.0f}  ({sql_s / counters_s:,.0f}x)\n")
+
+        stream = scan_stream(args.scans, rng)
+        tracker = dashboard.ScanTracker()
+        started = time.perf_counter()
+        for upi_id in stream:
+            tracker.record(upi_id, "SAFE", "whitelist", "Retail")
+        record_us = (time.perf_counter() - started) / len(stream) * 1e6
+
+        with database.get_pool().writer() as conn:
+            conn.execute("CREATE TABLE scans (upi_id TEXT NOT NULL)")
+            for start in range(0, len(stream), CHUNK):
+                conn.executemany("INSERT INTO scans VALUES (?)", ((u,) for u in stream[start:start + CHUNK]))
+
+        def sql_top():
+            with database.get_pool().reader() as conn:
+                return conn.execute("SELECT upi_id, COUNT(*) FROM scans GROUP BY upi_id "
+                                    "ORDER BY 2 DESC LIMIT ?", (dashboard.TOP_K,)).fetchall()
+        report_s, report = best_of(tracker.report, 20)
+        sql_s, exact = best_of(sql_top, 3)
+        found = {row["upi_id"] for row in report["top_scanned"]} & {row[0] for row in exact}
+        counts = collections.Counter(stream)
+        overcount = max(row["scans"] - counts[row["upi_id"]] for row in report["top_scanned"])
+        print(f"{'top ' + str(dashboard.TOP_K) + ' scanned of ' + format(args.scans, ','):<30} "
+              f"{'sketch ms':>12} {'GROUP BY ms':>12}")
+        print(f"{'':<30} {report_s * 1000:>12.2f} {sql_s * 1000:>12.0f}  ({sql_s / report_s:,.0f}x)")
+        print(f"\nrecord(): {record_us:.2f} µs/scan; sketch found {len(found)}/{len(exact)} of the exact top "
+              f"{dashboard.TOP_K}, overcounting by at most {overcount}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Lookups/sec: legacy connect-per-call vs the pooled connection layer (and the cache on top),
+then write-behind flush throughput.
+
+Usage: python bench_db.py [--rows 20000] [--lookups 20000] [--threads 1 4 8] [--inserts 50000]
+
+The flush section times add_merchants_bulk (multi-row INSERT ... RETURNING)
+in write-behind sized batches against one INSERT per row, for new IDs and
+for a batch of IDs that already exist.
+"""
+import argparse
+import concurrent.futures
+import random
+import sqlite3
+import time
+
+import database
+import write_behind
+from bench_utils import temp_database, synthetic_upi_id
+
+
+def legacy_get_merchant(upi_id):
+    # The pre-pool implementation: new connection for every lookup.
+    conn = sqlite3.connect(database.DB_NAME)
+    conn.row_factory = sqlite3.Row
+    merchant = conn.execute('SELECT * FROM merchants WHERE upi_id = ?', (upi_id,)).fetchone()
+    conn.close()
+    return merchant
+
+
+def run(lookup, keys, threads):
+    start = time.perf_counter()
+    if threads == 1:
+        for key in keys:
+            lookup(key)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lookup, keys, chunksize=256))
+    return len(keys) / (time.perf_counter() - start)
+
+
+def per_row_insert(merchants):
+    # One execute per row in one transaction: what a flush costs without the multi-row statement
+    with database.get_pool().writer() as conn:
+        return sum(conn.execute(database.SQL_REGISTER_MERCHANT, tuple(m.values())).rowcount for m in merchants)
+
+
+def flush_rate(insert, merchants, batch_size):
+    start = time.perf_counter()
+    inserted = 0
+    for i in range(0, len(merchants), batch_size):
+        inserted += insert(merchants[i:i + batch_size])
+    return len(merchants) / (time.perf_counter() - start), inserted
+
+
+def new_merchants(prefix, count):
+    return [{"upi_id": f"{prefix}_{i}@ybl", "legal_name": "Unknown Merchant", "trust_score": 50,
+             "category": "Uncategorized", "is_verified": 0} for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--inserts", type=int, default=50000)
+    args = parser.parse_args()
+
+    with temp_database(args.rows):
+        rng = random.Random(42)
+        # 90% hits, 10% misses, like a mostly-known scan mix
+        keys = [
+            synthetic_upi_id(rng.randrange(args.rows)) if rng.random() < 0.9 else f"unknown_{i}@upi"
+            for i in range(args.lookups)
+        ]
+
+        print(f"📊 {args.lookups} lookups against {args.rows} merchants\n")
+        print(f"{'threads':>8} {'legacy/s':>12} {'pooled/s':>12} {'speedup':>8} {'cached/s':>12}")
+        for threads in args.threads:
+            legacy = run(legacy_get_merchant, keys, threads)
+            pooled = run(database.load_merchant, keys, threads)
+            database.merchant_cache.clear()
+            cached = run(database.get_merchant, keys, threads)
+            print(f"{threads:>8} {legacy:>12.0f} {pooled:>12.0f} {pooled / legacy:>7.1f}x {cached:>12.0f}")
+
+        batch = write_behind.FLUSH_BATCH_SIZE
+        print(f"\n📊 Write-behind flush: {args.inserts} rows in batches of {batch}\n")
+        print(f"{'rows':<10} {'per-row/s':>12} {'bulk/s':>12} {'speedup':>8}")
+        # "existing" re-sends the IDs the "new" pass inserted, so every row hits the conflict
+        for label in ("new", "existing"):
+            per_row, _ = flush_rate(per_row_insert, new_merchants("per_row", args.inserts), batch)
+            bulk, inserted = flush_rate(database.add_merchants_bulk, new_merchants("bulk", args.inserts), batch)
+            assert inserted == (args.inserts if label == "new" else 0)
+            print(f"{label:<10} {per_row:>12.0f} {bulk:>12.0f} {bulk / per_row:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
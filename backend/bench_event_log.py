@@ -0,0 +1,106 @@
+"""Scan event log: ingest rate, compaction, and time-range query speed (JSON lines vs Parquet).
+
+Usage: python bench_event_log.py [--events 2000000] [--segment-mb 16]
+
+  record    cost of EventLog.record() on the request path
+  write     background writer throughput (serialize + append + rotate)
+  compact   closed segments -> zstd Parquet, and the size of each
+  query     scans per status/source over the whole day and over its last
+            hour, from the raw segments and from the Parquet files
+Events are spread over one synthetic day. Needs pyarrow for the Parquet half.
+"""
+import argparse
+import glob
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import event_log
+
+STATUSES = [("SAFE", 100, "whitelist"), ("FRAUD", 0, "blacklist"), ("SAFE", 50, "graylist"),
+            ("FRAUD", 0, "heuristic"), ("SAFE", 50, "heuristic")]
+LOOKUPS = ["cache", "snapshot", "db", "filter"]
+DAY = 86400
+
+
+def synthetic_events(count, day_start):
+    rng = random.Random(7)
+    step = DAY / count
+    for i in range(count):
+        status, score, source = rng.choice(STATUSES)
+        yield (round(day_start + i * step, 3), f"merchant_{rng.randrange(count // 10)}@bank", status, score,
+               source, rng.choice(LOOKUPS), rng.randint(20, 2000))
+
+
+def directory_mb(directory, pattern):
+    return sum(os.path.getsize(path) for path in glob.glob(os.path.join(directory, pattern))) / 1e6
+
+
+def timed_query(directory, start, end):
+    started = time.perf_counter()
+    rows = event_log.query(start, end, by=("status", "source"), directory=directory)
+    seconds = time.perf_counter() - started
+    scanned = sum(row["scans"] for row in rows)
+    return seconds, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2000000)
+    parser.add_argument("--segment-mb", type=int, default=16)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp(prefix="smartshield_events_")
+    try:
+        # The writer thread's interval is never reached: batches are flushed by hand below
+        log = event_log.EventLog(tmp_dir, segment_bytes=args.segment_mb * 1024 * 1024, segment_seconds=DAY * 2,
+                                 interval=3600)
+
+        count = 200000
+        started = time.perf_counter_ns()
+        for i in range(count):
+            log.record("merchant_1@bank", "SAFE", 100, "whitelist", "cache", 42)
+        print(f"📊 record():  {(time.perf_counter_ns() - started) / count:>8.0f} ns/event on the request path")
+        log._pending.clear()
+
+        day_start = time.time() - DAY
+        events = list(synthetic_events(args.events, day_start))
+        started = time.perf_counter()
+        for offset in range(0, len(events), 50000):  # About one FLUSH_INTERVAL's worth at ~100k scans/s
+            log._pending.extend(events[offset:offset + 50000])
+            log.flush()
+        log.stop()
+        seconds = time.perf_counter() - started
+        raw_mb = directory_mb(tmp_dir, "*.jsonl")
+        print(f"📝 write:     {args.events / seconds:>10,.0f} events/s, {log.segments} segments, {raw_mb:.1f} MB")
+
+        day = (day_start, day_start + DAY)
+        hour = (day_start + DAY - 3600, day_start + DAY)
+        raw = {name: timed_query(tmp_dir, *span) for name, span in (("day", day), ("hour", hour))}
+
+        try:
+            started = time.perf_counter()
+            event_log.compact(tmp_dir)
+        except RuntimeError as e:
+            print(f"\n⚠️  {e}; skipping compaction and Parquet queries")
+            parquet = None
+        else:
+            seconds = time.perf_counter() - started
+            parquet_mb = directory_mb(tmp_dir, "*.parquet")
+            print(f"📦 compact:   {args.events / seconds:>10,.0f} events/s, {parquet_mb:.1f} MB "
+                  f"({raw_mb / parquet_mb:.1f}x smaller)")
+            parquet = {name: timed_query(tmp_dir, *span) for name, span in (("day", day), ("hour", hour))}
+
+        print(f"\n{'query (status, source)':<24} {'events':>10} {'jsonl s':>9} {'parquet s':>10} {'Mevents/s':>10}")
+        for name in ("day", "hour"):
+            raw_seconds, scanned = raw[name]
+            parquet_seconds = parquet[name][0] if parquet else float("nan")
+            rate = scanned / parquet_seconds / 1e6 if parquet else scanned / raw_seconds / 1e6
+            print(f"{'last ' + name:<24} {scanned:>10,} {raw_seconds:>9.2f} {parquet_seconds:>10.3f} {rate:>10.1f}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Keyword heuristic: old per-keyword substring loop vs the compiled KeywordEngine.
+
+Usage: python bench_keywords.py [--patterns 10 1000 5000] [--iterations 2000]
+"""
+import argparse
+import random
+import string
+import time
+
+from keywords import DEFAULT_KEYWORDS, KeywordEngine
+
+SAMPLE_TEXTS = [
+    "upi://pay?pa=starbucks@bank&pn=tata%20starbucks&am=250.00",
+    "random_person@okicici",
+    "upi://pay?pa=lottery_winner@upi&pn=kbc",
+    "shop_12@paytm",
+]
+
+
+def linear_scan(keywords, text):
+    # The original scan_qr loop (every keyword, full text each time)
+    return [k for k in keywords if k in text]
+
+
+def time_it(fn, texts, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(texts[i % len(texts)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patterns", type=int, nargs="+", default=[10, 1000, 5000])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    large = "a" * 1_000_000
+    print(f"{'patterns':>9} {'compile ms':>11} {'loop µs':>9} {'engine µs':>10} {'1MB loop ms':>12} {'1MB engine ms':>14}")
+    for count in args.patterns:
+        keywords = list(DEFAULT_KEYWORDS)
+        while len(keywords) < count:
+            keywords.append("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))))
+
+        start = time.perf_counter()
+        engine = KeywordEngine((k, 1.0) for k in keywords)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        loop_us = time_it(lambda t: linear_scan(keywords, t), SAMPLE_TEXTS, args.iterations)
+        engine_us = time_it(engine.scan, SAMPLE_TEXTS, args.iterations)
+        loop_large = time_it(lambda t: linear_scan(keywords, t), [large], 3) / 1000
+        engine_large = time_it(engine.scan, [large], 3) / 1000
+        print(f"{count:>9} {compile_ms:>11.1f} {loop_us:>9.1f} {engine_us:>10.1f} {loop_large:>12.1f} {engine_large:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Live threat feed fan-out: publish cost and delivery latency with thousands of SSE subscribers.
+
+Usage: python bench_live_feed.py [--subscribers 5000] [--slow 250] [--events 500] [--rate 200] [--flush-ms 50]
+
+  publish   time FeedHub.publish() takes on the request path (encode + queue)
+  flush     fan-outs, and the client task wake-ups they cost; --flush-ms 0
+            fans every event out on its own, for comparison
+  latency   publish -> chunk handed to the client's response, per delivery
+            (p50/p99/max), read the way main.py streams it: one task per
+            subscriber iterating FeedHub.stream()
+  slow      --slow of the subscribers take 0.5s per write; their buffers stay
+            bounded and the drops arrive as "lagged" events, while the fast
+            subscribers' latency is unaffected
+Runs the hub in-process, without HTTP, so it measures the fan-out itself.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import live_feed
+from bench_utils import percentile
+
+SLOW_WRITE_SECONDS = 0.5
+
+
+async def consume(hub, chunks, slow):
+    """Stands in for the response writer: keeps each chunk with its arrival time, parsed afterwards."""
+    async for chunk in hub.stream(heartbeat=3600):
+        chunks.append((time.perf_counter(), chunk))
+        if slow:
+            await asyncio.sleep(SLOW_WRITE_SECONDS)
+
+
+def delivered(chunks, sent):
+    """Per-event latencies and "lagged" counts from what one subscriber received."""
+    latencies, lagged = [], []
+    for received, chunk in chunks:
+        event_id = None
+        for line in chunk.split(b"\n"):
+            if line.startswith(b"id: "):
+                event_id = int(line[4:])
+            elif line.startswith(b"data: "):
+                if event_id is None:
+                    lagged.append(json.loads(line[6:])["missed"])
+                else:
+                    latencies.append(received - sent[event_id])
+                event_id = None
+    return latencies, lagged
+
+
+async def run(args):
+    hub = live_feed.FeedHub(max_subscribers=args.subscribers, flush_seconds=args.flush_ms / 1000.0)
+    received = [[] for _ in range(args.subscribers)]
+    tasks = [asyncio.ensure_future(consume(hub, received[i], i < args.slow)) for i in range(args.subscribers)]
+    while len(hub.subscribers) < args.subscribers:
+        await asyncio.sleep(0.01)
+
+    publish_s, sent = [], {}
+    peak_pending = 0
+    interval = 1.0 / args.rate
+    started = time.perf_counter()
+    i = 0
+    while i < args.events:
+        # Every event due by now, as scans arriving at a steady rate would publish them
+        while i < args.events and started + i * interval <= time.perf_counter():
+            before = time.perf_counter()
+            event_id = hub.publish("threat", {"upi_id": f"scam_{i}@ybl", "score": 0,
+                                              "message": "New Threat Detected", "ts": round(time.time(), 3)})
+            publish_s.append(time.perf_counter() - before)
+            sent[event_id] = before
+            i += 1
+        peak_pending = max(peak_pending, max(len(s.pending) for s in hub.subscribers))
+        await asyncio.sleep(max(0.0, started + i * interval - time.perf_counter()))
+    await asyncio.sleep(SLOW_WRITE_SECONDS * 3)
+    elapsed = time.perf_counter() - started
+    stats = hub.stats()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = {"fast": [], "slow": []}
+    lagged = {"fast": [], "slow": []}
+    for i, chunks in enumerate(received):
+        group = "slow" if i < args.slow else "fast"
+        got, missed = delivered(chunks, sent)
+        latencies[group].extend(got)
+        lagged[group].extend(missed)
+    return publish_s, latencies, lagged, peak_pending, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--slow", type=int, default=250)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=200, help="Events published per second")
+    parser.add_argument("--flush-ms", type=float, default=live_feed.FLUSH_SECONDS * 1000)
+    args = parser.parse_args()
+
+    publish_s, latencies, lagged, peak_pending, elapsed, stats = asyncio.run(run(args))
+    publish_s.sort()
+    counts = {"fast": args.subscribers - args.slow, "slow": args.slow}
+    print(f"📡 {args.events:,} events at {args.rate:,.0f}/s to {args.subscribers:,} subscribers "
+          f"({args.slow:,} slow) in {elapsed:.1f}s: {stats['delivered']:,} deliveries queued")
+    print(f"publish():   p50 {percentile(publish_s, 50) * 1e6:.1f} µs  p99 {percentile(publish_s, 99) * 1e6:.1f} µs; "
+          f"{stats['flushes']:,} flushes (delay {args.flush_ms:g} ms) woke clients {stats['flushes'] * args.subscribers:,} times")
+    print(f"{'latency ms':<12} {'p50':>8} {'p99':>8} {'max':>8} {'received':>22} {'dropped':>12} {'lagged':>8}")
+    for group, got in latencies.items():
+        if not counts[group]:
+            continue
+        got.sort()
+        print(f"{group:<12} {percentile(got, 50) * 1e3:>8.2f} {percentile(got, 99) * 1e3:>8.2f} "
+              f"{got[-1] * 1e3 if got else 0:>8.2f} {len(got):>11,}/{counts[group] * args.events:<10,} "
+              f"{sum(lagged[group]):>12,} {len(lagged[group]):>8,}")
+    print(f"\nDropped events reach the client as one \"lagged\" event per drain; largest buffer seen "
+          f"{peak_pending} (cap {live_feed.BUFFER_EVENTS})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Lookalike query latency against the number of verified merchants.
+
+Usage: python bench_lookalike.py [--sizes 1000 10000 100000 300000] [--queries 5000]
+
+Verified handles are random pronounceable names. Half the queries are
+one-edit typos or homoglyph swaps of a verified handle (should match), half
+are unrelated handles (they still hit more often as the synthetic namespace
+gets crowded: short random names are often one edit apart). A naive scan (edit distance to every
+verified handle) is timed on a few queries for comparison.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import lookalike
+from bench_utils import percentile
+
+SYLLABLES = [c + v for c in "bcdfghjkmnprstvwyz" for v in "aeiou"] + ["kart", "pay", "mart", "shop", "tech"]
+PSPS = ["upi", "ybl", "okaxis", "okhdfcbank", "paytm", "icici"]
+HOMOGLYPH_SWAPS = {"o": "0", "l": "1", "e": "\u0435", "a": "\u0430", "s": "\u0455", "m": "rn"}  # Cyrillic е, а, ѕ
+
+
+def random_handle(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5)))
+
+
+def typo(rng, handle):
+    i = rng.randrange(len(handle))
+    kind = rng.choice(["delete", "insert", "substitute", "swap", "homoglyph"])
+    if kind == "delete":
+        return handle[:i] + handle[i + 1:]
+    if kind == "insert":
+        return handle[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + handle[i:]
+    if kind == "substitute":
+        return handle[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + handle[i + 1:]
+    if kind == "swap" and i < len(handle) - 1:
+        return handle[:i] + handle[i + 1] + handle[i] + handle[i + 2:]
+    swappable = [j for j, c in enumerate(handle) if c in HOMOGLYPH_SWAPS]
+    if not swappable:
+        return handle + "s"
+    j = rng.choice(swappable)
+    return handle[:j] + HOMOGLYPH_SWAPS[handle[j]] + handle[j + 1:]
+
+
+def naive_match(verified, upi_id, max_distance):
+    handle = lookalike.normalize(lookalike.split_vpa(upi_id)[0])
+    for other in verified:
+        other_handle = lookalike.normalize(lookalike.split_vpa(other)[0])
+        if lookalike.osa_distance(handle, other_handle, max_distance) <= max_distance:
+            return other
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 300000])
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'verified':>9} {'build s':>8} {'MB':>7} {'p50 µs':>8} {'p99 µs':>8} {'typos hit':>10} "
+          f"{'others hit':>11} {'naive µs':>10}")
+    for size in args.sizes:
+        rng = random.Random(size)
+        verified = list(dict.fromkeys(f"{random_handle(rng)}@{rng.choice(PSPS)}" for _ in range(size)))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = lookalike.LookalikeIndex()
+        index.rebuild(enumerate(verified, 1))
+        build_seconds = time.perf_counter() - start
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+
+        queries = []
+        for i in range(args.queries):
+            if i % 2 == 0:
+                handle = lookalike.split_vpa(rng.choice(verified))[0]
+                queries.append((f"{typo(rng, handle)}@{rng.choice(PSPS)}", True))
+            else:
+                queries.append((f"{random_handle(rng)}@ybl", False))
+
+        latencies = []
+        hits = {True: 0, False: 0}
+        for upi_id, is_typo in queries:
+            start = time.perf_counter()
+            match = index.match(upi_id)
+            latencies.append((time.perf_counter() - start) * 1e6)
+            hits[is_typo] += match is not None
+        latencies.sort()
+
+        sample = queries[:max(1, min(20, 2_000_000 // size))]
+        start = time.perf_counter()
+        for upi_id, _ in sample:
+            naive_match(verified, upi_id, index.max_distance)
+        naive_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+        half = args.queries / 2
+        print(f"{len(verified):>9} {build_seconds:>8.2f} {memory_mb:>7.1f} {percentile(latencies, 50):>8.1f} "
+              f"{percentile(latencies, 99):>8.1f} {hits[True] / half:>10.1%} {hits[False] / half:>11.1%} "
+              f"{naive_us:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
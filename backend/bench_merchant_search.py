@@ -0,0 +1,62 @@
+"""/merchants query latency as the table grows: first page, deep keyset page,
+filters, and substring search (FTS5 trigram) vs the old LIMIT-50-then-filter approach.
+
+Usage: python bench_merchant_search.py [--sizes 10000 100000 1000000] [--repeat 20]
+"""
+import argparse
+import random
+import time
+
+import database
+from bench_utils import temp_database
+
+CATEGORIES = ["Retail", "Food", "Travel", "Fraud", "Uncategorized", "Finance"]
+BRANDS = ["starbucks", "amazon", "flipkart", "zomato", "swiggy", "uber", "kirana", "pharmacy"]
+
+
+def grow_table(current, target, rng):
+    with database.get_pool().writer() as conn:
+        for start in range(current, target, 50000):
+            rows = []
+            for i in range(start, min(target, start + 50000)):
+                brand = rng.choice(BRANDS)
+                score = rng.choice([0, 50, 50, 50, 90, 100])
+                rows.append((f"{brand}_{i}@{rng.choice(['upi', 'ybl', 'paytm'])}", f"{brand.title()} Outlet {i}",
+                             score, rng.choice(CATEGORIES), 1 if score >= 90 else 0))
+            conn.executemany(database.SQL_REGISTER_MERCHANT, rows)
+
+
+def time_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    with temp_database():
+        rows = 0
+        print(f"{'rows':>9} {'page 1':>8} {'page 50':>8} {'filter':>8} {'search':>8} {'short q':>8}   (ms)")
+        for size in args.sizes:
+            grow_table(rows, size, rng)
+            rows = size
+
+            first, page = time_ms(lambda: database.search_merchants(limit=50), args.repeat)
+            cursor = page["next_cursor"]
+            for _ in range(48):
+                cursor = database.search_merchants(limit=50, cursor=cursor)["next_cursor"]
+            deep, _ = time_ms(lambda: database.search_merchants(limit=50, cursor=cursor), args.repeat)
+            filtered, _ = time_ms(lambda: database.search_merchants(limit=50, max_score=0, category="Fraud"), args.repeat)
+            search, _ = time_ms(lambda: database.search_merchants(limit=50, query=f"_{size - 7}@"), args.repeat)
+            short, _ = time_ms(lambda: database.search_merchants(limit=50, query="st"), args.repeat)
+            print(f"{size:>9} {first:>8.2f} {deep:>8.2f} {filtered:>8.2f} {search:>8.2f} {short:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Memory under a flood of oversized /scan_qr requests.
+
+Streams bodies larger than the limit (chunked, no Content-Length, plus a set
+with an honest Content-Length) through the in-process app and samples Python
+heap usage and peak RSS as the flood goes on. With the limit in place both
+should stay flat.
+Usage: python bench_payload_limits.py [--requests 2000] [--body-kb 1024]
+"""
+import argparse
+import asyncio
+import resource
+import time
+import tracemalloc
+
+import httpx
+
+import limits
+import main
+from bench_utils import temp_database
+
+CHUNK = b"A" * 16384
+
+
+async def chunked_body(size):
+    yield b'{"qr_text": "'
+    sent = 0
+    while sent < size:
+        yield CHUNK  # Same object every time, so the client side stays flat too
+        sent += len(CHUNK)
+    yield b'"}'
+
+
+async def flood(requests, body_bytes):
+    transport = httpx.ASGITransport(app=main.app)
+    statuses = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sized_body = b'{"qr_text": "' + b"A" * body_bytes + b'"}'
+        print(f"{'requests':>9} {'heap MB':>9} {'peak heap MB':>13} {'max RSS MB':>11}")
+        start = time.perf_counter()
+        for i in range(1, requests + 1):
+            if i % 2:
+                content = chunked_body(body_bytes)
+            else:
+                content = sized_body
+            response = await client.post("/scan_qr", content=content, headers={"content-type": "application/json"})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if i % max(1, requests // 5) == 0:
+                current, peak = tracemalloc.get_traced_memory()
+                rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                print(f"{i:>9} {current / 1e6:>9.2f} {peak / 1e6:>13.2f} {rss:>11.1f}")
+        elapsed = time.perf_counter() - start
+    print(f"\nStatuses: {statuses}  ({requests / elapsed:.0f} req/s)")
+    print(f"Quarantine: {limits.quarantine.stats()}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--body-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    with temp_database():
+        tracemalloc.start()
+        asyncio.run(flood(args.requests, args.body_kb * 1024))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,75 @@
+"""Per-request overhead of the rate limiter, and how cheaply over-limit requests are shed.
+
+Usage: python bench_ratelimit.py [--requests 200000] [--clients 10000]
+
+Measures Budget.take() on the memory and SQLite stores, then the whole
+RateLimitMiddleware around a no-op ASGI app: admitted requests versus no
+middleware at all, and requests it sheds with a 429.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import ratelimit
+
+
+def take_ns(budget, clients, count):
+    keys = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(clients)]
+    start = time.perf_counter_ns()
+    for i in range(count):
+        budget.take(keys[i % clients])
+    return (time.perf_counter_ns() - start) / count
+
+
+async def noop_app(scope, receive, send):
+    pass
+
+
+async def drain(message):
+    pass
+
+
+def asgi_ns(app, clients, count):
+    scopes = [{"type": "http", "path": "/scan_qr", "headers": [], "client": (f"10.1.{i // 256}.{i % 256}", 0)}
+              for i in range(clients)]
+
+    async def run():
+        start = time.perf_counter_ns()
+        for i in range(count):
+            await app(dict(scopes[i % clients]), None, drain)
+        return (time.perf_counter_ns() - start) / count
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=10000)
+    args = parser.parse_args()
+    unlimited = 1e12  # Rate high enough that every request is admitted
+
+    print(f"📊 {args.requests} requests over {args.clients} clients\n")
+    memory = ratelimit.Budget("scan", unlimited, unlimited, ratelimit.MemoryStore())
+    print(f"take(), memory store:     {take_ns(memory, args.clients, args.requests):>8.0f} ns")
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_store = ratelimit.SQLiteStore(os.path.join(tmp, "ratelimit.db"))
+        shared = ratelimit.Budget("scan", unlimited, unlimited, sqlite_store)
+        count = max(1, args.requests // 20)  # Each take is a write transaction
+        print(f"take(), sqlite store:     {take_ns(shared, args.clients, count):>8.0f} ns")
+
+    bare = asgi_ns(noop_app, args.clients, args.requests)
+    admitted = ratelimit.RateLimitMiddleware(
+        noop_app, budget=ratelimit.Budget("scan", unlimited, unlimited, ratelimit.MemoryStore()))
+    shedding = ratelimit.RateLimitMiddleware(
+        noop_app, budget=ratelimit.Budget("scan", 1e-9, 1, ratelimit.MemoryStore()))
+    asgi_ns(shedding, args.clients, args.clients)  # Spend every client's one token first
+    admitted_ns = asgi_ns(admitted, args.clients, args.requests)
+    print(f"\nno middleware:            {bare:>8.0f} ns/request")
+    print(f"middleware, admitted:     {admitted_ns:>8.0f} ns/request  (+{admitted_ns - bare:.0f} ns)")
+    print(f"middleware, shed (429):   {asgi_ns(shedding, args.clients, args.requests // 10):>8.0f} ns/request")
+
+
+if __name__ == "__main__":
+    main()
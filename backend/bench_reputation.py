@@ -0,0 +1,117 @@
+"""Replay synthetic scan/report events through the reputation engine.
+
+Usage: python bench_reputation.py [--events 100000000] [--merchants 200000] [--batch-events 1000000]
+
+Events follow a Zipf popularity curve over --merchants reputation-managed
+merchants and are spread over --days of simulated time. Each batch is
+coalesced per merchant (as ReputationBuffer does) and applied with one
+apply_reputation_deltas call. At the end, a few merchants' stored counters
+are checked against a full recomputation from their event history.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import database
+import reputation
+import write_behind
+from bench_utils import temp_database, synthetic_upi_id
+
+SAMPLE_MERCHANTS = (0, 1, 10, 1000)
+
+
+def seed_managed_merchants(count):
+    rows = ((synthetic_upi_id(i), f"Shop {i}", 50, "Uncategorized", 0) for i in range(count))
+    with database.get_pool().writer() as conn:
+        conn.executemany(database.SQL_ADD_MERCHANT, rows)
+
+
+def buffer_record_rate(events=1_000_000):
+    """Cost of ReputationBuffer.record() on the request path (flushes are no-ops here)."""
+    buffer = write_behind.ReputationBuffer(flush_fn=lambda deltas, now: 0, interval=3600, max_ids=10**9)
+    ids = [synthetic_upi_id(i % 5000) for i in range(events)]
+    start = time.perf_counter()
+    for upi_id in ids:
+        buffer.record(upi_id, "scan")
+    elapsed = time.perf_counter() - start
+    buffer.stop()
+    return events / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], epilog=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000_000)
+    parser.add_argument("--merchants", type=int, default=200_000)
+    parser.add_argument("--batch-events", type=int, default=1_000_000, help="Events per flush window")
+    parser.add_argument("--days", type=float, default=90, help="Simulated time the events span")
+    parser.add_argument("--zipf", type=float, default=1.2)
+    parser.add_argument("--fraud-report-rate", type=float, default=0.002)
+    parser.add_argument("--safe-report-rate", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    batches = max(1, args.events // args.batch_events)
+    start_time = time.time()
+    step = args.days * 86400 / batches
+    history = {i: [] for i in SAMPLE_MERCHANTS}  # merchant -> [(time, scans, fraud, safe)]
+
+    print(f"🔁 Replaying {batches * args.batch_events:,} events over {args.merchants:,} merchants "
+          f"in {batches} batches of {args.batch_events:,}\n")
+    with temp_database():
+        seed_managed_merchants(args.merchants)
+        generate_s = apply_s = 0.0
+        applied_rows = rescored = 0
+        for b in range(batches):
+            now = start_time + (b + 1) * step
+
+            t0 = time.perf_counter()
+            ids = (rng.zipf(args.zipf, args.batch_events) - 1) % args.merchants
+            kinds = rng.random(args.batch_events)
+            fraud = kinds < args.fraud_report_rate
+            safe = (kinds >= args.fraud_report_rate) & (kinds < args.fraud_report_rate + args.safe_report_rate)
+            scan_counts = np.bincount(ids[~(fraud | safe)], minlength=args.merchants)
+            fraud_counts = np.bincount(ids[fraud], minlength=args.merchants)
+            safe_counts = np.bincount(ids[safe], minlength=args.merchants)
+            touched = np.flatnonzero(scan_counts + fraud_counts + safe_counts)
+            deltas = [(synthetic_upi_id(i), float(scan_counts[i]), float(fraud_counts[i]), float(safe_counts[i]))
+                      for i in touched.tolist()]
+            for i in SAMPLE_MERCHANTS:
+                history[i].append((now, scan_counts[i], fraud_counts[i], safe_counts[i]))
+            t1 = time.perf_counter()
+
+            rescored += database.apply_reputation_deltas(deltas, now)
+            t2 = time.perf_counter()
+            generate_s += t1 - t0
+            apply_s += t2 - t1
+            applied_rows += len(deltas)
+            if (b + 1) % max(1, batches // 10) == 0:
+                done = (b + 1) * args.batch_events
+                print(f"   {done:>13,} events  {done / (generate_s + apply_s):>12,.0f} events/s  "
+                      f"{applied_rows / apply_s:>10,.0f} merchant updates/s")
+
+        total = batches * args.batch_events
+        print(f"\n✅ {total:,} events in {generate_s + apply_s:.1f}s "
+              f"(generate+coalesce {generate_s:.1f}s, apply {apply_s:.1f}s)")
+        print(f"   {total / (generate_s + apply_s):,.0f} events/s end to end, {applied_rows:,} merchant updates, "
+              f"{rescored:,} score changes")
+
+        # Incremental state must match a from-scratch recomputation over the full history
+        end = start_time + batches * step
+        for i in SAMPLE_MERCHANTS:
+            expected = [sum(c[k] * reputation.decay_factor(end - t) for t, *c in history[i]) for k in range(3)]
+            state = database.get_reputation(synthetic_upi_id(i), end)
+            if state is None:
+                continue
+            actual = [state["scans"], state["fraud_reports"], state["safe_reports"]]
+            assert np.allclose(actual, expected, rtol=1e-6), (i, actual, expected)
+            print(f"   merchant {i:>5}: score {state['score']:>2}  counters {', '.join(f'{v:,.1f}' for v in actual)} "
+                  f"(matches full recompute)")
+
+    print(f"\n⏱️  ReputationBuffer.record(): {buffer_record_rate():,.0f} events/s on the request path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Throughput and latency of serve.py from 1 to N worker processes.
+
+Usage: python bench_scaling.py [--workers 1 2 4 8] [--clients 4] [--concurrency 32] [--duration 10]
+
+For each worker count a fresh serve.py is started on a seeded temp DB and
+driven by --clients parallel stress_test.py processes (closed loop), so the
+load generator isn't the single-core bottleneck. Their histograms are
+merged; speedup is relative to the first worker count.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_utils import LatencyHistogram, UNLIMITED_ENV, temp_database
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/cache/stats", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise SystemExit(f"❌ serve.py did not start at {url}")
+
+
+def run_level(workers, args, db_path, out_dir):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, "serve.py", "--port", str(port), "--workers", str(workers)],
+                              cwd=HERE, env=dict(os.environ, SMARTSHIELD_DB=db_path, **UNLIMITED_ENV), stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(url)
+        outputs = [os.path.join(out_dir, f"w{workers}_c{i}.json") for i in range(args.clients)]
+        clients = [
+            subprocess.Popen([sys.executable, "stress_test.py", "--url", url, "--mode", "closed",
+                              "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+                              "--warmup", str(args.warmup), "--mix", args.mix, "--seed", str(1000 * workers + i),
+                              "--output", output], cwd=HERE, stdout=subprocess.DEVNULL)
+            for i, output in enumerate(outputs)
+        ]
+        for client in clients:
+            client.wait()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    hist = LatencyHistogram()
+    rps = 0.0
+    errors = 0
+    for output in outputs:
+        with open(output) as f:
+            results = json.load(f)
+        hist.merge(LatencyHistogram.from_dict(results["histogram"]))
+        rps += results["throughput_rps"]
+        errors += round(results["error_rate"] * results["requests"])
+    return {"workers": workers, "throughput_rps": rps, "errors": errors,
+            "latency_ms": hist.summary_ms(), "histogram": hist.to_dict()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0], epilog=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Connections per load generator")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--mix", default="known_safe=0.6,known_fraud=0.1,unknown_clean=0.2,unknown_suspicious=0.1")
+    parser.add_argument("--seed-rows", type=int, default=20000)
+    parser.add_argument("--output", help="Write all levels as JSON here")
+    args = parser.parse_args()
+
+    print(f"📈 Scaling serve.py over {args.workers} workers ({os.cpu_count()} CPUs), "
+          f"{args.clients}x{args.concurrency} closed-loop clients, {args.duration:.0f}s each\n")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'errors':>7}")
+    levels = []
+    with temp_database(args.seed_rows) as db_path, tempfile.TemporaryDirectory() as out_dir:
+        for workers in args.workers:
+            level = run_level(workers, args, db_path, out_dir)
+            levels.append(level)
+            lat = level["latency_ms"]
+            speedup = level["throughput_rps"] / levels[0]["throughput_rps"]
+            print(f"{workers:>8} {level['throughput_rps']:>10.0f} {speedup:>7.2f}x {lat['p50']:>8.2f} "
+                  f"{lat['p99']:>8.2f} {lat['p99_9']:>9.2f} {level['errors']:>7}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "levels": levels}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Scoring engines: throughput vs batch size, and micro-batcher tail latency under load.
+
+Usage: python bench_scoring.py [--model scoring_model.npz] [--rate 2000 8000] [--duration 3]
+
+Without a model artifact a small one is trained in memory first.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import scoring
+import train_model
+from bench_utils import LatencyHistogram
+
+BATCH_SIZES = (1, 4, 16, 64, 256, 1024)
+
+
+def load_model(path):
+    if os.path.exists(path):
+        return scoring.NgramScorer(path)
+    print(f"ℹ️  {path} not found; training a throwaway model...")
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".bench_scoring_model.npz")
+    examples = train_model.synthetic_examples(10000, random.Random(1))
+    weights, bias = train_model.train([u for u, _ in examples], [l for _, l in examples], epochs=100)
+    import numpy as np
+    np.savez(tmp_path, weights=weights, bias=bias, hash_dim=train_model.HASH_DIM,
+             ngram_range=np.asarray(train_model.NGRAM_RANGE), threshold=0.8, version=np.asarray("bench"))
+    try:
+        return scoring.NgramScorer(tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+
+def throughput(engine, ids, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(ids), batch_size):
+        chunk = ids[i:i + batch_size]
+        engine.score_many(chunk, chunk)
+    return len(ids) / (time.perf_counter() - start)
+
+
+async def open_loop(engine, ids, rate, duration, max_size, window):
+    """Poisson arrivals at `rate`/s, each awaiting its score through a MicroBatcher."""
+    batcher = scoring.MicroBatcher(engine.score_many, max_size=max_size, window=window)
+    hist = LatencyHistogram()
+    rng = random.Random(3)
+    tasks = []
+
+    async def one(upi_id):
+        start = time.perf_counter()
+        await batcher.score(upi_id, upi_id)
+        hist.record((time.perf_counter() - start) * 1e6)
+
+    end = time.perf_counter() + duration
+    next_at = time.perf_counter()
+    i = 0
+    while next_at < end:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(ids[i % len(ids)])))
+        i += 1
+        next_at += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return hist, batcher.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=scoring.MODEL_FILE)
+    parser.add_argument("--ids", type=int, default=20000)
+    parser.add_argument("--rate", type=float, nargs="+", default=[2000, 8000])
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    ids = [u for u, _ in train_model.synthetic_examples(args.ids, random.Random(2))]
+    engines = [scoring.KeywordScorer(), model]
+
+    print(f"📊 Throughput (IDs/s) by batch size, {len(ids):,} IDs\n")
+    print(f"{'batch':>6} " + " ".join(f"{e.name:>14}" for e in engines))
+    for batch_size in BATCH_SIZES:
+        print(f"{batch_size:>6} " + " ".join(f"{throughput(e, ids, batch_size):>14,.0f}" for e in engines))
+
+    print(f"\n⏱️  {model.name} through the micro-batcher (open loop, {args.duration:.0f}s per row)\n")
+    print(f"{'rate/s':>8} {'max':>5} {'window':>7} {'mean batch':>11} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9}")
+    for rate in args.rate:
+        for max_size, window in ((1, 0.0), (64, 0.0), (64, 0.001), (64, 0.002), (256, 0.005)):
+            hist, stats = asyncio.run(open_loop(model, ids, rate, args.duration, max_size, window))
+            s = hist.summary_ms()
+            print(f"{rate:>8.0f} {max_size:>5} {window * 1000:>5.0f}ms {stats['mean_batch_size']:>11.1f} "
+                  f"{s['p50']:>8.2f} {s['p99']:>8.2f} {s['p99_9']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Thundering herd: 500 concurrent clients on one ID, with and without single-flight.
+
+Usage: python bench_singleflight.py [--clients 500] [--rounds 5] [--model scoring_model.npz]
+
+Two herds per round, each on an ID no earlier round has used:
+  lookup    every client reads the same known-but-uncached ID
+  scan      every client POSTs the same new QR to /scan_qr (ASGI, in-process);
+            scoring is only coalesced for batched engines, so pass --model
+Reported: SQLite reads or scoring passes actually run, and latency.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import async_db
+import database
+import main
+import scoring
+from bench_utils import temp_database, synthetic_upi_id, percentile
+
+SEED_ROWS = 10000
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def herd(clients, make_call):
+    results = await asyncio.gather(*(timed(make_call()) for _ in range(clients)))
+    latencies = sorted(ms for _, ms in results)
+    return [result for result, _ in results], percentile(latencies, 50), percentile(latencies, 99)
+
+
+async def lookup_herd(clients, round_id):
+    upi_id = synthetic_upi_id(round_id)
+    database.merchant_cache.invalidate(upi_id)
+    results, p50, p99 = await herd(clients, lambda: async_db.get_merchant(upi_id))
+    assert all(result and result["upi_id"] == upi_id for result in results)
+    return p50, p99
+
+
+async def scan_herd(clients, round_id, http):
+    qr_text = f"upi://pay?pa=viral_scan_{round_id}@ybl"
+    results, p50, p99 = await herd(clients, lambda: http.post("/scan_qr", json={"qr_text": qr_text}))
+    assert all(response.status_code == 200 for response in results)
+    return p50, p99
+
+
+async def run(clients, rounds, enabled):
+    for group in main.FLIGHT_GROUPS:
+        group.enabled = enabled
+        group.calls = group.shared = 0
+    rows = {"lookup": [], "scan": []}
+    transport = httpx.ASGITransport(app=main.app)
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits) as http:
+        for r in range(rounds):
+            offset = r + (0 if enabled else rounds)  # Never reuse an ID across the two passes
+            rows["lookup"].append(await lookup_herd(clients, offset))
+            rows["scan"].append(await scan_herd(clients, offset, http))
+    work = {
+        "lookup": async_db.loads.calls,
+        # Unbatched engines score inline on every request, with nothing to coalesce
+        "scan": scoring.flights.calls if scoring.engine.batched else clients * rounds,
+    }
+    return {name: (work[name] / rounds, max(p for p, _ in results), max(p for _, p in results))
+            for name, results in rows.items()}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--model", help="Scoring model artifact (train_model.py) to exercise batched scoring")
+    args = parser.parse_args()
+
+    scoring.engine = scoring.load_engine("auto" if args.model else "keywords", args.model or scoring.MODEL_FILE)
+    with temp_database(SEED_ROWS):
+        print(f"📊 {args.clients} concurrent clients per herd, {args.rounds} rounds, engine {scoring.engine.name}\n")
+        print(f"{'herd':<10} {'coalescing':<11} {'work/herd':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        for enabled in (False, True):
+            for name, (work, p50, p99) in asyncio.run(run(args.clients, args.rounds, enabled)).items():
+                print(f"{name:<10} {'on' if enabled else 'off':<11} {work:>10.1f} {p50:>9.2f} {p99:>9.2f}")
+        print("\nwork/herd = SQLite reads (lookup) or scoring calls (scan) "
+              "actually run per herd of concurrent clients.")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,54 @@
+"""Point lookups/sec: memory-mapped snapshot vs pooled SQLite vs the merchant cache.
+
+Usage: python bench_snapshot.py [--rows 200000] [--lookups 50000]
+"""
+import argparse
+import os
+import random
+import time
+
+import database
+import snapshot
+from bench_utils import temp_database, synthetic_upi_id
+
+
+def run(lookup, keys):
+    start = time.perf_counter()
+    for key in keys:
+        lookup(key)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=50000)
+    args = parser.parse_args()
+
+    with temp_database(args.rows) as db_path:
+        snapshot_path = os.path.join(os.path.dirname(db_path), "bench.snapshot")
+        start = time.perf_counter()
+        snapshot.build_snapshot(db_path, snapshot_path)
+        build_seconds = time.perf_counter() - start
+        mapped = snapshot.Snapshot(snapshot_path)
+
+        rng = random.Random(42)
+        keys = [
+            synthetic_upi_id(rng.randrange(args.rows)) if rng.random() < 0.9 else f"unknown_{i}@upi"
+            for i in range(args.lookups)
+        ]
+        for key in keys[:1000]:
+            assert mapped.get(key) == database.load_merchant(key), key
+
+        print(f"📊 {args.lookups} lookups against {args.rows} merchants "
+              f"(snapshot: {os.path.getsize(snapshot_path) / 1e6:.1f} MB, built in {build_seconds:.2f}s)\n")
+        print(f"{'snapshot/s':>12} {'pooled/s':>12} {'cached/s':>12}")
+        mapped_rate = run(mapped.get, keys)
+        pooled_rate = run(database.load_merchant, keys)
+        database.merchant_cache.clear()
+        cached_rate = run(database.get_merchant, keys)
+        print(f"{mapped_rate:>12.0f} {pooled_rate:>12.0f} {cached_rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""/sync/trust_list: full list versus delta cost and size, and what an unchanged list costs.
+
+Usage: python bench_trust_sync.py [--rows 1000000] [--listed 20000] [--changes 10000]
+
+  full      the whole blacklist + whitelist (--listed of --rows merchants):
+            query + encode time, raw JSON and gzipped size
+  delta     after --changes list changes, the body for a client 10, 100,
+            ... versions behind: time (uncached) and size against the full
+            list's
+  cached    the same request again, from the per-version body cache
+  304       If-None-Match with the current version
+Uses a throwaway database.
+"""
+import argparse
+import random
+import time
+
+import database
+import trust_sync
+from bench_utils import temp_database
+
+CHUNK = 200000
+
+
+def merchant_rows(start, count, listed_every):
+    for i in range(start, start + count):
+        score = (100 if i % 2 else 0) if i % listed_every == 0 else 50
+        yield (f"merchant_{i}@bank", f"Merchant {i}", score, "Retail", 1 if score == 100 else 0)
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def build(since):
+    version, full, rows = database.get_trust_list(since)
+    return trust_sync.encode(version, full, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--listed", type=int, default=20000)
+    parser.add_argument("--changes", type=int, default=10000)
+    args = parser.parse_args()
+    rng = random.Random(25)
+    listed_every = max(1, args.rows // args.listed)
+
+    with temp_database():
+        started = time.perf_counter()
+        with database.get_pool().writer() as conn:
+            for start in range(0, args.rows, CHUNK):
+                conn.executemany(database.SQL_ADD_MERCHANT,
+                                 merchant_rows(start, min(CHUNK, args.rows - start), listed_every))
+        listed = len(database.get_trust_list()[2])
+        print(f"Seeded {args.rows:,} merchants ({listed:,} listed) in {time.perf_counter() - started:.0f}s")
+
+        full_s, (full_body, full_raw) = best_of(lambda: build(None), 5)
+        print(f"{'full list':<26} {full_s * 1000:>9.1f} ms  {full_raw / 1e3:>9.1f} KB raw  "
+              f"{len(full_body) / 1e3:>8.1f} KB gzip ({full_raw / len(full_body):.1f}x)\n")
+
+        # Blacklist, whitelist, or unlist random listed merchants (and list some new ones)
+        with database.get_pool().writer() as conn:
+            for _ in range(args.changes):
+                i = rng.randrange(0, args.rows, listed_every) + rng.choice((0, 0, 0, 1))
+                conn.execute("UPDATE merchants SET trust_score = ? WHERE upi_id = ?",
+                             (rng.choice((0, 100, 50)), f"merchant_{i}@bank"))
+        version = database.get_trust_list_version()[0]
+
+        print(f"{'versions behind':<26} {'delta ms':>9} {'gzip KB':>12} {'of full':>9}")
+        behind = 10
+        while behind < version:
+            delta_s, (body, _) = best_of(lambda: build(version - behind), 5)
+            print(f"{behind:<26,} {delta_s * 1000:>9.2f} {len(body) / 1e3:>12.2f} "
+                  f"{len(body) / len(full_body) * 100:>8.1f}%")
+            behind *= 10
+
+        sync = trust_sync.TrustListSync()
+        sync.get(version - 100)
+        cached_s, _ = best_of(lambda: sync.get(version - 100), 1000)
+        unchanged_s, _ = best_of(lambda: sync.get(version - 100, trust_sync.etag(version)), 1000)
+        print(f"\ncached delta: {cached_s * 1e6:.0f} µs; unchanged (304): {unchanged_s * 1e6:.0f} µs, no body")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Micro-benchmark: upi_parser.parse vs a urllib.parse-based equivalent.
+
+Usage: python bench_upi_parser.py [--iterations 200000]
+"""
+import argparse
+import time
+from urllib.parse import urlsplit, parse_qs
+
+import upi_parser
+
+SAMPLES = [
+    "starbucks@bank",
+    "upi://scam@ybl",
+    "upi://pay?pa=starbucks@bank&pn=Tata%20Starbucks&am=250.00&cu=INR",
+    "upi://pay?pa=amazon%40upi&pn=Amazon+Pay&tn=Order%2012345&mc=5411&tr=TXN8812",
+    "'; DROP TABLE merchants; --",
+]
+
+
+def urllib_parse(text):
+    # Straightforward stdlib version, for comparison
+    parts = urlsplit(text.strip())
+    if parts.scheme.lower() != "upi":
+        return upi_parser.canonical_vpa(text)
+    params = {k.lower(): v[0] for k, v in parse_qs(parts.query).items()}
+    pa = params.get("pa") or parts.netloc
+    return upi_parser.canonical_vpa(pa) if pa else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'input':<48} {'parse ns':>9} {'urllib ns':>10}")
+    for sample in SAMPLES:
+        timings = []
+        for fn in (upi_parser.parse, urllib_parse):
+            start = time.perf_counter_ns()
+            for _ in range(args.iterations):
+                fn(sample)
+            timings.append((time.perf_counter_ns() - start) / args.iterations)
+        label = sample if len(sample) <= 45 else sample[:42] + "..."
+        print(f"{label:<48} {timings[0]:>9.0f} {timings[1]:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
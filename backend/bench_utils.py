@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import database
+import event_log
+import ratelimit
+import snapshot
+import write_behind
+
+# Load generators send everything from one client, which the per-client rate
+# limits would otherwise throttle; pass this to servers the benchmarks spawn
+UNLIMITED_ENV = {"SMARTSHIELD_RATE_LIMIT": "0", "SMARTSHIELD_REGISTER_RATE_PER_MIN": "0",
+                 "SMARTSHIELD_REPORT_RATE_PER_MIN": "0", "SMARTSHIELD_REPORT_REPEAT_HOURS": "0"}
+
+
+@contextmanager
+def temp_database(merchant_count=0):
+    """Point `database` (and the scan event log) at throwaway files so benchmarks never touch smartshield.db."""
+    tmp_dir = tempfile.mkdtemp(prefix="smartshield_bench_")
+    original = database.DB_NAME
+    database.DB_NAME = os.path.join(tmp_dir, "bench.db")
+    events_dir = event_log.log.directory
+    event_log.log.directory = os.path.join(tmp_dir, "scan_events")
+    snapshot_path = snapshot.store.path
+    snapshot.store.use(None)  # A published snapshot describes the real DB, not this one
+    budgets = [(budget, budget.rate) for budget in ratelimit.BUDGETS]
+    for budget, _ in budgets:
+        budget.rate = 0  # Same for in-process benchmarks (see UNLIMITED_ENV)
+    try:
+        database.init_db()
+        if merchant_count:
+            seed_synthetic_merchants(merchant_count)
+        yield database.DB_NAME
+    finally:
+        write_behind.queue.stop()
+        write_behind.reputation_events.stop()
+        event_log.log.stop()
+        event_log.log.directory = events_dir
+        database.close_pool()
+        database.DB_NAME = original
+        snapshot.store.use(snapshot_path)
+        for budget, rate in budgets:
+            budget.rate = rate
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def synthetic_upi_id(i):
+    return f"merchant_{i}@bank"
+
+
+def seed_synthetic_merchants(count):
+    rows = (
+        (synthetic_upi_id(i), f"Merchant {i}", 100 if i % 10 else 0, "Retail", 1 if i % 10 else 0)
+        for i in range(count)
+    )
+    with database.get_pool().writer() as conn:
+        conn.executemany(database.SQL_ADD_MERCHANT, rows)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already-sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of microsecond latencies.
+
+    Exact below 128µs, then 64 sub-buckets per power of two (<1.6% relative
+    error) up to any value, in a few KB. Mergeable and JSON-serializable so
+    runs can be recorded and compared later.
+    """
+
+    LINEAR_LIMIT = 128
+    SUB_BUCKETS = 64
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value):
+        if value < cls.LINEAR_LIMIT:
+            return value
+        shift = value.bit_length() - 7
+        return shift * cls.SUB_BUCKETS + (value >> shift)
+
+    @classmethod
+    def _value(cls, index):
+        if index < cls.LINEAR_LIMIT:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        mantissa = index - shift * cls.SUB_BUCKETS
+        return (mantissa << shift) + (1 << shift) // 2  # Midpoint of the bucket
+
+    def record(self, micros):
+        value = max(0, int(micros))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0
+        target = max(1, int(round(pct / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def buckets(self):
+        """[(bucket value in µs, count)] in ascending order."""
+        return [(self._value(index), self.counts[index]) for index in sorted(self.counts)]
+
+    def summary_ms(self):
+        return {
+            "count": self.count,
+            "min": (self.min or 0) / 1000,
+            "mean": self.mean() / 1000,
+            **{f"p{p}".replace(".", "_"): self.percentile(p) / 1000 for p in (50, 90, 99, 99.9)},
+            "max": self.max / 1000,
+        }
+
+    def to_dict(self):
+        return {"counts": {str(k): v for k, v in self.counts.items()}, "count": self.count,
+                "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.counts = {int(k): v for k, v in data["counts"].items()}
+        hist.count, hist.total, hist.min, hist.max = data["count"], data["total"], data["min"], data["max"]
+        return hist
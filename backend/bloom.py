@@ -0,0 +1,148 @@
+"""Bloom filters over the merchants table, so a scan can learn that an ID is
+"definitely not known" without a trip to SQLite.
+
+Two filters are kept: one for blacklisted rows (trust_score == 0) and one for
+everything else. An ID in neither filter is certainly not in the table (as of
+the last refresh); an ID in either still goes to the cache/SQLite for the row.
+Bloom filters can't forget, so deleted or re-scored rows only cost a false
+positive, never a wrong answer.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+
+FILTER_FPR = float(os.environ.get("SMARTSHIELD_FILTER_FPR", "0.01"))
+# Rows inserted by other processes become visible to the filter after at most this long
+FILTER_REFRESH_INTERVAL = float(os.environ.get("SMARTSHIELD_FILTER_REFRESH", "1.0"))
+MIN_CAPACITY = 100000
+GROWTH_FACTOR = 2  # Headroom over the current row count when sizing a rebuild
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter with double hashing over a 128-bit blake2b digest."""
+
+    def __init__(self, capacity, fpr=FILTER_FPR):
+        self.capacity = max(1, capacity)
+        self.fpr = fpr
+        self.bit_count = max(8, math.ceil(-self.capacity * math.log(fpr) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / self.capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.bit_count
+        return [(h1 + i * h2) % m for i in range(self.hash_count)]
+
+    def add(self, key):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def memory_bytes(self):
+        return len(self.bits)
+
+    def estimated_fpr(self):
+        """False-positive rate at the current fill, (1 - e^(-kn/m))^k."""
+        return (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+
+class MerchantFilter:
+    """Blacklist and known-good filters plus the rowid high-water mark they cover."""
+
+    def __init__(self, fpr=FILTER_FPR):
+        self.fpr = fpr
+        self._lock = threading.Lock()
+        self.fraud = None
+        self.known = None
+        self.max_rowid = 0
+        self._next_refresh = 0.0
+        self.definitely_unknown = 0
+        self.maybe_known = 0
+
+    @property
+    def loaded(self):
+        return self.known is not None
+
+    def rebuild(self, rows, known_count, fraud_count):
+        """Replace both filters from (rowid, upi_id, trust_score) rows, sized from the row counts."""
+        fraud = BloomFilter(max(MIN_CAPACITY, fraud_count * GROWTH_FACTOR), self.fpr)
+        known = BloomFilter(max(MIN_CAPACITY, known_count * GROWTH_FACTOR), self.fpr)
+        max_rowid = 0
+        for rowid, upi_id, trust_score in rows:
+            (fraud if trust_score == 0 else known).add(upi_id)
+            max_rowid = max(max_rowid, rowid)
+        with self._lock:
+            self.fraud, self.known, self.max_rowid = fraud, known, max_rowid
+
+    def add(self, upi_id, trust_score, rowid=None):
+        """Record an inserted row. No-op until the filters have been built."""
+        with self._lock:
+            if self.known is None:
+                return
+            (self.fraud if trust_score == 0 else self.known).add(upi_id)
+            if rowid is not None:
+                self.max_rowid = max(self.max_rowid, rowid)
+
+    def refresh_due(self):
+        """True at most once per FILTER_REFRESH_INTERVAL; the caller then pulls newer rows."""
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return False
+        self._next_refresh = now + FILTER_REFRESH_INTERVAL
+        return True
+
+    def needs_rebuild(self):
+        """True once either filter holds more than it was sized for (its FPR climbs past target)."""
+        known, fraud = self.known, self.fraud
+        return known is not None and (known.count > known.capacity or fraud.count > fraud.capacity)
+
+    def might_contain(self, upi_id):
+        """False means the ID is definitely not in the table; None means the filter isn't built."""
+        known, fraud = self.known, self.fraud
+        if known is None:
+            return None
+        if upi_id in fraud or upi_id in known:
+            self.maybe_known += 1
+            return True
+        self.definitely_unknown += 1
+        return False
+
+    def might_be_fraud(self, upi_id):
+        fraud = self.fraud
+        return None if fraud is None else upi_id in fraud
+
+    def reset(self):
+        with self._lock:
+            self.fraud = self.known = None
+            self.max_rowid = 0
+            self._next_refresh = 0.0
+
+    def stats(self):
+        known, fraud = self.known, self.fraud
+        if known is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "target_fpr": self.fpr,
+            "memory_bytes": known.memory_bytes() + fraud.memory_bytes(),
+            "max_rowid": self.max_rowid,
+            "definitely_unknown": self.definitely_unknown,
+            "maybe_known": self.maybe_known,
+            "known": {"entries": known.count, "capacity": known.capacity, "hash_count": known.hash_count,
+                      "memory_bytes": known.memory_bytes(), "estimated_fpr": known.estimated_fpr()},
+            "fraud": {"entries": fraud.count, "capacity": fraud.capacity, "hash_count": fraud.hash_count,
+                      "memory_bytes": fraud.memory_bytes(), "estimated_fpr": fraud.estimated_fpr()},
+        }
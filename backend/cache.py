@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Sized for the hot set of merchants; tune with the counters from stats().
+CACHE_MAX_ENTRIES = int(os.environ.get("SMARTSHIELD_CACHE_SIZE", "100000"))
+CACHE_TTL = float(os.environ.get("SMARTSHIELD_CACHE_TTL", "300"))
+NEGATIVE_CACHE_TTL = float(os.environ.get("SMARTSHIELD_NEGATIVE_CACHE_TTL", "60"))
+
+# Stored for IDs the database confirmed are not present.
+MISSING = object()
+
+
+class MerchantCache:
+    """Size-bounded LRU with per-entry TTL and negative caching."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # upi_id -> (expires_at, merchant dict or MISSING)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, upi_id):
+        """Return the cached merchant, MISSING for a cached "not present", or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(upi_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[upi_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(upi_id)
+            if value is MISSING:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, upi_id, merchant):
+        self._store(upi_id, merchant, self.ttl)
+
+    def put_missing(self, upi_id):
+        self._store(upi_id, MISSING, self.negative_ttl)
+
+    def _store(self, upi_id, value, ttl):
+        with self._lock:
+            self._entries[upi_id] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(upi_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, upi_id):
+        with self._lock:
+            self._entries.pop(upi_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,352 @@
+"""Dashboard statistics for /stats, kept up to date incrementally so a request
+costs the same whatever the size of the merchants table.
+
+  merchants  merchant_counts / merchant_days in SQLite, maintained by triggers
+             on merchants (database.MERCHANT_STATS_SCHEMA): every writer,
+             add_merchant, ingest.py, reputation rescoring or the serve.py
+             writer process, updates them in the row's own transaction, and
+             /stats reads a few dozen rows instead of GROUP BY over the table
+  scans      counted in memory by scan_qr: scans and blocks (FRAUD verdicts)
+             per UTC day, per verdict source and per category, plus the most
+             scanned and most blocked IDs from a Count-Min sketch feeding a
+             top-K heap. Input with no valid VPA is only counted, in one
+             "invalid" total, so free text never reaches the top-K lists
+
+Every PERSIST_INTERVAL each process saves its scan state to scan_stats (through
+the writer in serve.py) and reloads the others', so a restart keeps its
+history and every worker reports the sum, with other processes' scans at most
+one interval late. Sketches of several processes add up: a top ID's count is
+the sum of each process's estimate. bench_dashboard.py compares /stats with
+the equivalent SQL aggregations.
+"""
+import heapq
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+from array import array
+from datetime import date, datetime, timezone
+
+import database
+import writer
+
+PERSIST_INTERVAL = float(os.environ.get("SMARTSHIELD_STATS_PERSIST_INTERVAL", "10"))
+TOP_K = int(os.environ.get("SMARTSHIELD_STATS_TOP_K", "20"))
+# Overcount per ID is at most e/width of all scans (with probability 1 - e^-depth)
+SKETCH_WIDTH = int(os.environ.get("SMARTSHIELD_STATS_SKETCH_WIDTH", "16384"))
+SKETCH_DEPTH = 4
+KEEP_DAYS = 30
+REPORT_DAYS = 7
+DAY = 86400
+HASH_SEED = 0x9E3779B9
+
+
+class CountMinSketch:
+    """depth x width counters; an estimate is never below the true count."""
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("q", bytes(8 * width)) for _ in range(depth)]
+
+    def positions(self, key):
+        """One counter per row, by double hashing two seeded CRCs (stable across processes, unlike hash())."""
+        data = key.encode("utf-8")
+        h1 = zlib.crc32(data)
+        h2 = zlib.crc32(data, HASH_SEED) | 1
+        width = self.width
+        return [(h1 + i * h2) % width for i in range(self.depth)]
+
+    def add(self, positions, count=1):
+        """Count a key (by its positions) and return its new estimate."""
+        estimate = None
+        for row, pos in zip(self.rows, positions):
+            value = row[pos] + count
+            row[pos] = value
+            if estimate is None or value < estimate:
+                estimate = value
+        return estimate
+
+    def estimate(self, positions):
+        return min(row[pos] for row, pos in zip(self.rows, positions))
+
+    def to_bytes(self):
+        return b"".join(row.tobytes() for row in self.rows)
+
+    @classmethod
+    def from_bytes(cls, data, width, depth):
+        sketch = cls(width, depth)
+        size = 8 * width
+        for i, row in enumerate(sketch.rows):
+            row[:] = array("q", data[i * size:(i + 1) * size])
+        return sketch
+
+
+class TopK:
+    """The k keys with the highest sketch estimates, via a min-heap.
+
+    Heap entries go stale when a tracked key's count moves on; they are
+    skipped when they surface and the heap is rebuilt once it holds 4k.
+    """
+
+    def __init__(self, k=TOP_K, sketch=None):
+        self.k = k
+        self.sketch = sketch or CountMinSketch()
+        self.top = {}    # key -> estimate
+        self._heap = []  # (estimate, key), possibly stale
+
+    def add(self, key, positions, count=1):
+        estimate = self.sketch.add(positions, count)
+        top = self.top
+        if key in top:
+            top[key] = estimate
+        elif len(top) < self.k:
+            top[key] = estimate
+        else:
+            floor, floor_key = self._floor()
+            if estimate <= floor:
+                return
+            heapq.heappop(self._heap)
+            del top[floor_key]
+            top[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(estimate, key) for key, estimate in top.items()]
+            heapq.heapify(self._heap)
+
+    def _floor(self):
+        heap, top = self._heap, self.top
+        while heap[0][0] != top.get(heap[0][1]):
+            heapq.heappop(heap)
+        return heap[0]
+
+
+class ScanStats:
+    """One process's scan counters and top-K sketches."""
+
+    def __init__(self, k=TOP_K, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.days = {}        # UTC day number -> [scans, blocked]
+        self.sources = {}     # whitelist/blacklist/graylist/heuristic -> [scans, blocked]
+        self.categories = {}  # merchant category -> [scans, blocked]
+        self.invalid = [0, 0]  # Scans of input with no valid VPA: [scans, blocked]
+        self.scanned = TopK(k, CountMinSketch(width, depth))
+        self.blocked = TopK(k, CountMinSketch(width, depth))
+
+    def record(self, upi_id, status, source, category, now=None):
+        """Count one scan. `upi_id` is the parsed VPA; None (unparseable input) skips the top-K."""
+        blocked = status == "FRAUD"
+        day = int((time.time() if now is None else now) // DAY)
+        counts = self.days.get(day)
+        if counts is None:
+            counts = self.days[day] = [0, 0]
+            for old in [d for d in self.days if d <= day - KEEP_DAYS]:
+                del self.days[old]
+        by_source = self.sources.get(source) or self.sources.setdefault(source, [0, 0])
+        by_category = self.categories.get(category) or self.categories.setdefault(category, [0, 0])
+        for totals in (counts, by_source, by_category):
+            totals[0] += 1
+            totals[1] += blocked
+        if upi_id is None:
+            self.invalid[0] += 1
+            self.invalid[1] += blocked
+            return
+        positions = self.scanned.sketch.positions(upi_id)
+        self.scanned.add(upi_id, positions)
+        if blocked:
+            self.blocked.add(upi_id, positions)
+
+    def to_bytes(self):
+        # dict() copies are atomic under the GIL, so scans recorded meanwhile can't break the dump
+        header = json.dumps({
+            "days": dict(self.days), "sources": dict(self.sources), "categories": dict(self.categories),
+            "invalid": list(self.invalid), "scanned": dict(self.scanned.top), "blocked": dict(self.blocked.top),
+            "width": self.scanned.sketch.width, "depth": self.scanned.sketch.depth,
+        }).encode()
+        body = self.scanned.sketch.to_bytes() + self.blocked.sketch.to_bytes()
+        return zlib.compress(struct.pack("<I", len(header)) + header + body, 1)
+
+    @classmethod
+    def from_bytes(cls, data, k=TOP_K):
+        data = zlib.decompress(data)
+        (header_length,) = struct.unpack_from("<I", data)
+        header = json.loads(data[4:4 + header_length])
+        width, depth = header["width"], header["depth"]
+        stats = cls(k, width, depth)
+        stats.days = {int(day): counts for day, counts in header["days"].items()}
+        stats.sources = header["sources"]
+        stats.categories = header["categories"]
+        stats.invalid = header.get("invalid", [0, 0])  # Absent in state saved by older builds
+        body = data[4 + header_length:]
+        half = 8 * width * depth
+        for top, key, chunk in ((stats.scanned, "scanned", body[:half]), (stats.blocked, "blocked", body[half:])):
+            top.sketch = CountMinSketch.from_bytes(chunk, width, depth)
+            for upi_id, estimate in header[key].items():
+                top.top[upi_id] = estimate
+                top._heap.append((estimate, upi_id))
+            heapq.heapify(top._heap)
+        return stats
+
+
+def process_name():
+    """Key this process's scan stats are saved under; stable across restarts of the same worker."""
+    worker = writer.stats().get("worker_id", "main")
+    return f"{socket.gethostname()}:{worker}"
+
+
+def _merge_counts(dicts):
+    merged = {}
+    for counts in dicts:
+        for key, (scans, blocked) in counts.items():
+            total = merged.setdefault(key, [0, 0])
+            total[0] += scans
+            total[1] += blocked
+    return merged
+
+
+def _top(all_stats, attr, k):
+    """Union of every process's top keys, counted as the sum of each process's estimate."""
+    candidates = set()
+    for stats in all_stats:
+        candidates.update(getattr(stats, attr).top)
+    totals = []
+    for upi_id in candidates:
+        positions = {}  # Sketch shape -> positions; the same for every process unless settings differ
+        total = 0
+        for stats in all_stats:
+            sketch = getattr(stats, attr).sketch
+            shape = (sketch.width, sketch.depth)
+            if shape not in positions:
+                positions[shape] = sketch.positions(upi_id)
+            total += sketch.estimate(positions[shape])
+        totals.append((total, upi_id))
+    return [{"upi_id": upi_id, "scans": total} for total, upi_id in heapq.nlargest(k, totals)]
+
+
+class ScanTracker:
+    """This process's ScanStats, the other processes' last saved ones, and the persist thread."""
+
+    def __init__(self, interval=PERSIST_INTERVAL, k=TOP_K):
+        self.interval = interval
+        self.k = k
+        self.local = ScanStats(k)
+        self.peers = {}  # process name -> ScanStats as last saved
+        self.name = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.persisted_at = None
+        self.errors = 0
+
+    def record(self, upi_id, status, source, category):
+        self.local.record(upi_id, status, source, category)
+
+    def load(self):
+        """Restore this process's saved state and read the others'. Run once at startup."""
+        self.name = process_name()
+        saved = database.load_scan_stats()
+        if self.name in saved:
+            self.local = ScanStats.from_bytes(saved.pop(self.name), self.k)
+        self.peers = {name: ScanStats.from_bytes(state, self.k) for name, state in saved.items()}
+        return len(saved) + 1
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="smartshield-stats", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.persist()
+
+    def persist(self):
+        """Save this process's state and pick up the other processes' latest."""
+        if self.name is None:
+            self.name = process_name()
+        try:
+            writer.call("save_scan_stats", self.name, self.local.to_bytes(), time.time())
+            saved = database.load_scan_stats()
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️  Saving scan stats failed: {e}")
+            return False
+        saved.pop(self.name, None)
+        self.peers = {name: ScanStats.from_bytes(state, self.k) for name, state in saved.items()}
+        self.persisted_at = time.time()
+        return True
+
+    def stop(self):
+        """Stop the persist thread and save a final time."""
+        thread = self._thread
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        self._thread = None
+        self.persist()
+
+    def report(self, now=None):
+        all_stats = [self.local, *self.peers.values()]
+        today = int((time.time() if now is None else now) // DAY)
+        days = _merge_counts(stats.days for stats in all_stats)
+        sources = _merge_counts(stats.sources for stats in all_stats)
+        categories = _merge_counts(stats.categories for stats in all_stats)
+        scans = sum(counts[0] for counts in sources.values())
+        blocked = sum(counts[1] for counts in sources.values())
+        invalid = [sum(stats.invalid[i] for stats in all_stats) for i in (0, 1)]
+        return {
+            "today": _day_row(today, days.get(today, [0, 0])),
+            "daily": [_day_row(day, days.get(day, [0, 0])) for day in range(today - REPORT_DAYS + 1, today + 1)],
+            "total": scans,
+            "blocked": blocked,
+            "by_source": {source: {"scans": n, "blocked": b} for source, (n, b) in sorted(sources.items())},
+            "by_category": sorted(({"category": category, "scans": n, "blocked": b,
+                                    "blocked_ratio": round(b / n, 4) if n else 0.0}
+                                   for category, (n, b) in categories.items()), key=lambda row: -row["scans"]),
+            "invalid": {"scans": invalid[0], "blocked": invalid[1]},
+            "top_scanned": _top(all_stats, "scanned", self.k),
+            "top_blocked": _top(all_stats, "blocked", self.k),
+            "processes": len(all_stats),
+            "persisted_at": self.persisted_at,
+        }
+
+    def stats(self):
+        return {"name": self.name, "peers": len(self.peers), "persisted_at": self.persisted_at,
+                "errors": self.errors}
+
+
+def _day_row(day, counts):
+    return {"date": date.fromordinal(date(1970, 1, 1).toordinal() + day).isoformat(),
+            "scans": counts[0], "blocked": counts[1]}
+
+
+def merchant_stats(now=None):
+    """Merchants by list and category, and how many were added per day, from the trigger-kept tables."""
+    today = datetime.fromtimestamp(time.time() if now is None else now, timezone.utc).date()
+    since = date.fromordinal(today.toordinal() - REPORT_DAYS + 1).isoformat()
+    counts, days = database.get_merchant_stats(since)
+    lists = {"verified": 0, "blacklisted": 0, "risky": 0, "safe": 0}
+    categories = {}
+    for category, list_name, merchants in counts:
+        lists[list_name] = lists.get(list_name, 0) + merchants
+        totals = categories.setdefault(category, [0, 0])
+        totals[0] += merchants
+        if list_name in ("blacklisted", "risky"):
+            totals[1] += merchants
+    total = sum(lists.values())
+    fraud = lists["blacklisted"] + lists["risky"]
+    added = {day: (added, threats) for day, added, threats in days}
+    return {
+        "total": total,
+        **lists,
+        "fraud_ratio": round(fraud / total, 4) if total else 0.0,
+        "by_category": sorted(({"category": category, "merchants": n, "fraud": f, "fraud_ratio": round(f / n, 4)}
+                               for category, (n, f) in categories.items()), key=lambda row: -row["merchants"]),
+        "added_today": added.get(today.isoformat(), (0, 0))[0],
+        "threats_added_today": added.get(today.isoformat(), (0, 0))[1],
+        "daily_added": [{"date": day, "added": a, "threats": t} for day, (a, t) in added.items()],
+    }
+
+
+scans = ScanTracker()
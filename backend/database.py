@@ -1,54 +1,698 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
 
-DB_NAME = "smartshield.db"
+import lookalike
+import reputation
+from bloom import MerchantFilter
+from cache import MerchantCache, MISSING
+
+DB_NAME = os.environ.get("SMARTSHIELD_DB", "smartshield.db")
+
+# --- CONNECTION POOL SETTINGS ---
+# Readers are long-lived and shared; all writes go through one dedicated writer
+# connection so SQLite's single write lock is never contended inside a process.
+READ_POOL_SIZE = int(os.environ.get("SMARTSHIELD_READ_POOL_SIZE", "4"))
+POOL_TIMEOUT = 5.0          # Seconds to wait for a free reader before giving up
+STATEMENT_CACHE_SIZE = 128  # Prepared statements kept per connection
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",    # Safe with WAL, skips fsync on every commit
+    "PRAGMA mmap_size = 268435456",   # 256 MB memory-mapped reads
+    "PRAGMA cache_size = -16000",     # ~16 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# SQL is kept in constants so every call reuses the same prepared statement
+# from the connection's statement cache.
+SQL_GET_MERCHANT = "SELECT * FROM merchants WHERE upi_id = ?"
+SQL_ADD_MERCHANT = '''
+    INSERT INTO merchants (upi_id, legal_name, trust_score, category, is_verified)
+    VALUES (?, ?, ?, ?, ?)
+'''
+# Idempotent registration: a row that already exists is left as it is, without
+# raising (and rolling back) like a plain INSERT would
+SQL_REGISTER_MERCHANT = SQL_ADD_MERCHANT + "    ON CONFLICT (upi_id) DO NOTHING\n"
+# add_merchants_bulk's multi-row form: prefix + one "(?, ?, ?, ?, ?)" per row + suffix
+SQL_REGISTER_MERCHANTS_PREFIX = "INSERT INTO merchants (upi_id, legal_name, trust_score, category, is_verified) VALUES "
+SQL_REGISTER_MERCHANTS_SUFFIX = " ON CONFLICT (upi_id) DO NOTHING RETURNING upi_id, rowid"
+SQL_RECENT_MERCHANTS = "SELECT * FROM merchants ORDER BY rowid DESC LIMIT 50"
+SQL_UPSERT_REPUTATION = '''
+    INSERT INTO reputation (upi_id, scans, fraud_reports, safe_reports, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (upi_id) DO UPDATE SET
+        scans = excluded.scans,
+        fraud_reports = excluded.fraud_reports,
+        safe_reports = excluded.safe_reports,
+        updated_at = excluded.updated_at
+'''
+SQL_SET_REPUTATION_SCORE = f'''
+    UPDATE merchants SET trust_score = ?
+    WHERE upi_id = ? AND is_verified = 0
+      AND trust_score BETWEEN {reputation.MIN_SCORE} AND {reputation.MAX_SCORE}
+'''
+# Whitelist and blacklist, newest first (an index range scan on trust_score)
+SQL_LISTED_MERCHANTS = "SELECT * FROM merchants WHERE trust_score IN (0, 100) ORDER BY rowid DESC LIMIT ?"
+# Verified merchants for the lookalike index; (trust_score, rowid) is an index range scan
+SQL_VERIFIED_ROWS = "SELECT rowid, upi_id FROM merchants WHERE trust_score = 100 AND rowid > ?"
+SQL_FILTER_ROWS = "SELECT rowid, upi_id, trust_score FROM merchants WHERE rowid > ?"
+SQL_FILTER_COUNTS = "SELECT COUNT(*) - COALESCE(SUM(trust_score = 0), 0), COALESCE(SUM(trust_score = 0), 0) FROM merchants"
+
+# Well below SQLite's host-parameter limit, so one statement covers a whole chunk
+BULK_LOOKUP_CHUNK = 500
+BULK_INSERT_CHUNK = BULK_LOOKUP_CHUNK // 5  # Rows per multi-row INSERT, five parameters each
+
+# Hot-merchant cache in front of get_merchant. Every write path must keep it
+# in sync (write-through on insert, invalidate on anything else).
+merchant_cache = MerchantCache()
+
+# Called with each upi_id a write changed, after merchant_cache is invalidated
+# (snapshot.py registers here so changed rows stop being served from the file).
+invalidation_listeners = []
+
+# "Definitely not in merchants" prefilter (see bloom.py). Inserts made here are
+# added immediately; rows from other processes arrive via refresh_merchant_filter.
+merchant_filter = MerchantFilter()
+
+
+MERCHANT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_merchants_trust_score ON merchants (trust_score)",
+    "CREATE INDEX IF NOT EXISTS idx_merchants_category ON merchants (category)",
+    "CREATE INDEX IF NOT EXISTS idx_merchants_verified ON merchants (is_verified)",
+    # Prefix search on names for queries too short for the trigram index (LIKE 'x%' is a range scan on it)
+    "CREATE INDEX IF NOT EXISTS idx_merchants_legal_name ON merchants (legal_name COLLATE NOCASE)",
+)
+
+# Substring search over upi_id/legal_name: an external-content FTS5 table with
+# the trigram tokenizer, kept in sync with merchants by triggers.
+# Note: it is keyed on merchants.rowid, so run `INSERT INTO merchants_fts(merchants_fts)
+# VALUES('rebuild')` after a VACUUM.
+SEARCH_INDEX_SCHEMA = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS merchants_fts USING fts5(
+        upi_id, legal_name, content='merchants', content_rowid='rowid', tokenize='trigram'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS merchants_fts_insert AFTER INSERT ON merchants BEGIN
+        INSERT INTO merchants_fts (rowid, upi_id, legal_name) VALUES (new.rowid, new.upi_id, new.legal_name);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS merchants_fts_delete AFTER DELETE ON merchants BEGIN
+        INSERT INTO merchants_fts (merchants_fts, rowid, upi_id, legal_name)
+        VALUES ('delete', old.rowid, old.upi_id, old.legal_name);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS merchants_fts_update AFTER UPDATE OF upi_id, legal_name ON merchants BEGIN
+        INSERT INTO merchants_fts (merchants_fts, rowid, upi_id, legal_name)
+        VALUES ('delete', old.rowid, old.upi_id, old.legal_name);
+        INSERT INTO merchants_fts (rowid, upi_id, legal_name) VALUES (new.rowid, new.upi_id, new.legal_name);
+    END''',
+)
+MIN_FTS_QUERY_LENGTH = 3  # The trigram tokenizer can't match anything shorter
+
+# Dashboard totals (see dashboard.py): merchants per (category, list) and per day
+# added, kept exact by triggers so every writer (add_merchant, ingest.py, reputation
+# rescoring, the serve.py writer) updates them in the same transaction as the row.
+RISKY_MAX_SCORE = 40  # known_merchant_verdict answers FRAUD at or below this
+
+
+def _list_of(row):
+    return (f"CASE WHEN {row}.trust_score = 100 THEN 'verified' WHEN {row}.trust_score = 0 THEN 'blacklisted' "
+            f"WHEN {row}.trust_score <= {RISKY_MAX_SCORE} THEN 'risky' ELSE 'safe' END")
+
+
+SQL_COUNT_MERCHANT = f'''
+        INSERT INTO merchant_counts (category, list, merchants) VALUES (new.category, {_list_of("new")}, 1)
+        ON CONFLICT (category, list) DO UPDATE SET merchants = merchants + 1;'''
+SQL_UNCOUNT_MERCHANT = f'''
+        UPDATE merchant_counts SET merchants = merchants - 1
+        WHERE category = old.category AND list = {_list_of("old")};'''
+MERCHANT_STATS_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS merchant_counts (
+        category TEXT NOT NULL,
+        list TEXT NOT NULL,
+        merchants INTEGER NOT NULL,
+        PRIMARY KEY (category, list)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS merchant_days (
+        day TEXT PRIMARY KEY,
+        added INTEGER NOT NULL,
+        threats INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    f'''CREATE TRIGGER IF NOT EXISTS merchants_stats_insert AFTER INSERT ON merchants BEGIN{SQL_COUNT_MERCHANT}
+        INSERT INTO merchant_days (day, added, threats)
+        VALUES (date('now'), 1, new.trust_score <= {RISKY_MAX_SCORE})
+        ON CONFLICT (day) DO UPDATE SET added = added + 1, threats = threats + excluded.threats;
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS merchants_stats_delete AFTER DELETE ON merchants BEGIN{SQL_UNCOUNT_MERCHANT}
+    END''',
+    # Reputation rescoring updates trust_score constantly; only a change of list or category costs anything
+    f'''CREATE TRIGGER IF NOT EXISTS merchants_stats_update AFTER UPDATE OF trust_score, category ON merchants
+    WHEN old.category IS NOT new.category OR {_list_of("old")} IS NOT {_list_of("new")}
+    BEGIN{SQL_UNCOUNT_MERCHANT}{SQL_COUNT_MERCHANT}
+    END''',
+)
+SQL_MERCHANT_COUNTS = "SELECT category, list, merchants FROM merchant_counts WHERE merchants > 0"
+SQL_MERCHANT_DAYS = "SELECT day, added, threats FROM merchant_days WHERE day >= ? ORDER BY day"
+
+# Change log behind /sync/trust_list (see trust_sync.py): one row per change to the
+# synced blacklist or whitelist, written by triggers like the counters above.
+# Reputation rescoring stays within 1-99, so it never logs anything.
+# Unknown IDs that scoring flagged are registered under this name. They stay
+# blocked on this server but are never synced: the ID and the traffic behind
+# it are attacker-chosen, so only curated rows (ingest.py, seed_db.py) go to clients.
+AUTO_FLAGGED_NAME = "Suspicious Unknown ID"
+
+
+def _synced(row):
+    return (f"({row}.trust_score = 100 OR "
+            f"({row}.trust_score = 0 AND {row}.legal_name IS NOT '{AUTO_FLAGGED_NAME}'))")
+
+
+TRUST_LIST_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS trust_list_changes (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        upi_id TEXT NOT NULL
+    )''',
+    # Recreated every time so a database made by an older build gets the current conditions
+    "DROP TRIGGER IF EXISTS merchants_trust_list_insert",
+    "DROP TRIGGER IF EXISTS merchants_trust_list_delete",
+    "DROP TRIGGER IF EXISTS merchants_trust_list_update",
+    f'''CREATE TRIGGER merchants_trust_list_insert AFTER INSERT ON merchants
+    WHEN {_synced("new")} BEGIN
+        INSERT INTO trust_list_changes (upi_id) VALUES (new.upi_id);
+    END''',
+    f'''CREATE TRIGGER merchants_trust_list_delete AFTER DELETE ON merchants
+    WHEN {_synced("old")} BEGIN
+        INSERT INTO trust_list_changes (upi_id) VALUES (old.upi_id);
+    END''',
+    # Joining or leaving a list, moving between them, or a listed merchant's rename
+    f'''CREATE TRIGGER merchants_trust_list_update AFTER UPDATE OF trust_score, legal_name ON merchants
+    WHEN ({_synced("old")} OR {_synced("new")})
+     AND (old.trust_score IS NOT new.trust_score OR old.legal_name IS NOT new.legal_name) BEGIN
+        INSERT INTO trust_list_changes (upi_id) VALUES (new.upi_id);
+    END''',
+)
+# Separate subqueries so each is a single seek on the primary key
+SQL_TRUST_LIST_VERSION = ("SELECT (SELECT COALESCE(MAX(version), 0) FROM trust_list_changes), "
+                          "(SELECT MIN(version) FROM trust_list_changes)")
+SQL_TRUST_LIST = f"SELECT upi_id, trust_score, legal_name FROM merchants m WHERE {_synced('m')}"
+# Current state of every ID changed after a version (trust_score NULL = deleted or no longer synced)
+SQL_TRUST_LIST_CHANGES = f'''
+    SELECT c.upi_id, CASE WHEN {_synced("m")} THEN m.trust_score END, m.legal_name
+    FROM (SELECT DISTINCT upi_id FROM trust_list_changes WHERE version > ?) c
+    LEFT JOIN merchants m ON m.upi_id = c.upi_id
+'''
+MAX_PAGE_SIZE = 200
 
 def get_db_connection():
+    """Open a standalone connection (for scripts). The API uses the pool instead."""
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
     return conn
 
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create merchants table with strict banking schema
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS merchants (
-            upi_id TEXT PRIMARY KEY,
-            legal_name TEXT NOT NULL,
-            trust_score INTEGER NOT NULL,
-            category TEXT NOT NULL,
-            is_verified BOOLEAN NOT NULL CHECK (is_verified IN (0, 1))
+
+class ConnectionPool:
+    """Bounded pool of long-lived reader connections plus a single writer."""
+
+    def __init__(self, db_name, size=READ_POOL_SIZE):
+        self.db_name = db_name
+        self.pid = os.getpid()
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._writer = None
+        self._write_lock = threading.Lock()
+        self._all = []
+
+    def _connect(self, read_only):
+        conn = sqlite3.connect(
+            self.db_name,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
         )
-    ''')
-    
-    conn.commit()
-    conn.close()
+        conn.row_factory = sqlite3.Row
+        if not read_only:
+            conn.execute("PRAGMA journal_mode = WAL")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        self._all.append(conn)
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect(read_only=True)
+        try:
+            return self._idle.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError(f"No database connection available after {POOL_TIMEOUT}s")
+
+    @contextmanager
+    def reader(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Serialize writes on the dedicated writer; commits on success, rolls back on error."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect(read_only=False)
+            with self._writer:
+                yield self._writer
+
+    def close(self):
+        with self._write_lock, self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._writer = None
+            self._created = 0
+            self._idle = queue.LifoQueue(maxsize=self.size)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, rebuilding it if DB_NAME has been repointed or the process forked."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.db_name == DB_NAME and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.db_name != DB_NAME or _pool.pid != os.getpid():
+            # SQLite connections must not be used across fork(); a child just drops the parent's
+            if _pool is not None and _pool.pid == os.getpid():
+                _pool.close()
+            _pool = ConnectionPool(DB_NAME)
+            merchant_cache.clear()
+            merchant_filter.reset()
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def init_db():
+    with get_pool().writer() as conn:
+        # Create merchants table with strict banking schema
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS merchants (
+                upi_id TEXT PRIMARY KEY,
+                legal_name TEXT NOT NULL,
+                trust_score INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                is_verified BOOLEAN NOT NULL CHECK (is_verified IN (0, 1))
+            )
+        ''')
+
+        # Decayed event counters behind reputation-managed trust scores (see reputation.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS reputation (
+                upi_id TEXT PRIMARY KEY,
+                scans REAL NOT NULL,
+                fraud_reports REAL NOT NULL,
+                safe_reports REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+        # Secondary indexes for the /merchants filters
+        for statement in MERCHANT_INDEXES:
+            conn.execute(statement)
+        init_search_index(conn)
+        init_merchant_stats(conn)
+        for statement in TRUST_LIST_SCHEMA:
+            conn.execute(statement)
+
+        # Each process's in-memory scan counters and sketches (see dashboard.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS scan_stats (
+                process TEXT PRIMARY KEY,
+                state BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
     print(f"✅ Database '{DB_NAME}' initialized with Banking Schema.")
 
+def get_cached_merchant(upi_id):
+    """Cache-only lookup: a merchant dict, MISSING, or None if the cache can't answer."""
+    return merchant_cache.get(upi_id)
+
 def get_merchant(upi_id):
-    conn = get_db_connection()
-    merchant = conn.execute('SELECT * FROM merchants WHERE upi_id = ?', (upi_id,)).fetchone()
-    conn.close()
+    cached = merchant_cache.get(upi_id)
+    if cached is not None:
+        return None if cached is MISSING else cached
+    return load_merchant(upi_id)
+
+def load_merchant(upi_id):
+    """Read a merchant from SQLite (skipping the cache check) and populate the cache."""
+    with get_pool().reader() as conn:
+        row = conn.execute(SQL_GET_MERCHANT, (upi_id,)).fetchone()
+    if row is None:
+        merchant_cache.put_missing(upi_id)
+        return None
+    merchant = dict(row)
+    merchant_cache.put(upi_id, merchant)
     return merchant
 
 def add_merchant(upi_id, legal_name, trust_score, category, is_verified):
-    conn = get_db_connection()
-    try:
-        conn.execute('''
-            INSERT INTO merchants (upi_id, legal_name, trust_score, category, is_verified)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (upi_id, legal_name, trust_score, category, 1 if is_verified else 0))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
+    merchant = {
+        "upi_id": upi_id,
+        "legal_name": legal_name,
+        "trust_score": trust_score,
+        "category": category,
+        "is_verified": 1 if is_verified else 0,
+    }
+    with get_pool().writer() as conn:
+        cursor = conn.execute(SQL_REGISTER_MERCHANT, tuple(merchant.values()))
+    if cursor.rowcount == 0:
+        # Already registered (by a concurrent scan or another process); drop any
+        # stale negative entry so the next read hits the DB
+        merchant_cache.invalidate(upi_id)
         return False
-    finally:
-        conn.close()
+    note_inserted(upi_id, trust_score, cursor.lastrowid)
+    merchant_cache.put(upi_id, merchant)
+    return True
+
+def invalidate_merchant(upi_id):
+    """Drop every in-process copy of a row a write changed."""
+    merchant_cache.invalidate(upi_id)
+    for listener in invalidation_listeners:
+        listener(upi_id)
+
+def get_merchants_bulk(upi_ids):
+    """Resolve many IDs at once. Returns {upi_id: merchant} for the ones that exist."""
+    found = {}
+    to_query = []
+    for upi_id in dict.fromkeys(upi_ids):
+        cached = merchant_cache.get(upi_id)
+        if cached is None:
+            to_query.append(upi_id)
+        elif cached is not MISSING:
+            found[upi_id] = cached
+    if to_query:
+        with get_pool().reader() as conn:
+            for i in range(0, len(to_query), BULK_LOOKUP_CHUNK):
+                chunk = to_query[i:i + BULK_LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT * FROM merchants WHERE upi_id IN ({placeholders})", chunk)
+                for row in rows:
+                    found[row["upi_id"]] = merchant = dict(row)
+                    merchant_cache.put(merchant["upi_id"], merchant)
+        for upi_id in to_query:
+            if upi_id not in found:
+                merchant_cache.put_missing(upi_id)
+    return found
+
+def add_merchants_bulk(merchants):
+    """Insert many merchant dicts in one transaction, skipping IDs that already exist.
+
+    Returns the number of rows actually inserted.
+    """
+    by_id = {}  # First dict per upi_id; a repeat would only hit the conflict
+    for m in merchants:
+        by_id.setdefault(m["upi_id"], {
+            "upi_id": m["upi_id"], "legal_name": m["legal_name"], "trust_score": m["trust_score"],
+            "category": m["category"], "is_verified": 1 if m["is_verified"] else 0,
+        })
+    rows = [tuple(merchant.values()) for merchant in by_id.values()]
+    inserted = []
+    with get_pool().writer() as conn:
+        # Multi-row INSERT ... RETURNING: one statement per chunk, and SQLite reports
+        # exactly the rows it inserted (with their rowids), not the skipped ones
+        for i in range(0, len(rows), BULK_INSERT_CHUNK):
+            chunk = rows[i:i + BULK_INSERT_CHUNK]
+            placeholders = ",".join(["(?, ?, ?, ?, ?)"] * len(chunk))
+            sql = SQL_REGISTER_MERCHANTS_PREFIX + placeholders + SQL_REGISTER_MERCHANTS_SUFFIX
+            inserted.extend(conn.execute(sql, [value for row in chunk for value in row]).fetchall())
+    for upi_id, rowid in inserted:
+        merchant = by_id.pop(upi_id)
+        note_inserted(upi_id, merchant["trust_score"], rowid)
+        merchant_cache.put(upi_id, merchant)
+    for upi_id in by_id:
+        merchant_cache.invalidate(upi_id)  # Already registered; drop any stale negative entry
+    return len(inserted)
+
+def apply_reputation_deltas(deltas, now):
+    """Fold batched event counts into the decayed counters and rescore the merchants.
+
+    `deltas` is [(upi_id, scans, fraud_reports, safe_reports)]. Only rows
+    reputation manages (unverified, score 1-99) are rescored. Returns the
+    number of merchants whose trust_score changed.
+    """
+    deltas = list(deltas)
+    changed = []
+    with get_pool().writer() as conn:
+        stored = {}
+        merchants = {}
+        for i in range(0, len(deltas), BULK_LOOKUP_CHUNK):
+            chunk = [d[0] for d in deltas[i:i + BULK_LOOKUP_CHUNK]]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT * FROM reputation WHERE upi_id IN ({placeholders})", chunk):
+                stored[row["upi_id"]] = row
+            for row in conn.execute(
+                f"SELECT upi_id, trust_score, is_verified FROM merchants WHERE upi_id IN ({placeholders})", chunk
+            ):
+                merchants[row["upi_id"]] = row
+
+        counters_rows = []
+        score_rows = []
+        for upi_id, scans, fraud_reports, safe_reports in deltas:
+            merchant = merchants.get(upi_id)
+            if merchant is None or not reputation.is_managed(merchant):
+                continue
+            row = stored.get(upi_id)
+            if row is None:
+                counters = (scans, fraud_reports, safe_reports)
+            else:
+                counters = reputation.apply_events(
+                    (row["scans"], row["fraud_reports"], row["safe_reports"]), row["updated_at"],
+                    (scans, fraud_reports, safe_reports), now,
+                )
+            counters_rows.append((upi_id, *counters, now))
+            new_score = reputation.score(*counters)
+            if new_score != merchant["trust_score"]:
+                score_rows.append((new_score, upi_id))
+                changed.append(upi_id)
+        conn.executemany(SQL_UPSERT_REPUTATION, counters_rows)
+        conn.executemany(SQL_SET_REPUTATION_SCORE, score_rows)
+    for upi_id in changed:
+        invalidate_merchant(upi_id)
+    return len(changed)
+
+def get_reputation(upi_id, now):
+    """Decayed counters and score for one merchant, or None if it has no events."""
+    with get_pool().reader() as conn:
+        row = conn.execute("SELECT * FROM reputation WHERE upi_id = ?", (upi_id,)).fetchone()
+    if row is None:
+        return None
+    scans, fraud_reports, safe_reports = reputation.decay(
+        (row["scans"], row["fraud_reports"], row["safe_reports"]), row["updated_at"], now)
+    return {"upi_id": upi_id, "scans": scans, "fraud_reports": fraud_reports, "safe_reports": safe_reports,
+            "score": reputation.score(scans, fraud_reports, safe_reports), "updated_at": row["updated_at"]}
+
+def warm_cache(limit):
+    """Preload whitelisted and blacklisted merchants into merchant_cache. Returns how many."""
+    limit = min(limit, merchant_cache.max_entries)
+    with get_pool().reader() as conn:
+        rows = conn.execute(SQL_LISTED_MERCHANTS, (limit,)).fetchall()
+    for row in rows:
+        merchant_cache.put(row["upi_id"], dict(row))
+    return len(rows)
+
+def load_merchant_filter():
+    """(Re)build the Bloom prefilter from every row in merchants."""
+    with get_pool().reader() as conn:
+        known_count, fraud_count = conn.execute(SQL_FILTER_COUNTS).fetchone()
+        merchant_filter.rebuild(conn.execute(SQL_FILTER_ROWS, (0,)), known_count, fraud_count)
+
+def refresh_merchant_filter():
+    """Add rows inserted since the filter last looked (by any process). Returns how many."""
+    if not merchant_filter.loaded or merchant_filter.needs_rebuild():
+        load_merchant_filter()
+        refresh_lookalike_index()
+        return 0
+    with get_pool().reader() as conn:
+        rows = conn.execute(SQL_FILTER_ROWS, (merchant_filter.max_rowid,)).fetchall()
+    for rowid, upi_id, trust_score in rows:
+        note_inserted(upi_id, trust_score, rowid)
+    return len(rows)
+
+def note_inserted(upi_id, trust_score, rowid=None):
+    """Make a newly inserted row visible to the in-memory prefilter and lookalike index."""
+    merchant_filter.add(upi_id, trust_score, rowid)
+    if trust_score == 100:
+        lookalike.index.add(upi_id, rowid)
+
+def load_lookalike_index():
+    """(Re)build the verified-merchant lookalike index from every 100-score row."""
+    with get_pool().reader() as conn:
+        lookalike.index.rebuild(conn.execute(SQL_VERIFIED_ROWS, (0,)))
+
+def refresh_lookalike_index():
+    """Add verified rows inserted since the index last looked. Returns how many."""
+    with get_pool().reader() as conn:
+        rows = conn.execute(SQL_VERIFIED_ROWS, (lookalike.index.max_rowid,)).fetchall()
+    for rowid, upi_id in rows:
+        lookalike.index.add(upi_id, rowid)
+    return len(rows)
+
+def init_search_index(conn):
+    """Create the FTS5 search index if this SQLite build supports it."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'merchants_fts'").fetchone()
+    try:
+        for statement in SEARCH_INDEX_SCHEMA:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️  FTS5 search index unavailable ({e}); /merchants search will use LIKE scans.")
+        return
+    if not exists:
+        # Index rows that were already in the table
+        conn.execute("INSERT INTO merchants_fts (merchants_fts) VALUES ('rebuild')")
+
+def init_merchant_stats(conn):
+    """Create the trigger-maintained dashboard counters, counting existing rows once."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'merchant_counts'").fetchone()
+    for statement in MERCHANT_STATS_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        conn.execute(f"INSERT INTO merchant_counts (category, list, merchants) "
+                     f"SELECT category, {_list_of('merchants')}, COUNT(*) FROM merchants GROUP BY 1, 2")
+
+def get_merchant_stats(since_day):
+    """([(category, list, merchants)], [(day, added, threats)] from since_day on). Table-size independent."""
+    with get_pool().reader() as conn:
+        return (conn.execute(SQL_MERCHANT_COUNTS).fetchall(),
+                conn.execute(SQL_MERCHANT_DAYS, (since_day,)).fetchall())
+
+def save_scan_stats(process, state, now):
+    with get_pool().writer() as conn:
+        conn.execute(
+            "INSERT INTO scan_stats (process, state, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (process) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (process, state, now),
+        )
+
+def load_scan_stats():
+    """{process: saved state} for every process that has saved scan stats."""
+    with get_pool().reader() as conn:
+        return {row[0]: row[1] for row in conn.execute("SELECT process, state FROM scan_stats")}
+
+def get_trust_list_version():
+    """(latest version, oldest version still in the log or None) of the trust list change log."""
+    with get_pool().reader() as conn:
+        return tuple(conn.execute(SQL_TRUST_LIST_VERSION).fetchone())
+
+def get_trust_list(since=None):
+    """(version, full, [(upi_id, trust_score, legal_name)]) read in one transaction.
+
+    full=False: every ID changed after version `since`, as it is now (trust_score None if deleted).
+    full=True: the whole blacklist and whitelist, when since is None or older than the log reaches.
+    """
+    with get_pool().reader() as conn:
+        conn.execute("BEGIN")
+        try:
+            version, oldest = conn.execute(SQL_TRUST_LIST_VERSION).fetchone()
+            # A client at `since` needs versions since+1..version, all still logged
+            full = since is None or since > version or (oldest is not None and since + 1 < oldest)
+            if full:
+                rows = conn.execute(SQL_TRUST_LIST).fetchall()
+            else:
+                rows = conn.execute(SQL_TRUST_LIST_CHANGES, (since,)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+    return version, full, [tuple(row) for row in rows]
+
+def prune_trust_list_changes(keep):
+    """Drop all but the newest `keep` change log entries; clients further behind get the full lists."""
+    with get_pool().writer() as conn:
+        return conn.execute("DELETE FROM trust_list_changes WHERE version <= "
+                            "(SELECT MAX(version) FROM trust_list_changes) - ?", (max(1, keep),)).rowcount
+
+def has_search_index(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'merchants_fts'").fetchone() is not None
+
+def search_merchants(cursor=None, limit=50, min_score=None, max_score=None, category=None, verified=None, query=None):
+    """Keyset-paginated merchant listing, newest first.
+
+    `cursor` is the `next_cursor` of the previous page (a rowid), so every page
+    is an index range scan no matter how deep it is. Returns
+    {"items": [...], "next_cursor": int or None}.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    where = []
+    params = []
+    with get_pool().reader() as conn:
+        if query and len(query) >= MIN_FTS_QUERY_LENGTH and has_search_index(conn):
+            # Drive the scan from the FTS index, which can walk its rowids in descending order
+            source = "merchants_fts f JOIN merchants m ON m.rowid = f.rowid"
+            order_key = "f.rowid"
+            where.append("f.merchants_fts MATCH ?")
+            params.append('"' + query.replace('"', '""') + '"')
+        else:
+            source = "merchants m"
+            order_key = "m.rowid"
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") if query else None
+            if query and len(query) < MIN_FTS_QUERY_LENGTH:
+                # Too short for trigrams: prefix match on upi_id (a range scan on its primary key)
+                # or on legal_name (a range scan on idx_merchants_legal_name)
+                where.append("((m.upi_id >= ? AND m.upi_id < ?) OR m.legal_name LIKE ? ESCAPE '\\')")
+                params += [query.lower(), query.lower() + "\U0010ffff", escaped + "%"]
+            elif query:
+                pattern = "%" + escaped + "%"
+                where.append("(m.upi_id LIKE ? ESCAPE '\\' OR m.legal_name LIKE ? ESCAPE '\\')")
+                params += [pattern, pattern]
+
+        if cursor is not None:
+            where.append(f"{order_key} < ?")
+            params.append(cursor)
+        if min_score is not None:
+            where.append("m.trust_score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            where.append("m.trust_score <= ?")
+            params.append(max_score)
+        if category is not None:
+            where.append("m.category = ?")
+            params.append(category)
+        if verified is not None:
+            where.append("m.is_verified = ?")
+            params.append(1 if verified else 0)
+
+        sql = f"SELECT {order_key} AS row_key, m.* FROM {source}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_key} DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = conn.execute(sql, params).fetchall()
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = items[-1]["row_key"] if len(rows) > limit else None
+    for item in items:
+        del item["row_key"]
+    return {"items": items, "next_cursor": next_cursor}
 
 def get_all_merchants():
-    conn = get_db_connection()
-    merchants = conn.execute('SELECT * FROM merchants ORDER BY rowid DESC LIMIT 50').fetchall()
-    conn.close()
+    with get_pool().reader() as conn:
+        merchants = conn.execute(SQL_RECENT_MERCHANTS).fetchall()
     return [dict(m) for m in merchants]
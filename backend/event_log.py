@@ -0,0 +1,365 @@
+"""Append-only log of every /scan_qr decision, for analytics off the merchants table.
+
+  scan_qr     log.record(...) appends a tuple to an in-memory deque; nothing
+              else happens on the request path
+  writer      a background thread writes the deque out every FLUSH_INTERVAL
+              as JSON lines ([ts, upi_id, status, score, source, lookup,
+              latency_us]) to the active segment, events-<start ms>-<pid>.jsonl.open
+  rotation    at SEGMENT_BYTES or SEGMENT_SECONDS, whichever comes first,
+              the segment is renamed to .jsonl (closed) and a new one opened.
+              Every process (serve.py worker) writes its own segments, so
+              there is no cross-process locking
+  compaction  python event_log.py compact turns closed segments into
+              zstd-compressed Parquet, events-<first ms>-<last ms>-<pid>.parquet
+              (needs pyarrow), and deletes them. Run it from cron
+  query       query() / python event_log.py query: counts and mean latency
+              per group over a time range, from the Parquet files plus any
+              segment not compacted yet
+
+Segments are flushed to the OS, not fsynced: a crash can lose the last
+FLUSH_INTERVAL of events, and a half-written last line is skipped on read.
+If the writer falls behind by MAX_PENDING events, new ones are dropped and
+counted rather than growing memory. bench_event_log.py measures ingest and
+scan rates.
+"""
+import argparse
+import collections
+import glob
+import json
+import os
+import threading
+import time
+
+import metrics
+
+ENABLED = os.environ.get("SMARTSHIELD_EVENT_LOG", "1") != "0"
+LOG_DIR = os.environ.get("SMARTSHIELD_EVENT_LOG_DIR", "scan_events")
+SEGMENT_BYTES = int(os.environ.get("SMARTSHIELD_EVENT_SEGMENT_MB", "64")) * 1024 * 1024
+SEGMENT_SECONDS = float(os.environ.get("SMARTSHIELD_EVENT_SEGMENT_SECONDS", "3600"))
+FLUSH_INTERVAL = float(os.environ.get("SMARTSHIELD_EVENT_FLUSH_INTERVAL", "0.5"))
+MAX_PENDING = 200000
+
+COLUMNS = ("ts", "upi_id", "status", "score", "source", "lookup", "latency_us")
+OPEN_SUFFIX = ".jsonl.open"
+CLOSED_SUFFIX = ".jsonl"
+ROW_GROUP_SIZE = 256 * 1024
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))  # json.dumps builds one per call
+
+_pa = None
+
+
+def _pyarrow():
+    """pyarrow, imported on first use. Only compaction and reading Parquet need it."""
+    global _pa
+    if _pa is None:
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("pyarrow is not installed (needed for Parquet compaction and queries)") from None
+        _pa = pyarrow
+    return _pa
+
+
+class EventLog:
+    """Buffered, segment-rotated JSON-lines writer for scan events."""
+
+    def __init__(self, directory=LOG_DIR, segment_bytes=SEGMENT_BYTES, segment_seconds=SEGMENT_SECONDS,
+                 interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, enabled=ENABLED):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.interval = interval
+        self.max_pending = max_pending
+        self.enabled = enabled
+        # deque append/popleft are atomic, so record() never takes a lock
+        self._pending = collections.deque()
+        self._file = None
+        self._path = None
+        self._opened_at = 0.0
+        self._written = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.segments = 0
+        self.errors = 0
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="smartshield-event-log", daemon=True)
+            self._thread.start()
+
+    def record(self, upi_id, status, score, source, lookup, latency_us):
+        """Log one scan decision. Never blocks on disk."""
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self.start()
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.recorded += 1
+        self._pending.append((time.time(), upi_id, status, score, source, lookup, latency_us))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Write everything pending to the active segment, rotating it if it's full or old."""
+        with self._flush_lock:
+            pending = self._pending
+            batch = [pending.popleft() for _ in range(len(pending))]
+            try:
+                if self._file is not None and time.time() - self._opened_at >= self.segment_seconds:
+                    self._close_segment()
+                if not batch:
+                    return 0
+                if self._file is None:
+                    self._open_segment(batch[0][0])
+                # Timestamps are rounded to the millisecond here, off the request path
+                encode = _encoder.encode
+                data = "".join(encode((round(event[0], 3), *event[1:])) + "\n" for event in batch).encode()
+                self._file.write(data)
+                self._file.flush()
+                self._written += len(data)
+                self.flushed += len(batch)
+                if self._written >= self.segment_bytes:
+                    self._close_segment()
+                return len(batch)
+            except OSError as e:
+                self.errors += 1
+                self.dropped += len(batch)
+                metrics.error("event_log_write_failed", events=len(batch), error=str(e))
+                return 0
+
+    def _open_segment(self, first_ts):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"events-{int(first_ts * 1000):013d}-{os.getpid()}{OPEN_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, "ab")
+        self._opened_at = time.time()
+        self._written = 0
+
+    def _close_segment(self):
+        self._file.close()
+        os.replace(self._path, self._path[:-len(OPEN_SUFFIX)] + CLOSED_SUFFIX)
+        self._file = self._path = None
+        self.segments += 1
+
+    def stop(self):
+        """Stop the writer thread, write what's pending and close the segment so it can be compacted."""
+        thread = self._thread
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._flush_lock:
+            if self._file is not None:
+                self._close_segment()
+        self._thread = None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "active_segment": self._path and os.path.basename(self._path),
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "segments_closed": self.segments,
+            "errors": self.errors,
+        }
+
+
+# --- SEGMENT FILES ---
+
+def _segment_start(path):
+    """Start time (seconds) encoded in a segment or Parquet file name."""
+    return int(os.path.basename(path).split("-")[1]) / 1000
+
+
+def closed_segments(directory=LOG_DIR, abandoned_after=None):
+    """Closed JSON-lines segments, oldest first.
+
+    `abandoned_after` (seconds) also returns .open segments nobody has
+    written to for that long, left behind by a process that crashed.
+    """
+    paths = glob.glob(os.path.join(directory, "events-*" + CLOSED_SUFFIX))
+    if abandoned_after is not None:
+        cutoff = time.time() - abandoned_after
+        paths += [path for path in glob.glob(os.path.join(directory, "events-*" + OPEN_SUFFIX))
+                  if os.path.getmtime(path) < cutoff]
+    return sorted(paths, key=_segment_start)
+
+
+def read_segment(path):
+    """Events in a JSON-lines segment as tuples; a torn last line is skipped."""
+    events = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if len(event) == len(COLUMNS):
+                events.append(event)
+    return events
+
+
+def _schema():
+    pa = _pyarrow()
+    return pa.schema([
+        ("ts", pa.timestamp("ms", tz="UTC")),
+        ("upi_id", pa.string()),
+        ("status", pa.dictionary(pa.int8(), pa.string())),
+        ("score", pa.int8()),
+        ("source", pa.dictionary(pa.int8(), pa.string())),
+        ("lookup", pa.dictionary(pa.int8(), pa.string())),
+        ("latency_us", pa.int32()),
+    ])
+
+
+def _to_table(events):
+    pa = _pyarrow()
+    columns = list(zip(*events)) or [()] * len(COLUMNS)
+    arrays = [pa.array([round(ts * 1000) for ts in columns[0]], pa.int64()).cast(pa.timestamp("ms", tz="UTC"))]
+    for field, values in zip(list(_schema())[1:], columns[1:]):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=_schema())
+
+
+def compact(directory=LOG_DIR, abandoned_after=None):
+    """Convert closed segments to Parquet and delete them. Returns [(segment, parquet file, events)]."""
+    pq = _pyarrow().parquet
+    if abandoned_after is None:
+        abandoned_after = 2 * SEGMENT_SECONDS
+    done = []
+    for path in closed_segments(directory, abandoned_after):
+        events = read_segment(path)
+        if events:
+            events.sort(key=lambda event: event[0])  # Row group min/max stats then prune time ranges
+            name = f"events-{int(events[0][0] * 1000):013d}-{int(events[-1][0] * 1000):013d}-" \
+                   f"{os.path.basename(path).split('-')[2].split('.')[0]}.parquet"
+            target = os.path.join(directory, name)
+            pq.write_table(_to_table(events), target + ".tmp", compression="zstd", row_group_size=ROW_GROUP_SIZE)
+            os.replace(target + ".tmp", target)
+        else:
+            target = None
+        os.remove(path)
+        done.append((path, target, len(events)))
+    return done
+
+
+def parquet_files(directory=LOG_DIR, start=None, end=None):
+    """Compacted files that can hold events in [start, end), judged by their names."""
+    files = []
+    for path in glob.glob(os.path.join(directory, "events-*.parquet")):
+        first, last = (int(part) / 1000 for part in os.path.basename(path).split("-")[1:3])
+        if (start is None or last >= start) and (end is None or first < end):
+            files.append(path)
+    return sorted(files)
+
+
+# --- QUERIES ---
+
+def query(start=None, end=None, by=("status",), directory=LOG_DIR):
+    """Scans and mean latency per `by` group for events with start <= ts < end (epoch seconds).
+
+    Reads the Parquet files whose range overlaps, then every JSON-lines
+    segment (open or closed) not compacted yet. Returns a list of dicts,
+    most scanned group first.
+    """
+    by = tuple(by)
+    unknown = set(by) - set(COLUMNS[1:])
+    if unknown:
+        raise ValueError(f"Can't group by {sorted(unknown)}; columns are {list(COLUMNS[1:])}")
+    totals = {}  # group -> [scans, latency sum]
+
+    files = parquet_files(directory, start, end)
+    if files:
+        pa = _pyarrow()
+        pc = pa.compute
+        for path in files:
+            table = pa.parquet.read_table(path, columns=["ts", *by, "latency_us"], filters=_time_filter(start, end))
+            table = table.cast(pa.schema([
+                (field.name, field.type.value_type if pa.types.is_dictionary(field.type) else field.type)
+                for field in table.schema
+            ]))
+            grouped = table.group_by(list(by)).aggregate([("latency_us", "count"), ("latency_us", "sum")])
+            rows = zip(*(grouped[name].to_pylist() for name in by),
+                       grouped["latency_us_count"].to_pylist(), pc.fill_null(grouped["latency_us_sum"], 0).to_pylist())
+            for *group, count, latency_sum in rows:
+                _accumulate(totals, tuple(group), count, latency_sum)
+
+    indexes = [COLUMNS.index(name) for name in by]
+    for path in glob.glob(os.path.join(directory, "events-*" + CLOSED_SUFFIX + "*")):
+        if end is not None and _segment_start(path) >= end:
+            continue
+        try:
+            events = read_segment(path)
+        except FileNotFoundError:
+            continue  # Compacted (or rotated) since the glob
+        for event in events:
+            if (start is None or event[0] >= start) and (end is None or event[0] < end):
+                _accumulate(totals, tuple(event[i] for i in indexes), 1, event[6])
+
+    results = [{**dict(zip(by, group)), "scans": count, "avg_latency_us": round(latency_sum / count, 1)}
+               for group, (count, latency_sum) in totals.items()]
+    results.sort(key=lambda row: -row["scans"])
+    return results
+
+
+def _accumulate(totals, group, count, latency_sum):
+    entry = totals.get(group)
+    if entry is None:
+        totals[group] = [count, latency_sum]
+    else:
+        entry[0] += count
+        entry[1] += latency_sum
+
+
+def _time_filter(start, end):
+    pa = _pyarrow()
+    conditions = []
+    if start is not None:
+        conditions.append(("ts", ">=", pa.scalar(round(start * 1000), pa.int64()).cast(pa.timestamp("ms", tz="UTC"))))
+    if end is not None:
+        conditions.append(("ts", "<", pa.scalar(round(end * 1000), pa.int64()).cast(pa.timestamp("ms", tz="UTC"))))
+    return conditions or None
+
+
+log = EventLog()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact or query the scan event log")
+    parser.add_argument("--dir", default=LOG_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("compact", help="Convert closed segments to Parquet")
+    query_parser = commands.add_parser("query", help="Scans per group over a time range")
+    query_parser.add_argument("--hours", type=float, default=24, help="How far back to look")
+    query_parser.add_argument("--by", nargs="+", default=["status", "source"], choices=COLUMNS[1:])
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        for path, target, count in compact(args.dir):
+            print(f"📦 {os.path.basename(path)} -> {target and os.path.basename(target)} ({count} events)")
+        return
+    end = time.time()
+    for row in query(end - args.hours * 3600, end, args.by, args.dir):
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""Azure Functions entry point (Python v2 programming model, see host.json).
+
+Every route of main:app is served through the Functions ASGI adapter. The
+host doesn't run the FastAPI lifespan, so startup.StartupMiddleware does the
+schema/prefilter/cache warm-up on the first request of each instance. The
+scoring model is loaded on the first unknown ID rather than during that
+first request; set SMARTSHIELD_PRELOAD_MODEL=1 to load it up front instead.
+"""
+import os
+
+os.environ.setdefault("SMARTSHIELD_PRELOAD_MODEL", "0")
+
+import azure.functions as func
+
+import main
+
+app = func.AsgiFunctionApp(app=main.app, http_auth_level=func.AuthLevel.ANONYMOUS)
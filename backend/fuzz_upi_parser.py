@@ -0,0 +1,75 @@
+"""Mutation fuzzer for upi_parser.parse.
+
+Mutates the seeds in upi_fuzz_corpus.txt and checks the parser's invariants:
+it never raises, canonical IDs are stable, and any VPA it returns is valid.
+Usage: python fuzz_upi_parser.py [--iterations 200000] [--seed 1]
+"""
+import argparse
+import os
+import random
+
+import upi_parser
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upi_fuzz_corpus.txt")
+INTERESTING = ["@", "?", "&", "=", "%", "%4", "%40", "+", "upi://", "pay?", "pa=", "pn=", "am=",
+               " ", "\t", "\x00", "а", "‮", "İ", "ß", "9" * 40, "a" * 300]
+
+
+def load_corpus(path=CORPUS_FILE):
+    with open(path, encoding="utf-8") as f:
+        return [
+            line.rstrip("\n").encode("utf-8").decode("unicode_escape").encode("latin-1").decode("utf-8")
+            for line in f
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+def mutate(rng, text):
+    for _ in range(rng.randint(1, 4)):
+        op = rng.randrange(4)
+        pos = rng.randint(0, len(text))
+        if op == 0:
+            text = text[:pos] + rng.choice(INTERESTING) + text[pos:]
+        elif op == 1 and text:
+            text = text[:pos] + text[pos + rng.randint(1, 5):]
+        elif op == 2:
+            text = text[:pos] + chr(rng.randrange(0, 0x3000)) + text[pos:]
+        else:
+            text = text.swapcase() if rng.random() < 0.5 else text + text[:pos]
+    return text
+
+
+def check(text):
+    payload = upi_parser.parse(text)
+    assert isinstance(payload.canonical_id, str)
+    if payload.vpa is not None:
+        assert payload.canonical_id == payload.vpa
+        assert upi_parser.canonical_vpa(payload.vpa) == payload.vpa
+        # The canonical form must map to itself, so repeat scans hit the same row
+        assert upi_parser.parse(payload.vpa).canonical_id == payload.vpa
+    if payload.amount is not None:
+        assert payload.amount >= 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus()
+    for text in corpus:
+        check(text)
+    for i in range(args.iterations):
+        text = mutate(rng, rng.choice(corpus))
+        try:
+            check(text)
+        except Exception:
+            print(f"❌ Failure on iteration {i}: {text!r}")
+            raise
+    print(f"✅ {len(corpus)} seeds + {args.iterations} mutations passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,122 @@
-import matplotlib.pyplot as plt
-import numpy as np
+"""Draw benchmark charts from results recorded by stress_test.py --output.
+
+Usage: python generate_charts.py bench_results/*.json [--output-dir charts]
+
+One results file gives the latency distribution, throughput timeline and
+error breakdown; several files (e.g. a sweep over --concurrency or --rate)
+also give the load-vs-latency curve.
+"""
+import argparse
+import json
 import os
 
-# Data Simulation based on Stress Test Report (Avg Latency 10.91ms, 1659 req/s)
-# We generate synthetic data points that align with these aggregate metrics.
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from bench_utils import LatencyHistogram
+
+DEFAULT_OUTPUT_DIR = "charts"
+
+
+def load_results(paths):
+    runs = []
+    for path in paths:
+        with open(path) as f:
+            results = json.load(f)
+        results["_name"] = os.path.splitext(os.path.basename(path))[0]
+        runs.append(results)
+    return runs
+
 
-OUTPUT_DIR = "/Users/gauravyadav/.gemini/antigravity/brain/30f5e99a-1ea1-4271-8968-18bfc2cecc06"
+def load_level(run):
+    config = run["config"]
+    return config["rate"] if config["mode"] == "open" else config["concurrency"]
 
-def generate_charts():
+
+def generate_charts(runs, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
     print("Generating charts...")
-    
-    # --- 1. Latency Distribution (Histogram) ---
-    # Generate 1000 data points with a normal distribution centered around 10.9ms
-    latencies = np.random.normal(loc=10.91, scale=2.5, size=1000)
-    latencies = latencies[latencies > 0] # Ensure no negative latency
 
+    # --- 1. Latency Distribution (Histogram) ---
     plt.figure(figsize=(8, 6))
-    plt.hist(latencies, bins=30, color='#3b82f6', edgecolor='black', alpha=0.7)
-    plt.axvline(x=10.91, color='red', linestyle='--', label='Avg: 10.91ms')
+    for run in runs:
+        hist = LatencyHistogram.from_dict(run["histogram"])
+        buckets = hist.buckets()
+        plt.step([v / 1000 for v, _ in buckets], [c for _, c in buckets], where="mid",
+                 label=f"{run['_name']} (p99 {run['latency_ms']['p99']:.2f}ms)")
+    plt.xscale("log")
     plt.title('Latency Distribution (ms)')
-    plt.xlabel('Response Time (ms)')
-    plt.ylabel('Frequency')
+    plt.xlabel('Response Time (ms, log scale)')
+    plt.ylabel('Requests per bucket')
     plt.legend()
     plt.grid(True, alpha=0.3)
-    plt.savefig(f"{OUTPUT_DIR}/chart_latency_distribution.png")
+    plt.savefig(f"{output_dir}/chart_latency_distribution.png")
     plt.close()
     print("Generated chart_latency_distribution.png")
 
     # --- 2. Throughput vs Time ---
-    # Simulate throughput over a 60-second test window
-    time_secs = np.arange(0, 60, 1)
-    # Slight variance around the 1659 req/sec mark
-    throughput = np.random.normal(loc=1659, scale=50, size=60)
-    
     plt.figure(figsize=(10, 5))
-    plt.plot(time_secs, throughput, color='#10b981', linewidth=2)
+    for run in runs:
+        plt.plot(range(len(run["timeline_rps"])), run["timeline_rps"], linewidth=2, label=run["_name"])
     plt.title('Throughput Stability (Requests/Sec)')
     plt.xlabel('Time (s)')
     plt.ylabel('Req/Sec')
+    plt.legend()
     plt.grid(True, alpha=0.3)
-    plt.ylim(1000, 2000)
-    plt.savefig(f"{OUTPUT_DIR}/chart_throughput_time.png")
+    plt.savefig(f"{output_dir}/chart_throughput_time.png")
     plt.close()
     print("Generated chart_throughput_time.png")
 
-    # --- 3. Concurrency Stability Curve ---
-    # Relationship between concurrent users and latency
-    users = np.array([1, 10, 25, 50, 75, 100, 150, 200])
-    # Latency increases slightly with load, but stays stable (linear-ish)
-    latency_curve = 5 + (users * 0.08) + np.random.normal(0, 0.5, len(users))
-
-    plt.figure(figsize=(8, 6))
-    plt.plot(users, latency_curve, marker='o', color='#8b5cf6', linewidth=2)
-    plt.title('Concurrency Stability (Users vs Latency)')
-    plt.xlabel('Concurrent Users')
-    plt.ylabel('Avg Latency (ms)')
-    plt.grid(True, alpha=0.3)
-    plt.savefig(f"{OUTPUT_DIR}/chart_concurrency_stability.png")
-    plt.close()
-    print("Generated chart_concurrency_stability.png")
+    # --- 3. Load vs Latency (needs a sweep) ---
+    by_mode = {}
+    for run in runs:
+        by_mode.setdefault(run["config"]["mode"], []).append(run)
+    for mode, mode_runs in by_mode.items():
+        if len(mode_runs) < 2:
+            continue
+        mode_runs.sort(key=load_level)
+        levels = [load_level(r) for r in mode_runs]
+        plt.figure(figsize=(8, 6))
+        for pct, color in (("p50", '#10b981'), ("p99", '#8b5cf6'), ("p99_9", '#ef4444')):
+            plt.plot(levels, [r["latency_ms"][pct] for r in mode_runs], marker='o', color=color,
+                     linewidth=2, label=pct.replace("_", "."))
+        plt.title('Concurrency Stability (Users vs Latency)' if mode == "closed" else 'Offered Load vs Latency')
+        plt.xlabel('Concurrent Users' if mode == "closed" else 'Arrival Rate (req/s)')
+        plt.ylabel('Latency (ms)')
+        plt.legend()
+        plt.grid(True, alpha=0.3)
+        plt.savefig(f"{output_dir}/chart_{mode}_load_latency.png")
+        plt.close()
+        print(f"Generated chart_{mode}_load_latency.png")
 
     # --- 4. Error Rate Bar Graph ---
-    # Comparison of requests
-    categories = ['Success (200 OK)', 'Client Error (4xx)', 'Server Error (5xx)']
-    values = [5000, 15, 0] # Representing a larger test run
-    colors = ['#10b981', '#f59e0b', '#ef4444']
+    categories = ['Success (2xx)', 'Client Error (4xx)', 'Server Error (5xx)', 'Transport Error']
+    colors = ['#10b981', '#f59e0b', '#ef4444', '#64748b']
+    totals = [0, 0, 0, 0]
+    for run in runs:
+        for status, count in run["statuses"].items():
+            if status.startswith("2"):
+                totals[0] += count
+            elif status.startswith("5"):
+                totals[2] += count
+            else:
+                totals[1] += count
+        totals[3] += sum(run["errors"].values())
 
     plt.figure(figsize=(8, 6))
-    bars = plt.bar(categories, values, color=colors)
+    bars = plt.bar(categories, totals, color=colors)
     plt.title('Error Rate Analysis')
     plt.ylabel('Total Requests')
     plt.bar_label(bars)
-    plt.savefig(f"{OUTPUT_DIR}/chart_error_rate.png")
+    plt.savefig(f"{output_dir}/chart_error_rate.png")
     plt.close()
     print("Generated chart_error_rate.png")
 
+
 if __name__ == "__main__":
-    generate_charts()
+    parser = argparse.ArgumentParser(description="Draw charts from stress_test.py results")
+    parser.add_argument("results", nargs="+", help="Results JSON files")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+    generate_charts(load_results(args.results), args.output_dir)
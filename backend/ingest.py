@@ -0,0 +1,283 @@
+"""Bulk merchant ingestion: stream a CSV or JSONL registry into `merchants`.
+
+Rows are validated against the banking schema and upserted in large
+transactions on a dedicated connection with relaxed durability
+(synchronous=OFF, WAL auto-checkpointing paused). For big loads the
+secondary indexes and the search index are dropped first and rebuilt once
+at the end. Progress is checkpointed after every committed batch so an
+interrupted load resumes where it stopped.
+
+Usage:
+  python ingest.py registry.csv
+  python ingest.py registry.jsonl --batch-size 100000 --rejects rejects.jsonl
+  python ingest.py registry.csv --no-resume --keep-indexes
+
+Input columns: upi_id, legal_name, trust_score, category, is_verified.
+Run it while the API is stopped (or restart the API afterwards): running
+servers keep their own caches.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import database
+from upi_parser import canonical_vpa
+
+DEFAULT_BATCH_SIZE = 50000
+MAX_NAME_LENGTH = 200
+# For smaller sources, maintaining the indexes row by row is cheaper than a rebuild
+REBUILD_INDEX_MIN_BYTES = 5 * 1024 * 1024
+
+SQL_UPSERT_MERCHANT = '''
+    INSERT INTO merchants (upi_id, legal_name, trust_score, category, is_verified)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (upi_id) DO UPDATE SET
+        legal_name = excluded.legal_name,
+        trust_score = excluded.trust_score,
+        category = excluded.category,
+        is_verified = excluded.is_verified
+'''
+
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA synchronous = OFF",
+    "PRAGMA wal_autocheckpoint = 0",
+    "PRAGMA cache_size = -262144",  # 256 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"0", "false", "no", "n", "f", ""}
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def validate_row(raw):
+    """Turn one input record into a merchants tuple, or raise InvalidRow."""
+    upi_id = canonical_vpa(str(raw.get("upi_id") or ""))
+    if upi_id is None:
+        raise InvalidRow(f"invalid upi_id {raw.get('upi_id')!r}")
+
+    legal_name = str(raw.get("legal_name") or "").strip()
+    if not legal_name or len(legal_name) > MAX_NAME_LENGTH:
+        raise InvalidRow("legal_name must be 1-200 characters")
+
+    try:
+        trust_score = int(raw.get("trust_score"))
+    except (TypeError, ValueError):
+        raise InvalidRow(f"trust_score {raw.get('trust_score')!r} is not an integer")
+    if not 0 <= trust_score <= 100:
+        raise InvalidRow(f"trust_score {trust_score} outside 0-100")
+
+    category = str(raw.get("category") or "").strip()
+    if not category:
+        raise InvalidRow("category is required")
+
+    verified = raw.get("is_verified")
+    if isinstance(verified, bool):
+        is_verified = int(verified)
+    elif str(verified).strip().lower() in TRUE_VALUES:
+        is_verified = 1
+    elif str(verified).strip().lower() in FALSE_VALUES:
+        is_verified = 0
+    else:
+        raise InvalidRow(f"is_verified {verified!r} is not a boolean")
+
+    return upi_id, legal_name, trust_score, category, is_verified
+
+
+# --- READERS ---
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"_error": f"bad JSON: {e}"}
+
+
+def open_source(path, fmt=None):
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    return read_jsonl(path) if fmt == "jsonl" else read_csv(path)
+
+
+# --- CHECKPOINTS ---
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(checkpoint_path, fingerprint):
+    """Records already committed for this exact source file (0 if none or if the file changed)."""
+    try:
+        with open(checkpoint_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if any(state.get(k) != v for k, v in fingerprint.items()):
+        print("ℹ️  Checkpoint is for a different version of the source; starting over.")
+        return 0
+    return state.get("records", 0)
+
+
+def save_checkpoint(checkpoint_path, fingerprint, records):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**fingerprint, "records": records, "updated_at": time.time()}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+# --- LOADING ---
+
+def drop_secondary_indexes(conn):
+    """Drop the filter indexes and the FTS index; init_search_index/init_db recreate them."""
+    for name in ("merchants_fts_insert", "merchants_fts_delete", "merchants_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE IF EXISTS merchants_fts")
+    for statement in database.MERCHANT_INDEXES:
+        index_name = statement.split(" ON ")[0].split()[-1]
+        conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+def rebuild_secondary_indexes(conn):
+    for statement in database.MERCHANT_INDEXES:
+        conn.execute(statement)
+    database.init_search_index(conn)
+
+
+class IngestStats:
+    def __init__(self):
+        self.read = 0
+        self.upserted = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    def rows_per_second(self):
+        return self.upserted / max(1e-9, time.perf_counter() - self.started)
+
+
+def ingest_records(records, batch_size=DEFAULT_BATCH_SIZE, rebuild_indexes=False, skip=0,
+                   on_batch=None, rejects=None, quiet=False):
+    """Validate and upsert an iterable of dict records into merchants.
+
+    `skip` records are passed over first (resume). `on_batch(records_done)` is
+    called after each commit. Invalid rows are counted and, if `rejects` is a
+    file object, written to it as JSON lines.
+    """
+    database.init_db()
+    database.close_pool()  # The load uses its own connection; don't hold pool connections open
+    stats = IngestStats()
+
+    conn = sqlite3.connect(database.DB_NAME, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        for pragma in BULK_LOAD_PRAGMAS:
+            conn.execute(pragma)
+        if rebuild_indexes:
+            drop_secondary_indexes(conn)
+
+        batch = []
+
+        def commit_batch():
+            conn.execute("BEGIN")
+            conn.executemany(SQL_UPSERT_MERCHANT, batch)
+            conn.execute("COMMIT")
+            stats.upserted += len(batch)
+            batch.clear()
+            if on_batch:
+                on_batch(stats.read)
+            if not quiet:
+                print(f"   {stats.read:>12,} records read  {stats.upserted:>12,} upserted  "
+                      f"{stats.rejected:>8,} rejected  {stats.rows_per_second():>10,.0f} rows/s")
+
+        for record in records:
+            stats.read += 1
+            if stats.read <= skip:
+                stats.skipped += 1
+                continue
+            try:
+                if "_error" in record:
+                    raise InvalidRow(record["_error"])
+                batch.append(validate_row(record))
+            except InvalidRow as e:
+                stats.rejected += 1
+                if rejects is not None:
+                    rejects.write(json.dumps({"record": stats.read, "error": str(e), "row": record}, default=str) + "\n")
+            if len(batch) >= batch_size:
+                commit_batch()
+        if batch:
+            commit_batch()
+
+        if rebuild_indexes:
+            if not quiet:
+                print("🔧 Rebuilding indexes...")
+            conn.execute("BEGIN")
+            rebuild_secondary_indexes(conn)
+            conn.execute("COMMIT")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+        database.merchant_cache.clear()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load merchants from CSV or JSONL",
+                                     epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="CSV or JSONL file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <source>.checkpoint)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--keep-indexes", action="store_true", help="Maintain indexes during the load")
+    parser.add_argument("--rejects", help="Write invalid rows here as JSON lines")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or args.source + ".checkpoint"
+    fingerprint = source_fingerprint(args.source)
+    skip = 0 if args.no_resume else load_checkpoint(checkpoint_path, fingerprint)
+    if skip:
+        print(f"⏩ Resuming after {skip:,} records already loaded.")
+
+    rebuild = not args.keep_indexes and fingerprint["size"] >= REBUILD_INDEX_MIN_BYTES
+    print(f"🚚 Ingesting {args.source} into '{database.DB_NAME}' "
+          f"({'rebuilding' if rebuild else 'maintaining'} indexes)...")
+
+    rejects = open(args.rejects, "a", encoding="utf-8") if args.rejects else None
+    try:
+        stats = ingest_records(
+            open_source(args.source, args.format),
+            batch_size=args.batch_size,
+            rebuild_indexes=rebuild,
+            skip=skip,
+            on_batch=lambda done: save_checkpoint(checkpoint_path, fingerprint, done),
+            rejects=rejects,
+        )
+    finally:
+        if rejects:
+            rejects.close()
+
+    elapsed = time.perf_counter() - stats.started
+    print(f"✅ Done: {stats.upserted:,} rows upserted, {stats.rejected:,} rejected, "
+          f"{stats.skipped:,} skipped (resume) in {elapsed:.1f}s → {stats.rows_per_second():,.0f} rows/s")
+    return 0 if stats.upserted or stats.read else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import bisect
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+KEYWORDS_FILE = os.environ.get(
+    "SMARTSHIELD_KEYWORDS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fraud_keywords.txt"),
+)
+RELOAD_CHECK_INTERVAL = 2.0  # Seconds between mtime checks of the keywords file
+SUSPICION_THRESHOLD = 1.0    # Summed match weight at which an ID is flagged
+
+# Used when the keywords file is missing or empty.
+DEFAULT_KEYWORDS = ["scam", "free", "lottery", "winner", "prize", "urgent", "claim", "gift", "doubler", "investment"]
+
+KeywordMatch = namedtuple("KeywordMatch", ["keyword", "position", "weight"])
+
+
+def _trie_pattern(node):
+    """Render a character trie as a regex so shared prefixes are matched once."""
+    alternatives = []
+    for char in sorted(k for k in node if k):
+        child = node[char]
+        suffix = _trie_pattern(child) if len(child) > 1 or "" not in child else ""
+        alternatives.append(re.escape(char) + suffix)
+    pattern = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+    if "" in node:
+        # A keyword ends here; the rest is optional (greedy, so the longest keyword wins)
+        pattern = "(?:" + pattern + ")?"
+    return pattern
+
+
+class KeywordEngine:
+    """Immutable keyword set compiled into a single trie-shaped regex.
+
+    One pass over the text finds every (non-overlapping, longest-first) match,
+    regardless of how many patterns are loaded.
+    """
+
+    def __init__(self, weighted_keywords):
+        self.weights = {}
+        for keyword, weight in weighted_keywords:
+            keyword = keyword.strip().lower()
+            if keyword:
+                self.weights[keyword] = weight
+        trie = {}
+        for keyword in self.weights:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+        self._regex = re.compile(_trie_pattern(trie)) if trie else None
+
+    def __len__(self):
+        return len(self.weights)
+
+    def scan(self, text):
+        """Return every keyword match in `text` (expected lowercase) with position and weight."""
+        if self._regex is None:
+            return []
+        weights = self.weights
+        return [KeywordMatch(m.group(), m.start(), weights[m.group()]) for m in self._regex.finditer(text)]
+
+    def scan_many(self, texts):
+        """Scan a batch of texts in one regex pass; returns one match list per text.
+
+        The texts are joined with newlines (keywords never contain one), matched
+        together, and each match is mapped back to its text and local position.
+        """
+        results = [[] for _ in texts]
+        if self._regex is None or not texts:
+            return results
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        weights = self.weights
+        for m in self._regex.finditer("\n".join(texts)):
+            index = bisect.bisect_right(starts, m.start()) - 1
+            results[index].append(KeywordMatch(m.group(), m.start() - starts[index], weights[m.group()]))
+        return results
+
+
+def parse_keywords_file(path):
+    """Read `keyword[,weight]` lines; blank lines and `#` comments are skipped."""
+    weighted = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            keyword, _, weight = line.rpartition(",") if "," in line else (line, "", "")
+            weighted.append((keyword, float(weight) if weight else 1.0))
+    return weighted
+
+
+class KeywordMatcher:
+    """Holds the live KeywordEngine and swaps in a new one when the file changes."""
+
+    def __init__(self, path=KEYWORDS_FILE):
+        self.path = path
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.engine = KeywordEngine((k, 1.0) for k in DEFAULT_KEYWORDS)
+        self.reload()
+
+    def reload(self):
+        """Recompile from the keywords file. Keeps the current engine if the file is bad."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                weighted = parse_keywords_file(self.path)
+            except FileNotFoundError:
+                return False
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not reload keywords from {self.path}: {e}")
+                return False
+            if weighted:
+                self.engine = KeywordEngine(weighted)  # Atomic reference swap
+            self._mtime = mtime
+            return True
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + RELOAD_CHECK_INTERVAL
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        return self.reload()
+
+    def scan(self, text):
+        self.reload_if_changed()
+        return self.engine.scan(text)
+
+    def scan_many(self, texts):
+        self.reload_if_changed()
+        return self.engine.scan_many(texts)
+
+
+def strongest(matches):
+    """The match reported to the user: highest weight, earliest position."""
+    return max(matches, key=lambda m: (m.weight, -m.position))
+
+
+def is_suspicious(matches):
+    return sum(m.weight for m in matches) >= SUSPICION_THRESHOLD
+
+
+matcher = KeywordMatcher()
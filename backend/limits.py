@@ -0,0 +1,95 @@
+"""Request-size limits and the quarantine counters for rejected input.
+
+Real QR payloads are a few hundred bytes, so anything much bigger is refused
+before the body is buffered or JSON-decoded.
+"""
+import threading
+
+from starlette.responses import JSONResponse
+
+MAX_QR_LENGTH = 2048              # Longest qr_text accepted by QRRequest
+MAX_BODY_BYTES = 8 * 1024         # /scan_qr and everything not listed below
+PATH_BODY_LIMITS = {
+    "/scan_qr/batch": 1024 * 1024,  # 1000 items with room for long deep links
+}
+
+
+class Quarantine:
+    """Counts pathological inputs by reason. Nothing counted here reaches the merchants table."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, reason):
+        with self._lock:
+            self.counts[reason] = self.counts.get(reason, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+quarantine = Quarantine()
+
+
+class BodySizeLimitMiddleware:
+    """Pure ASGI middleware: rejects oversized bodies with 413 while streaming.
+
+    A Content-Length over the limit is refused without reading a byte. Other
+    bodies are read chunk by chunk and refused as soon as they cross the limit,
+    so at most `limit` bytes are ever held; an accepted body is replayed to the app.
+    """
+
+    def __init__(self, app, default_limit=MAX_BODY_BYTES, path_limits=PATH_BODY_LIMITS):
+        self.app = app
+        self.default_limit = default_limit
+        self.path_limits = path_limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+
+        limit = self.path_limits.get(scope["path"], self.default_limit)
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > limit:
+                    return await self._reject(scope, receive, send, limit)
+                break
+
+        chunks = []
+        received = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Client went away mid-body; let the app see the disconnect
+                chunks = None
+                break
+            body = message.get("body", b"")
+            received += len(body)
+            if received > limit:
+                return await self._reject(scope, receive, send, limit)
+            chunks.append(body)
+            if not message.get("more_body", False):
+                break
+
+        if chunks is None:
+            replay = [message]
+        else:
+            replay = [{"type": "http.request", "body": b"".join(chunks), "more_body": False}]
+
+        async def replay_receive():
+            if replay:
+                return replay.pop()
+            return await receive()
+
+        await self.app(scope, replay_receive, send)
+
+    async def _reject(self, scope, receive, send, limit):
+        quarantine.record("body_too_large")
+        response = JSONResponse({"detail": f"Request body exceeds {limit} bytes"}, status_code=413)
+        await response(scope, receive, send)
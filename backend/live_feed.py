@@ -0,0 +1,222 @@
+"""Live threat feed: new fraud detections pushed to dashboards over Server-Sent Events.
+
+  publish     scan_qr's "New Threat Detected" branch calls publish_threat().
+              The event is encoded to SSE bytes once, however many clients
+              are listening; no DB query is made per event or per client
+  batch       events are fanned out by a callback scheduled on the event loop,
+              not inside publish(): everything published before it runs goes
+              out as one batch, each subscriber woken once for it. The busier
+              the loop (waking thousands of client tasks takes a while), the
+              bigger the batches, so wake-ups stay flat as the event rate
+              climbs. SMARTSHIELD_FEED_FLUSH_MS adds a delay to batch further
+  subscribers one per GET /feed/threats connection: a bounded deque of
+              encoded events and a waiter future. The client's task drains
+              the whole buffer into a single write, so a burst costs one send
+  slow        a subscriber whose buffer is full loses its oldest events; the
+              loss is coalesced into one "lagged" event ({"missed": n}) sent
+              ahead of what's left, so a slow client costs bounded memory
+              and never slows the publisher or anyone else
+  reconnect   the last REPLAY_EVENTS events are kept, so an EventSource that
+              reconnects with Last-Event-ID gets what it missed. Streams end
+              after MAX_STREAM_SECONDS and the browser reconnects by itself:
+              uvicorn's graceful shutdown waits for open responses, so no
+              stream may stay open for good
+
+Under serve.py each worker has its own hub, so events are relayed through the
+writer process (writer.publish_feed) to every worker, including the one that
+detected the threat. bench_live_feed.py measures fan-out latency.
+"""
+import asyncio
+import collections
+import json
+import os
+import time
+
+import writer
+
+BUFFER_EVENTS = int(os.environ.get("SMARTSHIELD_FEED_BUFFER", "64"))         # Per subscriber
+MAX_SUBSCRIBERS = int(os.environ.get("SMARTSHIELD_FEED_MAX_CLIENTS", "10000"))
+HEARTBEAT_SECONDS = float(os.environ.get("SMARTSHIELD_FEED_HEARTBEAT", "15"))  # Keeps proxies from timing out idle streams
+MAX_STREAM_SECONDS = float(os.environ.get("SMARTSHIELD_FEED_MAX_STREAM", "300"))
+FLUSH_SECONDS = float(os.environ.get("SMARTSHIELD_FEED_FLUSH_MS", "0")) / 1000.0
+REPLAY_EVENTS = 256
+RETRY_MS = 3000  # EventSource reconnect delay
+
+HEARTBEAT = b": keep-alive\n\n"
+
+
+def encode(event_id, kind, data):
+    """One SSE message, as bytes ready to be written to any client. No id leaves the client's Last-Event-ID alone."""
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {kind}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n".encode()
+
+
+def _wake(waiter, woken):
+    if not waiter.done():
+        waiter.set_result(woken)
+
+
+class Subscriber:
+    """One connected client: encoded events waiting to be written, oldest first."""
+
+    def __init__(self, capacity=BUFFER_EVENTS):
+        self.capacity = capacity
+        self.pending = collections.deque()
+        self.missed = 0
+        self.waiter = None  # Future the client's task sleeps on while the buffer is empty
+
+    def push(self, messages):
+        """Append a batch of encoded events, dropping the oldest past capacity, and wake the client."""
+        self.pending.extend(messages)
+        overflow = len(self.pending) - self.capacity
+        for _ in range(overflow):
+            self.pending.popleft()
+        if overflow > 0:
+            self.missed += overflow
+        if self.waiter is not None:
+            _wake(self.waiter, True)
+
+    async def wait(self, timeout):
+        """Sleep until an event is pushed (True) or timeout passes (False).
+
+        A bare future plus a timer rather than asyncio.wait_for(Event.wait()),
+        which creates a task per wait: with thousands of subscribers woken
+        on every flush, that was most of the fan-out cost.
+        """
+        loop = asyncio.get_running_loop()
+        self.waiter = loop.create_future()
+        timer = loop.call_later(timeout, _wake, self.waiter, False)
+        try:
+            return await self.waiter
+        finally:
+            timer.cancel()
+            self.waiter = None
+
+    def drain(self):
+        """Everything buffered as one chunk, led by a "lagged" event if some were dropped."""
+        parts = list(self.pending)
+        self.pending.clear()
+        if self.missed:
+            parts.insert(0, encode(None, "lagged", {"missed": self.missed}))
+            self.missed = 0
+        return b"".join(parts)
+
+
+class FeedHub:
+    """In-process fan-out of feed events to every subscriber. Event loop thread only."""
+
+    def __init__(self, buffer_events=BUFFER_EVENTS, max_subscribers=MAX_SUBSCRIBERS, flush_seconds=FLUSH_SECONDS):
+        self.buffer_events = buffer_events
+        self.max_subscribers = max_subscribers
+        self.flush_seconds = flush_seconds
+        self.subscribers = set()
+        self.recent = collections.deque(maxlen=REPLAY_EVENTS)  # (event id, encoded message)
+        self.batch = []  # Encoded events not yet fanned out
+        self.flush_handle = None
+        self.last_id = 0
+        self.loop = None
+        self.published = 0
+        self.delivered = 0
+        self.flushes = 0
+        self.rejected = 0
+
+    def bind(self, loop):
+        """The event loop subscribers live on; publish_threadsafe() hands events to it."""
+        self.loop = loop
+
+    def full(self):
+        if len(self.subscribers) >= self.max_subscribers:
+            self.rejected += 1
+            return True
+        return False
+
+    def subscribe(self, last_event_id=None):
+        """A new Subscriber, primed with the buffered events after last_event_id."""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.buffer_events)
+        if last_event_id is not None:
+            # Events still in self.batch are included; the next flush only reaches already-subscribed clients
+            subscriber.push([message for event_id, message in self.recent if event_id > last_event_id])
+            if self.recent and self.recent[0][0] > last_event_id + 1:
+                subscriber.missed += self.recent[0][0] - last_event_id - 1  # Older than the replay window
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, kind, data, event_id=None):
+        """Queue an event for every subscriber; it goes out with the next flush. Returns its id.
+
+        event_id is given for events relayed by the serve.py writer, which numbers them for all workers.
+        """
+        self.last_id = self.last_id + 1 if event_id is None else event_id
+        message = encode(self.last_id, kind, data)
+        self.recent.append((self.last_id, message))
+        self.batch.append(message)
+        self.published += 1
+        if self.flush_handle is None:
+            if self.loop is None:
+                self.loop = asyncio.get_running_loop()
+            self.flush_handle = self.loop.call_later(self.flush_seconds, self.flush)
+        return self.last_id
+
+    def flush(self):
+        """Fan the pending batch out to every subscriber."""
+        batch, self.batch, self.flush_handle = self.batch, [], None
+        for subscriber in self.subscribers:
+            subscriber.push(batch)
+        self.delivered += len(batch) * len(self.subscribers)
+        self.flushes += 1
+
+    def publish_threadsafe(self, kind, data, event_id=None):
+        """publish() from another thread (the serve.py writer relay)."""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.publish, kind, data, event_id)
+
+    async def stream(self, last_event_id=None, heartbeat=HEARTBEAT_SECONDS, max_seconds=MAX_STREAM_SECONDS):
+        """SSE body for one client: replayed events, then live ones as they arrive.
+
+        Subscribes on the first iteration, so a response that never starts never leaks a subscriber.
+        """
+        subscriber = self.subscribe(last_event_id)
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            while True:
+                if not subscriber.pending and not subscriber.missed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    if not await subscriber.wait(min(heartbeat, remaining)):
+                        yield HEARTBEAT
+                        continue
+                yield subscriber.drain()
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "flushes": self.flushes,
+            "lagging": sum(1 for subscriber in self.subscribers if subscriber.missed),
+            "rejected": self.rejected,
+            "last_event_id": self.last_id,
+        }
+
+
+feed = FeedHub()
+# Events relayed by the serve.py writer arrive on the writer-inbox thread
+writer.on_feed(feed.publish_threadsafe)
+
+
+def publish_threat(upi_id, verdict):
+    """Announce a newly detected threat to every connected dashboard, on every worker."""
+    event = {"upi_id": upi_id, "score": verdict["score"], "message": verdict["message"], "ts": round(time.time(), 3)}
+    if writer.relays_feed():
+        writer.publish_feed("threat", event)
+    else:
+        feed.publish("threat", event)
@@ -0,0 +1,188 @@
+"""Typosquat detection: is an unknown VPA a near-copy of a verified merchant's?
+
+Handles are compared after homoglyph normalization, so `amaz0n@upi`,
+`star.bucks@ybl`, Cyrillic look-alike letters and `rn`-for-`m` tricks
+collapse onto the handle they imitate. Only characters that are near
+identical on screen are folded: a looser table (3 for e, i for l) turns
+ordinary names into matches. A handle that only equals a verified one after
+normalization (distance 0), or is within MAX_DISTANCE edits of one
+(Damerau/OSA: insert, delete, substitute, swap two neighbours), is a
+lookalike. The same handle on another PSP is not: merchants hold one VPA
+per bank, and starbucks@okhdfc is Starbucks, not an imitation of it.
+
+A match is a warning, not proof: scan_qr answers SUSPICIOUS and doesn't
+register the ID, so a false positive never becomes a blacklist entry.
+
+Candidates come from a SymSpell-style deletion index: every verified handle
+is stored under each string obtained by deleting up to MAX_DISTANCE
+characters, and a query only looks up its own deletions. That is
+O(len(handle)^MAX_DISTANCE) dict probes per query however many merchants are
+verified, instead of one edit-distance computation per merchant
+(bench_lookalike.py). Adds are incremental; rows whose score is raised to 100
+in place (not inserted) are only picked up by a full load.
+"""
+import os
+import unicodedata
+
+MAX_DISTANCE = int(os.environ.get("SMARTSHIELD_LOOKALIKE_MAX_DISTANCE", "1"))
+# Shorter handles only match exactly: at 4 letters one edit away is mostly unrelated names
+MIN_FUZZY_LENGTH = int(os.environ.get("SMARTSHIELD_LOOKALIKE_MIN_LENGTH", "5"))
+MIN_EXACT_LENGTH = 3
+
+# Characters that render (nearly) the same as a Latin letter: 0/1/| and Cyrillic/Greek confusables
+HOMOGLYPHS = str.maketrans({
+    "0": "o", "1": "l", "|": "l",
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "х": "x", "у": "y", "к": "k",
+    "і": "i", "ј": "j", "ѕ": "s",
+    "α": "a", "ο": "o", "ρ": "p", "ι": "i", "κ": "k", "ν": "v", "υ": "u",
+})
+MULTI_CHAR_GLYPHS = (("rn", "m"), ("vv", "w"))
+SEPARATORS = str.maketrans("", "", "._- ")
+
+
+def normalize(handle):
+    """Fold a handle onto the letters it looks like."""
+    folded = unicodedata.normalize("NFKC", handle).lower().translate(SEPARATORS).translate(HOMOGLYPHS)
+    for glyphs, letter in MULTI_CHAR_GLYPHS:
+        folded = folded.replace(glyphs, letter)
+    return folded
+
+
+def split_vpa(upi_id):
+    handle, _, psp = upi_id.rpartition("@")
+    return (handle, psp) if handle else (upi_id, "")
+
+
+def deletions(word, distance):
+    """Every string reachable from `word` by deleting 1..distance characters."""
+    found = set()
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    found.discard(word)
+    return found
+
+
+def osa_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it's clearly over `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _add_to(table, key, value):
+    # One string for the common single-owner key; a list only when keys collide
+    existing = table.get(key)
+    if existing is None:
+        table[key] = value
+    elif isinstance(existing, list):
+        if value not in existing:
+            existing.append(value)
+    elif existing != value:
+        table[key] = [existing, value]
+
+
+def _values(table, key):
+    value = table.get(key)
+    if value is None:
+        return ()
+    return value if isinstance(value, list) else (value,)
+
+
+class LookalikeIndex:
+    """Normalized handles of verified merchants with a deletion index over them."""
+
+    def __init__(self, max_distance=MAX_DISTANCE, min_fuzzy_length=MIN_FUZZY_LENGTH):
+        self.max_distance = max_distance
+        self.min_fuzzy_length = min_fuzzy_length
+        self._owners = {}     # normalized handle -> verified upi_id(s)
+        self._deletions = {}  # deletion of a normalized handle -> normalized handle(s)
+        self.merchants = 0
+        self.max_rowid = 0
+        self.loaded = False
+        self.queries = 0
+        self.matches = 0
+
+    def rebuild(self, rows):
+        """Replace the contents with (rowid, upi_id) rows."""
+        fresh = LookalikeIndex(self.max_distance, self.min_fuzzy_length)
+        for rowid, upi_id in rows:
+            fresh.add(upi_id, rowid)
+        # Reference swap so a concurrent match() sees the old index or the new one, never half of it
+        self._owners, self._deletions = fresh._owners, fresh._deletions
+        self.merchants, self.max_rowid = fresh.merchants, fresh.max_rowid
+        self.loaded = True
+
+    def add(self, upi_id, rowid=None):
+        handle = normalize(split_vpa(upi_id)[0])
+        if rowid is not None:
+            self.max_rowid = max(self.max_rowid, rowid)
+        if len(handle) < MIN_EXACT_LENGTH or upi_id in _values(self._owners, handle):
+            return
+        _add_to(self._owners, handle, upi_id)
+        self.merchants += 1
+        if len(handle) >= self.min_fuzzy_length:
+            for variant in deletions(handle, self.max_distance):
+                _add_to(self._deletions, variant, handle)
+
+    def match(self, upi_id):
+        """(verified upi_id it imitates, edit distance) or None."""
+        self.queries += 1
+        raw_handle = split_vpa(upi_id)[0].lower()
+        handle = normalize(raw_handle)
+        if len(handle) < MIN_EXACT_LENGTH:
+            return None
+        # Distance 0 only when the look-alike characters were swapped in, not for the same handle elsewhere
+        owners = _values(self._owners, handle)
+        if any(split_vpa(owner)[0] == raw_handle for owner in owners):
+            return None
+        if owners:
+            self.matches += 1
+            return owners[0], 0
+        if len(handle) < self.min_fuzzy_length:
+            return None
+
+        # Candidates share a deletion with the query: the query itself may be a
+        # deletion of them, they may be a deletion of it, or both lost one character
+        variants = deletions(handle, self.max_distance)
+        candidates = set(_values(self._deletions, handle))
+        for variant in variants:
+            candidates.update(_values(self._deletions, variant))
+            if variant in self._owners:
+                candidates.add(variant)
+        candidates.discard(handle)  # Same handle: only the exact check above decides
+        best = None
+        for candidate in candidates:
+            distance = osa_distance(handle, candidate, self.max_distance)
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (candidate, distance)
+        if best is None:
+            return None
+        self.matches += 1
+        return _values(self._owners, best[0])[0], best[1]
+
+    def stats(self):
+        return {
+            "loaded": self.loaded,
+            "verified_merchants": self.merchants,
+            "index_keys": len(self._owners) + len(self._deletions),
+            "max_distance": self.max_distance,
+            "queries": self.queries,
+            "matches": self.matches,
+        }
+
+
+index = LookalikeIndex()
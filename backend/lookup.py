@@ -0,0 +1,62 @@
+"""Merchant resolution for the request path.
+
+Order: registrations still waiting in the write-behind queue, then the
+memory-mapped snapshot (if one is published), then the Bloom prefilter, then
+the merchant cache, then SQLite on the DB executor. Only IDs the snapshot
+doesn't hold and the prefilter can't rule out reach SQLite.
+"""
+import async_db
+import database
+import snapshot
+import write_behind
+
+
+async def find_merchant(upi_id):
+    merchant, _ = await resolve_merchant(upi_id)
+    return merchant
+
+
+async def resolve_merchant(upi_id):
+    """(merchant or None, stage): "cache" if memory answered, "db" if SQLite was queried."""
+    pending = write_behind.queue.get(upi_id)
+    if pending is not None:
+        return pending, "cache"
+    merchant = snapshot.store.get(upi_id)
+    if merchant is not None:
+        return merchant, "cache"
+    if await definitely_unknown(upi_id):
+        return None, "cache"
+    cached = database.get_cached_merchant(upi_id)
+    if cached is not None:
+        return (None if cached is database.MISSING else cached), "cache"
+    return await async_db.load_merchant(upi_id), "db"
+
+
+async def find_merchants(upi_ids):
+    """Bulk variant: {upi_id: merchant} for every ID that is known or pending."""
+    found = {}
+    remaining = []
+    for upi_id in upi_ids:
+        merchant = write_behind.queue.get(upi_id)
+        if merchant is None:
+            merchant = snapshot.store.get(upi_id)
+        if merchant is not None:
+            found[upi_id] = merchant
+        else:
+            remaining.append(upi_id)
+    await refresh_filter_if_due()
+    remaining = [upi_id for upi_id in remaining if database.merchant_filter.might_contain(upi_id) is not False]
+    if remaining:
+        found.update(await async_db.get_merchants_bulk(remaining))
+    return found
+
+
+async def refresh_filter_if_due():
+    """Pull rows other processes inserted since the last refresh into the prefilter."""
+    if database.merchant_filter.loaded and database.merchant_filter.refresh_due():
+        await async_db.refresh_merchant_filter()
+
+
+async def definitely_unknown(upi_id):
+    await refresh_filter_if_due()
+    return database.merchant_filter.might_contain(upi_id) is False
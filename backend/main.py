@@ -1,8 +1,59 @@
-from fastapi import FastAPI
+import startup  # First, so its clock covers the rest of this import
+
+import gzip
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from typing_extensions import Annotated
+
+import async_db
+import dashboard
+import database
+import event_log
+import keywords
+import limits
+import live_feed
+import lookalike
+import lookup
+import metrics
+import ratelimit
+import reputation
+import scoring
+import snapshot
+import trust_sync
+import upi_parser
+import write_behind
+import writer
+
+@asynccontextmanager
+async def lifespan(app):
+    metrics.start_logging()
+    # Schema, Bloom prefilter, cache warm-up and write-behind threads (see startup.py)
+    await startup.start()
+    yield
+    startup.stop()
+    metrics.stop_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+# Refuse oversized bodies before they are buffered or JSON-decoded
+# (added first so CORS, the outermost layer, still decorates the 413s)
+app.add_middleware(limits.BodySizeLimitMiddleware)
 
-app = FastAPI()
+# Hosts that never send lifespan events (Azure Functions) start up on the first request
+app.add_middleware(startup.StartupMiddleware)
+
+# Per-client token buckets: over-limit scans and reports get a 429 before their body is even read
+app.add_middleware(ratelimit.RateLimitMiddleware)
+app.add_middleware(ratelimit.RateLimitMiddleware, budget=ratelimit.reports, paths=ratelimit.REPORT_PATHS)
 
 # Enable CORS
 app.add_middleware(
@@ -11,98 +62,429 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Pydantic Model
+QRText = Annotated[str, Field(max_length=limits.MAX_QR_LENGTH)]
+
 class QRRequest(BaseModel):
-    qr_text: str
+    qr_text: QRText
 
-# --- 3. DATABASE CONNECTION (SQLite - SmartShield) ---
-from database import get_merchant, add_merchant, get_all_merchants
+MAX_BATCH_SIZE = 1000
 
-FRAUD_KEYWORDS = ["scam", "free", "lottery", "winner", "prize", "urgent", "claim", "gift", "doubler", "investment"]
+class BatchQRRequest(BaseModel):
+    qr_texts: List[QRText] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class ReportRequest(BaseModel):
+    qr_text: QRText
+    verdict: Literal["fraud", "safe"]
+
+@app.exception_handler(RequestValidationError)
+async def count_invalid_requests(request, exc):
+    too_long = any(error.get("type") == "string_too_long" for error in exc.errors())
+    limits.quarantine.record("qr_text_too_long" if too_long else "invalid_request")
+    return await request_validation_exception_handler(request, exc)
+
+# --- 3. DATABASE CONNECTION (SQLite - SmartShield) ---
+# Reads go through lookup (write-behind queue -> cache -> async_db executor); new IDs
+# are registered via the write-behind queue so scans never wait on SQLite's write lock.
+from database import merchant_cache
 
 @app.get("/merchants")
-async def get_merchants():
-    """Fetch all merchants for the dashboard."""
-    merchants = get_all_merchants()
-    return merchants
+async def get_merchants(
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=database.MAX_PAGE_SIZE),
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    max_score: Optional[int] = Query(None, ge=0, le=100),
+    category: Optional[str] = None,
+    verified: Optional[bool] = None,
+    q: Optional[str] = Query(None, max_length=100),
+):
+    """Fetch merchants for the dashboard, newest first.
 
-@app.post("/scan_qr")
-async def scan_qr(request: QRRequest):
-    qr_text = request.qr_text.lower() # Normalize to lowercase
-    
-    # --- STEP 1: DATABASE CHECK (The "Bank" Verification) ---
-    merchant = get_merchant(qr_text)
-    
-    if merchant:
-        # A. WHITELIST CHECK (Trusted)
-        if merchant["trust_score"] == 100:
-            return {
-                "status": "SAFE",
-                "score": 100,
-                "message": f"SAFE - Verified Merchant: {merchant['legal_name']}"
-            }
-            
-        # B. BLACKLIST CHECK (Fraud)
-        elif merchant["trust_score"] == 0:
+    Pass the returned `next_cursor` back as `cursor` for the next page.
+    `q` is a server-side substring search over upi_id and legal_name; one or
+    two characters (too short for the trigram index) match their prefix instead.
+    """
+    return await async_db.search_merchants(
+        cursor=cursor, limit=limit, min_score=min_score, max_score=max_score,
+        category=category, verified=verified, query=q or None,
+    )
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss/eviction counters for sizing the merchant cache."""
+    return merchant_cache.stats()
+
+@app.get("/filter/stats")
+async def get_filter_stats():
+    """Bloom prefilter size (memory_bytes), fill and how many lookups it answered."""
+    return database.merchant_filter.stats()
+
+@app.get("/write_behind/stats")
+async def get_write_behind_stats():
+    return write_behind.queue.stats()
+
+FLIGHT_GROUPS = (async_db.loads, scoring.flights)
+
+@app.get("/singleflight/stats")
+async def get_singleflight_stats():
+    """How many concurrent loads and scoring calls joined one already in flight."""
+    return {group.name: group.stats() for group in FLIGHT_GROUPS}
+
+@app.get("/lookalike/stats")
+async def get_lookalike_stats():
+    """Size of the verified-merchant typosquat index and how often unknown IDs matched it."""
+    return lookalike.index.stats()
+
+@app.get("/stats")
+async def get_dashboard_stats():
+    """Dashboard totals: merchants by list and category, scans and blocks per day, most scanned and blocked IDs.
+
+    Read from trigger-maintained counters and in-memory sketches, never the merchants table (see dashboard.py).
+    """
+    merchants = await async_db.run_in_db_thread(dashboard.merchant_stats)
+    return {"merchants": merchants, "scans": dashboard.scans.report()}
+
+@app.get("/sync/trust_list")
+async def sync_trust_list(request: Request, since: Optional[int] = Query(None, ge=0)):
+    """Blacklist and whitelist for offline verification: in full, or what changed after version `since`.
+
+    Send the last version's ETag as If-None-Match; an unchanged list is a 304 (see trust_sync.py).
+    """
+    version, full, body = await async_db.run_in_db_thread(trust_sync.lists.get, since,
+                                                          request.headers.get("if-none-match"))
+    headers = {"ETag": trust_sync.etag(version), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = gzip.decompress(body)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/sync/stats")
+async def get_sync_stats():
+    """Trust list version, cached bodies, compression ratio, and full/delta/304 responses served."""
+    return trust_sync.lists.stats()
+
+@app.get("/feed/threats")
+async def get_threat_feed(request: Request):
+    """New threats as Server-Sent Events; reconnect with Last-Event-ID to catch up (see live_feed.py)."""
+    if live_feed.feed.full():
+        return JSONResponse({"detail": "Live feed is at capacity"}, status_code=503,
+                            headers={"Retry-After": str(live_feed.RETRY_MS // 1000)})
+    last_event_id = request.headers.get("last-event-id")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(live_feed.feed.stream(last_event_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/feed/stats")
+async def get_feed_stats():
+    """Live feed subscribers, events published and delivered, lagging and rejected clients."""
+    return live_feed.feed.stats()
+
+@app.get("/events/stats")
+async def get_event_log_stats():
+    """Scan event log: active segment, events recorded/written/dropped (see event_log.py)."""
+    return event_log.log.stats()
+
+@app.get("/ratelimit/stats")
+async def get_ratelimit_stats():
+    """Token bucket settings, store and allowed/limited counts per budget."""
+    return ratelimit.stats()
+
+@app.get("/snapshot/stats")
+async def get_snapshot_stats():
+    """Which merchant snapshot is mapped, how old it is, and how often it answers."""
+    return snapshot.store.stats()
+
+@app.get("/startup/stats")
+async def get_startup_stats():
+    """Import, startup-step and first-request timings for this process."""
+    return startup.stats()
+
+@app.get("/writer/stats")
+async def get_writer_stats():
+    """Whether writes run locally or in the serve.py writer process."""
+    return {"pid": os.getpid(), **writer.stats()}
+
+@app.get("/quarantine/stats")
+async def get_quarantine_stats():
+    """Counts of rejected or untracked inputs, by reason."""
+    return limits.quarantine.stats()
+
+@app.get("/scoring/stats")
+async def get_scoring_stats():
+    """Active scoring engine and micro-batch sizes."""
+    return scoring.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint: scan stage latencies, verdict counters, component stats."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@metrics.register_collector
+def component_metrics():
+    cache = merchant_cache.stats()
+    queue = write_behind.queue.stats()
+    rejected = limits.quarantine.stats()
+    return [
+        ("smartshield_cache_requests_total", "counter", "Merchant cache lookups by result",
+         [({"result": "hit"}, cache["hits"]), ({"result": "negative_hit"}, cache["negative_hits"]),
+          ({"result": "miss"}, cache["misses"])]),
+        ("smartshield_cache_entries", "gauge", "Merchants held in the cache", [({}, cache["size"])]),
+        ("smartshield_write_behind_pending", "gauge", "Registrations waiting for a flush", [({}, queue["pending"])]),
+        ("smartshield_write_behind_errors_total", "counter", "Failed write-behind flushes", [({}, queue["errors"])]),
+        ("smartshield_quarantined_total", "counter", "Rejected or untracked inputs by reason",
+         [({"reason": reason}, count) for reason, count in rejected.items()]),
+        ("smartshield_rate_limited_total", "counter", "Requests over a client's token budget",
+         [({"budget": budget.name}, budget.limited) for budget in ratelimit.BUDGETS]),
+        ("smartshield_singleflight_calls_total", "counter", "Coalesced calls by group and whether they did the work",
+         [({"group": group.name, "role": role}, getattr(group, attr))
+          for group in FLIGHT_GROUPS for role, attr in (("leader", "calls"), ("joined", "shared"))]),
+    ]
+
+@app.post("/keywords/reload")
+async def reload_keywords():
+    """Recompile the fraud keyword list now instead of waiting for the mtime check."""
+    reloaded = keywords.matcher.reload()
+    return {"reloaded": reloaded, "patterns": len(keywords.matcher.engine)}
+
+def known_merchant_verdict(merchant):
+    # A. WHITELIST CHECK (Trusted)
+    if merchant["trust_score"] == 100:
+        return {
+            "status": "SAFE",
+            "score": 100,
+            "message": f"SAFE - Verified Merchant: {merchant['legal_name']}"
+        }
+
+    # B. BLACKLIST CHECK (Fraud)
+    elif merchant["trust_score"] == 0:
+        return {
+            "status": "FRAUD",
+            "score": 0,
+            "message": f"DANGER - Known Fraud: {merchant['legal_name']}"
+        }
+
+    # C. GRAYLIST (Neutral/Local Shops)
+    else:
+        return {
+            "status": "SAFE" if merchant["trust_score"] > reputation.FRAUD_CUTOFF else "FRAUD",
+            "score": merchant["trust_score"],
+            "message": f"Merchant: {merchant['legal_name']} (Score: {merchant['trust_score']})"
+        }
+
+def unknown_verdict(upi_id, result):
+    """Verdict for an ID not in the DB from its ScoreResult, plus the row to register (None = don't) and its log line."""
+    if not upi_parser.canonical_vpa(upi_id):
+        # Not a payment address at all: answer from the heuristic but never store it
+        limits.quarantine.record("not_a_vpa")
+        if result.suspicious:
             return {
                 "status": "FRAUD",
                 "score": 0,
-                "message": f"DANGER - Known Fraud: {merchant['legal_name']}"
-            }
-            
-        # C. GRAYLIST (Neutral/Local Shops)
-        else:
-            return {
-                "status": "SAFE" if merchant["trust_score"] > 40 else "FRAUD",
-                "score": merchant["trust_score"],
-                "message": f"Merchant: {merchant['legal_name']} (Score: {merchant['trust_score']})"
-            }
+                "message": f"DANGER - {result.reason}"
+            }, None, None
+        return {
+            "status": "SAFE",
+            "score": 50,
+            "message": "SAFE - Not a UPI payment code. Not tracked."
+        }, None, None
 
-    # --- STEP 2: ML/HEURISTIC CHECK (Fallback for Unknowns) ---
-    # (If not in DB, analyze the text pattern)
-    is_suspicious = False
-    matched_keyword = ""
-    
-    for keyword in FRAUD_KEYWORDS:
-        if keyword in qr_text:
-            is_suspicious = True
-            matched_keyword = keyword
-            break
-            
-    if is_suspicious:
-        # Case A: Unknown but looks like Fraud -> Add to DB as Blacklist
-        print(f"⚠️  New Threat Detected: {request.qr_text}")
-        
-        add_merchant(
-            upi_id=request.qr_text,
-            legal_name="Suspicious Unknown ID",
-            trust_score=0,
-            category="Fraud",
-            is_verified=False
-        )
-        
+    if result.imitates:
+        # Resembles a verified merchant: warn, but don't register it, so a false
+        # positive never turns into a blacklist entry (see lookalike.py)
         return {
+            "status": "SUSPICIOUS",
+            "score": 25,
+            "message": f"CAUTION - {result.reason} Check the payee before paying."
+        }, None, None
+
+    if result.suspicious:
+        # Case A: Unknown but looks like Fraud -> Add to DB as Blacklist (this server's only;
+        # AUTO_FLAGGED_NAME keeps it off the lists clients sync)
+        verdict = {
             "status": "FRAUD",
             "score": 0,
-            "message": f"DANGER - Suspicious keyword '{matched_keyword}' found."
+            "message": f"DANGER - {result.reason}"
         }
+        new_merchant = dict(upi_id=upi_id, legal_name=database.AUTO_FLAGGED_NAME, trust_score=0,
+                            category="Fraud", is_verified=False)
+        return verdict, new_merchant, f"⚠️  New Threat Detected: {upi_id}"
     else:
         # Case B: Unknown and looks Clean -> Add as Neutral (Score 50)
         # "Neutral" indicates we are tracking it, but haven't verified it yet.
-        print(f"ℹ️  New Unknown Merchant: {request.qr_text}")
-        
-        add_merchant(
-            upi_id=request.qr_text,
-            legal_name="Unknown Merchant",
-            trust_score=50,
-            category="Uncategorized",
-            is_verified=False
-        )
-        
-        return {
+        verdict = {
             "status": "SAFE",
             "score": 50,
             "message": "SAFE - First time seen. Added to tracking."
         }
+        new_merchant = dict(upi_id=upi_id, legal_name="Unknown Merchant", trust_score=50,
+                            category="Uncategorized", is_verified=False)
+        return verdict, new_merchant, f"ℹ️  New Unknown Merchant: {upi_id}"
+
+def verdict_source(merchant):
+    """Which list answered a known merchant (the "source" label of smartshield_scans)."""
+    if merchant["trust_score"] == 100:
+        return "whitelist"
+    if merchant["trust_score"] == 0:
+        return "blacklist"
+    return "graylist"
+
+def scanned_category(merchant, new_merchant):
+    """Category a scan counts under on the dashboard: the merchant's, or the one it's registered with."""
+    if merchant:
+        return merchant["category"]
+    return new_merchant["category"] if new_merchant else "Untracked"
+
+@app.post("/scan_qr")
+async def scan_qr(request: QRRequest, http_request: Request):
+    started = metrics.now_ns()
+    qr_text = request.qr_text.lower() # Normalize to lowercase
+    # upi://pay?pa=X, upi://X and a bare X all resolve to the same canonical VPA
+    payload = upi_parser.parse(request.qr_text)
+    upi_id = payload.canonical_id
+    parsed = metrics.now_ns()
+    metrics.SCAN_STAGE_SECONDS.observe("parse", parsed - started)
+
+    # --- STEP 1: DATABASE CHECK (The "Bank" Verification) ---
+    merchant, stage = await lookup.resolve_merchant(upi_id)
+    looked_up = metrics.now_ns()
+    metrics.SCAN_STAGE_SECONDS.observe(stage, looked_up - parsed)
+
+    if merchant:
+        if reputation.is_managed(merchant):
+            write_behind.reputation_events.record(upi_id, "scan")
+        verdict = known_merchant_verdict(merchant)
+        source = verdict_source(merchant)
+        metrics.SCANS.inc(verdict["status"], source)
+        latency_us = (looked_up - started) // 1000
+        event_log.log.record(upi_id, verdict["status"], verdict["score"], source, stage, latency_us)
+        dashboard.scans.record(payload.vpa, verdict["status"], source, merchant["category"])
+        if metrics.sampled():
+            metrics.event("scan", upi_id=upi_id, status=verdict["status"], source=source,
+                          lookup=stage, us=latency_us)
+        return verdict
+
+    # --- STEP 2: ML/HEURISTIC CHECK (Fallback for Unknowns) ---
+    # (If not in DB, analyze the text pattern)
+    # Keyword rule and/or n-gram model (see scoring.py); concurrent scans share one model pass
+    result = await scoring.score(qr_text, upi_id)
+    scored = metrics.now_ns()
+    metrics.SCAN_STAGE_SECONDS.observe("heuristic", scored - looked_up)
+    verdict, new_merchant, log_line = unknown_verdict(upi_id, result)
+
+    if new_merchant:
+        # Each new row spends the client's (much smaller) registration budget; once it
+        # runs out the scan is still answered, just not registered (as in the batch endpoint)
+        allowed, _ = await ratelimit.registrations.acquire(ratelimit.request_client(http_request.scope))
+        if allowed:
+            # Only the enqueue is on the request path; the "insert" stage is timed by the flusher
+            write_behind.queue.submit(new_merchant, log_line)
+            if new_merchant["trust_score"] == 0:
+                live_feed.publish_threat(upi_id, verdict)
+        else:
+            limits.quarantine.record("register_rate_limited")
+    metrics.SCANS.inc(verdict["status"], "heuristic")
+    latency_us = (scored - started) // 1000
+    event_log.log.record(upi_id, verdict["status"], verdict["score"], "heuristic", stage, latency_us)
+    # Only parsed VPAs reach the dashboard's top-K; anything else counts as "invalid"
+    dashboard.scans.record(payload.vpa, verdict["status"], "heuristic", scanned_category(None, new_merchant))
+    if metrics.sampled():
+        metrics.event("scan", upi_id=upi_id, status=verdict["status"], source="heuristic",
+                      lookup=stage, us=latency_us)
+    return verdict
+
+@app.post("/scan_qr/batch")
+async def scan_qr_batch(request: BatchQRRequest, http_request: Request):
+    """Scan many QR texts with one DB read for the whole batch; new IDs are written in one flush.
+
+    Every distinct new ID spends one token of the client's registration budget
+    (repeats within the batch are answered but not registered or published
+    again). Once it runs out the rest of the batch is still answered, just not
+    registered.
+    """
+    started = metrics.now_ns()
+    lowered = [text.lower() for text in request.qr_texts]
+    payloads = [upi_parser.parse(text) for text in request.qr_texts]
+    upi_ids = [payload.canonical_id for payload in payloads]
+
+    # STEP 1: every known ID in a single IN (...) query (cache hits skip even that)
+    known = await lookup.find_merchants(upi_ids)
+
+    # STEP 2: one scoring pass over all the unknowns together
+    unknown_indexes = [i for i, upi_id in enumerate(upi_ids) if upi_id not in known]
+    scores = scoring.score_many([lowered[i] for i in unknown_indexes], [upi_ids[i] for i in unknown_indexes])
+
+    results = [None] * len(upi_ids)
+    for i, upi_id in enumerate(upi_ids):
+        if upi_id in known:
+            results[i] = known_merchant_verdict(known[upi_id])
+            metrics.SCANS.inc(results[i]["status"], verdict_source(known[upi_id]))
+            if reputation.is_managed(known[upi_id]):
+                write_behind.reputation_events.record(upi_id, "scan")
+
+    # STEP 3: queue the new IDs; the write-behind flusher inserts them with multi-row INSERTs
+    client = ratelimit.request_client(http_request.scope)
+    new_merchants = {}
+    queued = set()
+    for i, result in zip(unknown_indexes, scores):
+        verdict, new_merchant, log_line = unknown_verdict(upi_ids[i], result)
+        results[i] = verdict
+        new_merchants[i] = new_merchant
+        metrics.SCANS.inc(verdict["status"], "heuristic")
+        if new_merchant and upi_ids[i] not in queued:
+            queued.add(upi_ids[i])
+            if (await ratelimit.registrations.acquire(client))[0]:
+                write_behind.queue.submit(new_merchant, log_line)
+                if new_merchant["trust_score"] == 0:
+                    live_feed.publish_threat(upi_ids[i], verdict)
+            else:
+                limits.quarantine.record("register_rate_limited")
+
+    # Logged with the batch's per-item share of its latency
+    latency_us = (metrics.now_ns() - started) // 1000 // len(upi_ids)
+    for i, upi_id in enumerate(upi_ids):
+        merchant = known.get(upi_id)
+        source = verdict_source(merchant) if merchant else "heuristic"
+        event_log.log.record(upi_id, results[i]["status"], results[i]["score"], source, "batch", latency_us)
+        dashboard.scans.record(payloads[i].vpa, results[i]["status"], source,
+                               scanned_category(merchant, new_merchants.get(i)))
+    return {"results": results}
+
+@app.post("/report")
+async def report_merchant(request: ReportRequest, http_request: Request):
+    """User report that a scanned merchant was fraudulent or fine; feeds its reputation score.
+
+    Each client's reports of one merchant count once per SMARTSHIELD_REPORT_REPEAT_HOURS.
+    """
+    upi_id = upi_parser.parse(request.qr_text).canonical_id
+    merchant = await lookup.find_merchant(upi_id)
+    if merchant is None:
+        raise HTTPException(status_code=404, detail="Unknown merchant; scan it first")
+    if not reputation.is_managed(merchant):
+        # Verified and blacklisted merchants are curated, not crowd-scored
+        return {"upi_id": upi_id, "accepted": False, "trust_score": merchant["trust_score"]}
+    client = ratelimit.request_client(http_request.scope)
+    if not (await ratelimit.report_repeats.acquire(f"{client}>{upi_id}"))[0]:
+        limits.quarantine.record("repeat_report")
+        return {"upi_id": upi_id, "accepted": False, "trust_score": merchant["trust_score"]}
+    write_behind.reputation_events.record(upi_id, f"{request.verdict}_report")
+    return {"upi_id": upi_id, "accepted": True, "trust_score": merchant["trust_score"]}
+
+@app.get("/reputation/stats")
+async def get_reputation_stats():
+    return write_behind.reputation_events.stats()
+
+@app.get("/reputation/{upi_id}")
+async def get_reputation(upi_id: str):
+    """Decayed event counters behind a merchant's score (events from the last flush window not included)."""
+    state = await async_db.run_in_db_thread(database.get_reputation, upi_parser.parse(upi_id).canonical_id, time.time())
+    if state is None:
+        raise HTTPException(status_code=404, detail="No reputation events for this merchant")
+    return state
+
+startup.mark_imported()
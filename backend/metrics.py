@@ -0,0 +1,199 @@
+"""Hot-path instrumentation: stage timings, verdict counters, /metrics, sampled logs.
+
+Everything recorded on the request path is a list/dict increment on the
+event loop thread, with no locks, I/O or allocation (bench_metrics.py keeps
+the per-request cost honest). Each series is only ever updated from one
+thread: scan stages and verdicts from the loop, the "insert" stage from the
+write-behind flusher. Stage series are created up front, so a scrape on the
+loop never iterates a dict another thread is adding to. Under serve.py every worker keeps its own metrics, so
+a scrape of /metrics describes whichever worker answered it.
+
+Structured logs go through a QueueHandler: the request path only enqueues a
+record and a QueueListener thread does the formatting and the stdout write.
+Scan logs are sampled (SMARTSHIELD_LOG_SAMPLE_RATE, see sampled()); operational events
+(new merchants, flush failures) are always logged.
+"""
+import bisect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+METRICS_ENABLED = os.environ.get("SMARTSHIELD_METRICS", "1") != "0"
+LOG_SAMPLE_RATE = float(os.environ.get("SMARTSHIELD_LOG_SAMPLE_RATE", "0.01"))
+
+# Histogram bucket upper bounds, in seconds (Prometheus convention)
+STAGE_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0,
+)
+
+log = logging.getLogger("smartshield")
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values = {}  # label values tuple -> count
+
+    def inc(self, *labelvalues, amount=1):
+        self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        return [(self.name + "_total", dict(zip(self.labelnames, key)), value) for key, value in self.values.items()]
+
+
+class Histogram:
+    """Fixed-bucket histogram per label value; observe() takes nanoseconds."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label, values=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = buckets
+        self._bounds_ns = [round(b * 1e9) for b in buckets]
+        # label value -> [bucket counts..., +Inf count, sum ns]. Values observed from
+        # another thread must be listed in `values`, so observe() never adds a key there
+        self._series = {value: [0] * (len(buckets) + 2) for value in values}
+
+    def observe(self, value, ns):
+        series = self._series.get(value)
+        if series is None:
+            series = self._series[value] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self._bounds_ns, ns)] += 1
+        series[-1] += ns
+
+    def samples(self):
+        out = []
+        for value, series in list(self._series.items()):
+            # Copied in one step; a concurrent observe() leaves _sum at most one sample behind
+            series = list(series)
+            if not any(series[:-1]):
+                continue  # Pre-created, never observed
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                out.append((self.name + "_bucket", {self.label: value, "le": repr(bound)}, cumulative))
+            cumulative += series[len(self.buckets)]
+            out.append((self.name + "_bucket", {self.label: value, "le": "+Inf"}, cumulative))
+            out.append((self.name + "_count", {self.label: value}, cumulative))
+            out.append((self.name + "_sum", {self.label: value}, series[-1] / 1e9))
+        return out
+
+
+class _Noop:
+    def inc(self, *labelvalues, amount=1):
+        pass
+
+    def observe(self, value, ns):
+        pass
+
+
+SCAN_STAGE_SECONDS = Histogram(
+    "smartshield_scan_stage_seconds",
+    "Time spent in each scan_qr stage (parse, cache, db, heuristic, insert)", "stage",
+    values=("parse", "cache", "db", "heuristic", "insert"),
+)
+SCANS = Counter(
+    "smartshield_scans", "Scan verdicts by status and where the verdict came from", ("status", "source"),
+)
+_registered = [SCAN_STAGE_SECONDS, SCANS]
+_collectors = []  # fn() -> [(name, kind, help, [(labels, value)])]
+
+if not METRICS_ENABLED:
+    SCAN_STAGE_SECONDS = SCANS = _Noop()
+
+
+def register_collector(fn):
+    """Add gauges/counters computed at scrape time (e.g. from a component's stats())."""
+    _collectors.append(fn)
+    return fn
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render():
+    """The Prometheus text exposition of every metric."""
+    lines = []
+    for metric in _registered:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    for collector in _collectors:
+        for name, kind, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- SAMPLED STRUCTURED LOGS ---
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": round(record.created, 6), "level": record.levelname, "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_listener = None
+
+
+def start_logging(stream=None):
+    """Route the "smartshield" logger through a queue to a background writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JSONFormatter())
+    _listener = logging.handlers.QueueListener(records, handler)
+    log.handlers = [logging.handlers.QueueHandler(records)]
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def event(message, **fields):
+    """Always-logged operational event (off the request path, or rare)."""
+    log.info(message, extra={"fields": fields})
+
+
+def error(message, **fields):
+    log.error(message, extra={"fields": fields})
+
+
+def sampled():
+    """Whether to log this scan (LOG_SAMPLE_RATE); check before building the log fields."""
+    return LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE
+
+
+now_ns = time.perf_counter_ns
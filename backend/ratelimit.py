@@ -0,0 +1,264 @@
+"""Per-client admission control for the scan and report endpoints.
+
+Token buckets per client:
+
+  scan      every /scan_qr and /scan_qr/batch request (SMARTSHIELD_RATE_LIMIT
+            per second, bursts of SMARTSHIELD_RATE_BURST)
+  register  scans that would add a new row to merchants, a much smaller
+            budget (SMARTSHIELD_REGISTER_RATE_PER_MIN, SMARTSHIELD_REGISTER_BURST)
+            so one client can't fill the table with garbage IDs
+  report    every /report request (SMARTSHIELD_REPORT_RATE_PER_MIN,
+            SMARTSHIELD_REPORT_BURST)
+  report_repeat  one per client and merchant, refilling every
+            SMARTSHIELD_REPORT_REPEAT_HOURS, so a client's repeated reports of
+            one merchant count once toward its reputation
+
+A client is its API key (X-API-Key) when that key is one of
+SMARTSHIELD_API_KEYS, else its IP address. Unknown keys are ignored rather
+than trusted, or a client could mint a fresh bucket per request.
+RateLimitMiddleware sheds over-limit scans and reports with a 429 before the body is
+read or any DB work is done; the register budget is checked in scan_qr
+right before a registration is queued, and a scan over it is answered but
+not registered.
+
+Bucket state lives in a pluggable store. MemoryStore is per process;
+SQLiteStore (SMARTSHIELD_RATE_STORE=sqlite:<path>) shares the buckets
+between serve.py workers through a small SQLite file, standing in for the
+networked store (Redis and the like) a multi-host deployment would use.
+Its takes block on a write lock, so Budget.acquire() runs them on the DB
+executor; idle rows are pruned every SQLITE_PRUNE_EVERY takes.
+"""
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+import async_db
+import limits
+
+SCAN_RATE = float(os.environ.get("SMARTSHIELD_RATE_LIMIT", "20"))       # Requests/second per client
+SCAN_BURST = float(os.environ.get("SMARTSHIELD_RATE_BURST", "40"))
+REGISTER_RATE = float(os.environ.get("SMARTSHIELD_REGISTER_RATE_PER_MIN", "30")) / 60
+REGISTER_BURST = float(os.environ.get("SMARTSHIELD_REGISTER_BURST", "20"))
+REPORT_RATE = float(os.environ.get("SMARTSHIELD_REPORT_RATE_PER_MIN", "10")) / 60
+REPORT_BURST = float(os.environ.get("SMARTSHIELD_REPORT_BURST", "5"))
+REPORT_REPEAT_SECONDS = float(os.environ.get("SMARTSHIELD_REPORT_REPEAT_HOURS", "24")) * 3600
+RATE_STORE = os.environ.get("SMARTSHIELD_RATE_STORE", "memory")
+LIMITED_PATHS = frozenset(["/scan_qr", "/scan_qr/batch"])
+REPORT_PATHS = frozenset(["/report"])
+# Comma-separated keys of known API clients, each with a bucket of its own
+API_KEYS = frozenset(key.strip() for key in os.environ.get("SMARTSHIELD_API_KEYS", "").split(",") if key.strip())
+
+MEMORY_STORE_MAX_KEYS = 100000  # Least recently used buckets are evicted past this many clients
+SQLITE_PRUNE_EVERY = 1000  # Takes between deletes of fully refilled rows
+
+
+def refill(tokens, updated_at, rate, burst, now):
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+class MemoryStore:
+    """Buckets in an LRU-ordered dict. Only touched from the event loop thread, so no locking."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_keys=MEMORY_STORE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict()  # key -> [tokens, updated_at], least recently used first
+
+    def take(self, key, rate, burst, cost, now):
+        """Spend `cost` tokens if available. Returns (allowed, tokens left)."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                # The least recently seen client is the likeliest to have refilled anyway
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[key] = [burst, now]
+        else:
+            self._buckets.move_to_end(key)
+        elapsed = now - bucket[1]
+        tokens = bucket[0] + elapsed * rate if elapsed > 0 else bucket[0]  # refill(), inlined
+        if tokens > burst:
+            tokens = burst
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        bucket[0], bucket[1] = tokens, now
+        return allowed, tokens
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteStore:
+    """Buckets in a SQLite table, shared by every process that opens the same file."""
+
+    name = "sqlite"
+    blocking = True  # Waits on other processes' write locks; keep it off the event loop
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    '''
+
+    def __init__(self, path, prune_every=SQLITE_PRUNE_EVERY):
+        self.path = path
+        self.prune_every = prune_every
+        self.refill_seconds = 0.0  # Longest time any budget's bucket takes to refill from empty
+        self._takes = 0
+        self._local = threading.local()
+        self._connection()  # Create the table up front
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")  # Limits are ephemeral; a crash just refills buckets
+            conn.execute("PRAGMA busy_timeout = 1000")
+            conn.execute(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst, cost, now):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")  # Read-modify-write under the write lock: no lost updates across workers
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else refill(row[0], row[1], rate, burst, now)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._takes += 1
+        if self._takes % self.prune_every == 0:
+            self.prune(now)
+        return allowed, tokens
+
+    def prune(self, now):
+        """Delete buckets idle long enough to have refilled: indistinguishable from new ones."""
+        if self.refill_seconds > 0:
+            self._connection().execute("DELETE FROM buckets WHERE updated_at < ?", (now - self.refill_seconds,))
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+def open_store(spec=RATE_STORE):
+    if spec == "memory":
+        return MemoryStore()
+    if spec.startswith("sqlite:"):
+        return SQLiteStore(spec[len("sqlite:"):])
+    raise ValueError(f"Unknown SMARTSHIELD_RATE_STORE {spec!r} (use memory or sqlite:<path>)")
+
+
+class Budget:
+    """One token bucket per client at a fixed rate."""
+
+    def __init__(self, name, rate, burst, store):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.store = store
+        self._prefix = name + ":"
+        self.allowed = 0
+        self.limited = 0
+        if rate > 0 and hasattr(store, "refill_seconds"):
+            store.refill_seconds = max(store.refill_seconds, burst / rate)
+
+    def take(self, client, cost=1, now=None):
+        """(allowed, seconds until `cost` tokens are available again)."""
+        if self.rate <= 0:
+            return True, 0.0  # Disabled
+        allowed, tokens = self.store.take(self._prefix + client, self.rate, self.burst, cost,
+                                          time.time() if now is None else now)
+        if allowed:
+            self.allowed += 1
+            return True, 0.0
+        self.limited += 1
+        return False, (cost - tokens) / self.rate
+
+    async def acquire(self, client, cost=1):
+        """take() from the event loop: inline for the memory store, on the DB executor for SQLite."""
+        if self.store.blocking and self.rate > 0:
+            return await async_db.run_in_db_thread(self.take, client, cost)
+        return self.take(client, cost)
+
+    def stats(self):
+        return {"rate_per_second": self.rate, "burst": self.burst, "allowed": self.allowed, "limited": self.limited}
+
+
+store = open_store()
+scans = Budget("scan", SCAN_RATE, SCAN_BURST, store)
+registrations = Budget("register", REGISTER_RATE, REGISTER_BURST, store)
+reports = Budget("report", REPORT_RATE, REPORT_BURST, store)
+# Keyed by client and merchant; one token, so a repeat is refused until it refills
+report_repeats = Budget("report_repeat", 1 / REPORT_REPEAT_SECONDS if REPORT_REPEAT_SECONDS > 0 else 0, 1, store)
+BUDGETS = (scans, registrations, reports, report_repeats)
+
+
+def client_key(scope):
+    if API_KEYS:
+        for name, value in scope["headers"]:
+            if name == b"x-api-key" and value:
+                key = value.decode("latin-1")
+                if key in API_KEYS:
+                    return "key:" + key
+                break
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+def request_client(scope):
+    """The client key RateLimitMiddleware resolved for this request."""
+    return scope.get("state", {}).get("client") or client_key(scope)
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware: charges `budget` for `paths` and sheds with 429 before the body is read.
+
+    The client key is left in scope["state"] for the register budget check.
+    """
+
+    def __init__(self, app, budget=scans, paths=LIMITED_PATHS):
+        self.app = app
+        self.budget = budget
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        client = client_key(scope)
+        allowed, retry_after = await self.budget.acquire(client)
+        if not allowed:
+            return await self._shed(send, retry_after)
+        scope.setdefault("state", {})["client"] = client
+        await self.app(scope, receive, send)
+
+    async def _shed(self, send, retry_after):
+        # Written straight to ASGI: a flood of rejected requests shouldn't cost a Response object each
+        limits.quarantine.record(f"{self.budget.name}_rate_limited")
+        body = b'{"detail":"Too many requests (%s limit); retry in %.1fs"}' % (self.budget.name.encode(), retry_after)
+        await send({"type": "http.response.start", "status": 429, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, round(retry_after))).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def stats():
+    return {"store": store.name, "clients": len(store), **{budget.name: budget.stats() for budget in BUDGETS}}
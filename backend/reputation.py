@@ -0,0 +1,70 @@
+"""Reputation scoring for merchants that aren't verified or blacklisted.
+
+Each such merchant carries three exponentially decayed counters: scans,
+fraud reports and safe reports. They are stored with the time they were
+last updated, so applying new events is O(1): decay the stored counters to
+now, add the new counts, recompute the score. History is never rescanned.
+
+The score is the share of good evidence, starting at 50 from equal priors:
+
+    good = PRIOR_GOOD + SCAN_WEIGHT * scans + SAFE_REPORT_WEIGHT * safe_reports
+    bad  = PRIOR_BAD + FRAUD_REPORT_WEIGHT * fraud_reports
+    score = 100 * good / (good + bad), clamped to 1-99
+
+Reports alone can't make a merchant FRAUD (score <= FRAUD_CUTOFF) until
+FRAUD_QUORUM decayed fraud reports back it: each client counts once per
+merchant per day (ratelimit.report_repeats), so that is several distinct
+reporters, and one client can never flip a merchant on its own. Below the
+quorum the score bottoms out just above the cut-off.
+
+0 and 100 stay reserved for the blacklist and whitelist. These functions
+work on plain floats and on numpy arrays alike (bench_reputation.py).
+"""
+import os
+
+HALF_LIFE_DAYS = float(os.environ.get("SMARTSHIELD_REPUTATION_HALF_LIFE_DAYS", "30"))
+HALF_LIFE = HALF_LIFE_DAYS * 86400
+
+PRIOR_GOOD = 5.0
+PRIOR_BAD = 5.0
+SCAN_WEIGHT = 0.05         # Being scanned a lot is weak evidence of a real shop
+SAFE_REPORT_WEIGHT = 1.0
+FRAUD_REPORT_WEIGHT = 3.0  # A few reports move a fresh merchant below the cut-off, once the quorum is met
+FRAUD_CUTOFF = 40  # Graylisted merchants at or below this score get a FRAUD verdict
+FRAUD_QUORUM = float(os.environ.get("SMARTSHIELD_FRAUD_REPORT_QUORUM", "3"))
+
+MIN_SCORE = 1
+MAX_SCORE = 99
+
+EVENT_KINDS = ("scan", "fraud_report", "safe_report")
+
+
+def decay_factor(elapsed_seconds):
+    return 0.5 ** (elapsed_seconds / HALF_LIFE)
+
+
+def decay(counters, updated_at, now):
+    """Counters (scans, fraud_reports, safe_reports) as of `now`."""
+    factor = decay_factor(max(0.0, now - updated_at))
+    return tuple(c * factor for c in counters)
+
+
+def apply_events(counters, updated_at, deltas, now):
+    """Decay stored counters to `now` and add the new event counts."""
+    return tuple(c + d for c, d in zip(decay(counters, updated_at, now), deltas))
+
+
+def raw_score(scans, fraud_reports, safe_reports):
+    good = PRIOR_GOOD + SCAN_WEIGHT * scans + SAFE_REPORT_WEIGHT * safe_reports
+    bad = PRIOR_BAD + FRAUD_REPORT_WEIGHT * fraud_reports
+    return 100 * good / (good + bad)
+
+
+def score(scans, fraud_reports, safe_reports):
+    floor = MIN_SCORE if fraud_reports >= FRAUD_QUORUM else FRAUD_CUTOFF + 1
+    return min(MAX_SCORE, max(floor, round(raw_score(scans, fraud_reports, safe_reports))))
+
+
+def is_managed(merchant):
+    """Whether reputation owns this merchant's trust_score (not verified, not black/whitelisted)."""
+    return not merchant["is_verified"] and MIN_SCORE <= merchant["trust_score"] <= MAX_SCORE
@@ -0,0 +1,334 @@
+"""Step 2 of scan_qr: score an unknown ID as suspicious or clean.
+
+A ScoringEngine turns a batch of (lowercased QR text, canonical ID) pairs
+into ScoreResults. The implementations:
+
+  KeywordScorer    the weighted fraud-keyword rule (keywords.py)
+  LookalikeScorer  near-copies of a verified merchant's handle (lookalike.py)
+  NgramScorer      logistic regression over hashed character n-grams of the
+                   handle plus a few handle-shape features, loaded from the
+                   artifact written by train_model.py (needs numpy)
+
+Single scans go through a MicroBatcher, which gathers concurrent requests
+for up to SCORING_BATCH_WINDOW seconds or SCORING_BATCH_SIZE items, so the
+model runs one vectorized pass per batch instead of one per request.
+
+numpy is imported and the engine is built on first use (get_engine()), not
+at import, so cold starts and keyword-only deployments don't pay for them.
+"""
+import asyncio
+import os
+import zlib
+from collections import namedtuple
+
+import keywords
+import lookalike
+from singleflight import SingleFlight
+
+_np = None
+
+MODEL_FILE = os.environ.get(
+    "SMARTSHIELD_MODEL_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_model.npz"),
+)
+# auto = keywords + model if the artifact loads, keywords alone otherwise
+SCORING_ENGINE = os.environ.get("SMARTSHIELD_SCORING_ENGINE", "auto")
+# Check unknown IDs against the verified-merchant lookalike index, whichever engine is chosen
+LOOKALIKE_CHECK = os.environ.get("SMARTSHIELD_LOOKALIKE", "1") != "0"
+SCORING_BATCH_SIZE = int(os.environ.get("SMARTSHIELD_SCORING_BATCH_SIZE", "64"))
+SCORING_BATCH_WINDOW = float(os.environ.get("SMARTSHIELD_SCORING_BATCH_WINDOW_MS", "1")) / 1000
+
+# imitates: the verified upi_id a lookalike hit copies (None for every other result)
+ScoreResult = namedtuple("ScoreResult", ["suspicious", "score", "reason", "imitates"], defaults=(None,))
+
+# Handles of the big UPI apps/banks; a VPA on one of these is the common case
+COMMON_PSPS = frozenset([
+    "ybl", "ibl", "axl", "apl", "upi", "paytm", "okhdfc", "okhdfcbank", "oksbi", "okicici",
+    "okaxis", "icici", "hdfcbank", "sbi", "axisbank", "kotak", "freecharge", "airtel",
+])
+
+
+def _numpy():
+    """numpy, imported on first use. The model engine is optional; keywords work without it."""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("numpy is not installed") from None
+        _np = numpy
+    return _np
+
+
+class ScoringEngine:
+    """Interface: score_many(texts, upi_ids) -> [ScoreResult]. `texts` are lowercased."""
+
+    name = "base"
+    batched = False  # True if the engine benefits from the micro-batcher
+
+    def score_many(self, texts, upi_ids):
+        raise NotImplementedError
+
+
+class KeywordScorer(ScoringEngine):
+    name = "keywords"
+
+    def __init__(self, matcher=None):
+        self.matcher = matcher or keywords.matcher
+
+    def score_many(self, texts, upi_ids):
+        results = []
+        for matches in self.matcher.scan_many(texts):
+            if keywords.is_suspicious(matches):
+                keyword = keywords.strongest(matches).keyword
+                results.append(ScoreResult(True, 1.0, f"Suspicious keyword '{keyword}' found."))
+            else:
+                results.append(ScoreResult(False, 0.0, None))
+        return results
+
+
+class LookalikeScorer(ScoringEngine):
+    name = "lookalike"
+
+    def __init__(self, index=None):
+        self.index = index or lookalike.index
+
+    def score_many(self, texts, upi_ids):
+        results = []
+        for upi_id in upi_ids:
+            match = self.index.match(upi_id)
+            if match:
+                results.append(ScoreResult(True, 1.0, f"Lookalike of verified merchant '{match[0]}'.", match[0]))
+            else:
+                results.append(ScoreResult(False, 0.0, None))
+        return results
+
+
+# --- N-GRAM MODEL ---
+
+def split_handle(upi_id):
+    handle, _, psp = upi_id.partition("@")
+    return handle, psp
+
+
+def handle_features(handle, psp):
+    """Dense shape features, all roughly in 0-1."""
+    length = len(handle) or 1
+    digits = sum(c.isdigit() for c in handle)
+    separators = sum(c in "._-" for c in handle)
+    longest_digit_run = run = 0
+    for c in handle:
+        run = run + 1 if c.isdigit() else 0
+        longest_digit_run = max(longest_digit_run, run)
+    vowels = sum(c in "aeiou" for c in handle)
+    letters = sum(c.isalpha() for c in handle) or 1
+    return (
+        min(len(handle), 64) / 64,
+        digits / length,
+        min(separators, 4) / 4,
+        min(longest_digit_run, 12) / 12,
+        vowels / letters,
+        1.0 if psp in COMMON_PSPS else 0.0,
+        1.0 if psp else 0.0,
+    )
+
+
+DENSE_FEATURES = len(handle_features("", ""))
+
+
+def extract_features(upi_ids, hash_dim, ngram_min, ngram_max):
+    """Sparse batch matrix as (rows, cols, values) arrays, n-gram block L2-normalised.
+
+    Columns [0, hash_dim) are hashed n-grams of "^handle$"; the dense handle
+    features follow them.
+    """
+    np = _numpy()
+    rows, cols = [], []
+    dense = []
+    for i, upi_id in enumerate(upi_ids):
+        handle, psp = split_handle(upi_id)
+        padded = f"^{handle}$".encode("utf-8")
+        for n in range(ngram_min, ngram_max + 1):
+            for start in range(len(padded) - n + 1):
+                rows.append(i)
+                cols.append(zlib.crc32(padded[start:start + n]) % hash_dim)
+        dense.append(handle_features(handle, psp))
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    values = np.ones(len(rows), dtype=np.float64)
+    # Per-row L2 norm of the n-gram counts (duplicates are summed by the dot product)
+    norms = np.sqrt(np.maximum(np.bincount(rows, minlength=len(upi_ids)), 1.0))
+    values /= norms[rows]
+
+    dense = np.asarray(dense, dtype=np.float64).reshape(len(upi_ids), DENSE_FEATURES)
+    dense_rows = np.repeat(np.arange(len(upi_ids)), DENSE_FEATURES)
+    dense_cols = np.tile(np.arange(hash_dim, hash_dim + DENSE_FEATURES), len(upi_ids))
+    return (
+        np.concatenate([rows, dense_rows]),
+        np.concatenate([cols, dense_cols]),
+        np.concatenate([values, dense.ravel()]),
+    )
+
+
+def predict_proba(weights, bias, features, batch_size):
+    np = _numpy()
+    rows, cols, values = features
+    logits = np.bincount(rows, weights=weights[cols] * values, minlength=batch_size) + bias
+    return 1.0 / (1.0 + np.exp(-logits))
+
+
+class NgramScorer(ScoringEngine):
+    name = "ngram"
+    batched = True
+
+    def __init__(self, path=MODEL_FILE):
+        np = _numpy()
+        with np.load(path) as artifact:
+            self.weights = artifact["weights"]
+            self.bias = float(artifact["bias"])
+            self.hash_dim = int(artifact["hash_dim"])
+            self.ngram_min, self.ngram_max = (int(n) for n in artifact["ngram_range"])
+            self.threshold = float(artifact["threshold"])
+            self.version = str(artifact["version"])
+        self.name = f"ngram-{self.version}"
+
+    def score_many(self, texts, upi_ids):
+        if not upi_ids:
+            return []
+        features = extract_features(upi_ids, self.hash_dim, self.ngram_min, self.ngram_max)
+        probabilities = predict_proba(self.weights, self.bias, features, len(upi_ids))
+        return [
+            ScoreResult(bool(p >= self.threshold), float(p),
+                        f"Model risk score {p:.2f} ({self.name})." if p >= self.threshold else None)
+            for p in probabilities
+        ]
+
+
+class CombinedScorer(ScoringEngine):
+    """Flags an ID if any engine does; reports the first engine that flagged it, lookalike hits last."""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.name = "+".join(engine.name for engine in engines)
+        self.batched = any(engine.batched for engine in engines)
+
+    def score_many(self, texts, upi_ids):
+        per_engine = [engine.score_many(texts, upi_ids) for engine in self.engines]
+        results = []
+        for candidates in zip(*per_engine):
+            # A keyword or model hit is stronger evidence than a resemblance, and is registered as fraud
+            flagged = sorted((r for r in candidates if r.suspicious), key=lambda r: r.imitates is not None)
+            results.append(flagged[0] if flagged else max(candidates, key=lambda r: r.score))
+        return results
+
+
+def load_engine(kind=SCORING_ENGINE, model_path=MODEL_FILE, lookalikes=LOOKALIKE_CHECK):
+    engine = _load_text_engine(kind, model_path)
+    if not lookalikes:
+        return engine
+    # Right after the first engine, so a keyword hit still names the keyword
+    parts = engine.engines if isinstance(engine, CombinedScorer) else [engine]
+    return CombinedScorer([parts[0], LookalikeScorer(), *parts[1:]])
+
+
+def _load_text_engine(kind, model_path):
+    if kind == "keywords" or (kind == "auto" and not os.path.exists(model_path)):
+        return KeywordScorer()
+    try:
+        model = NgramScorer(model_path)
+    except (OSError, KeyError, ValueError, RuntimeError) as e:
+        if kind == "model":
+            raise
+        if os.path.exists(model_path):
+            print(f"⚠️  Could not load scoring model {model_path} ({e}); using keywords only.")
+        return KeywordScorer()
+    if kind == "model":
+        return model
+    return CombinedScorer([KeywordScorer(), model])
+
+
+# --- MICRO-BATCHING ---
+
+class MicroBatcher:
+    """Collects concurrent score() calls and runs them through score_many together."""
+
+    def __init__(self, score_many, max_size=SCORING_BATCH_SIZE, window=SCORING_BATCH_WINDOW):
+        self.score_many = score_many
+        self.max_size = max_size
+        self.window = window
+        self._pending = []  # (text, upi_id, future)
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def score(self, text, upi_id):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, upi_id, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            results = self.score_many([text for text, _, _ in batch], [upi_id for _, upi_id, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():  # The request may have been cancelled meanwhile
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_batch_size": self.max_size,
+            "window_ms": self.window * 1000,
+        }
+
+
+engine = None  # Built by get_engine() on first use
+batcher = MicroBatcher(lambda texts, upi_ids: engine.score_many(texts, upi_ids))
+# The same QR scanned by many clients at once takes one slot in a batch, not hundreds
+flights = SingleFlight("score")
+
+
+def get_engine():
+    global engine
+    if engine is None:
+        engine = load_engine()
+    return engine
+
+
+async def score(text, upi_id):
+    """Score one scan; batched engines go through the micro-batcher."""
+    if get_engine().batched:
+        return await flights.do((text, upi_id), batcher.score, text, upi_id)
+    return engine.score_many([text], [upi_id])[0]
+
+
+def score_many(texts, upi_ids):
+    return get_engine().score_many(texts, upi_ids)
+
+
+def stats():
+    if engine is None:
+        return {"engine": None, "loaded": False, **batcher.stats()}
+    return {"engine": engine.name, "batched": engine.batched, "loaded": True, **batcher.stats()}
@@ -1,17 +1,18 @@
-import sqlite3
-from database import init_db, add_merchant, get_db_connection
+from database import init_db, get_db_connection
+from ingest import ingest_records
+
+FIELDS = ("upi_id", "legal_name", "trust_score", "category", "is_verified")
 
 def seed_data():
     init_db()
     
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     # Check if data already exists
-    count = cursor.execute("SELECT COUNT(*) FROM merchants").fetchone()[0]
+    count = conn.execute("SELECT COUNT(*) FROM merchants").fetchone()[0]
+    conn.close()
     if count > 0:
         print(f"ℹ️  Database already contains {count} records. Skipping seed.")
-        conn.close()
         return
 
     print("🌱 Seeding Real-World Data...")
@@ -95,17 +96,10 @@ def seed_data():
         ("winner@paytm", "Paytm Cashback Winner", 0, "Scam", False)
     ]
 
-    total_added = 0
-    for upi, name, score, cat, verified in trusted_brands:
-        if add_merchant(upi, name, score, cat, verified):
-            total_added += 1
-            
-    for upi, name, score, cat, verified in scams:
-        if add_merchant(upi, name, score, cat, verified):
-            total_added += 1
+    # One bulk transaction through the ingestion pipeline
+    stats = ingest_records((dict(zip(FIELDS, row)) for row in trusted_brands + scams), quiet=True)
 
-    print(f"✅ Setup Complete. Added {total_added} Real-World Entities to `smartshield.db`.")
-    conn.close()
+    print(f"✅ Setup Complete. Added {stats.upserted} Real-World Entities to `smartshield.db`.")
 
 if __name__ == "__main__":
     seed_data()
@@ -1,14 +1,7 @@
-import sqlite3
 import random
-from database import init_db, DB_NAME
+from ingest import ingest_records
 
 def seed_database():
-    # Initialize DB first
-    init_db()
-    
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
     merchants_data = []
     
     print("🚀 Generating 5,000 Verified Merchants...")
@@ -19,12 +12,13 @@ def seed_database():
     for i in range(5000):
         bank = random.choice(banks)
         name_base = random.choice(names)
-        upi_id = f"{name_base.lower()}_{i}@{bank}"
-        name = f"{name_base} Branch {i}"
-        trust_score = random.randint(80, 100)
-        status = "Verified"
-        category = "Safe"
-        merchants_data.append((upi_id, name, trust_score, status, category))
+        merchants_data.append({
+            "upi_id": f"{name_base.lower()}_{i}@{bank}",
+            "legal_name": f"{name_base} Branch {i}",
+            "trust_score": random.randint(80, 100),
+            "category": "Safe",
+            "is_verified": True,
+        })
 
     print("⚠️  Generating 500 Known Scammers...")
     # Generate 500 Fraud Merchants
@@ -32,27 +26,19 @@ def seed_database():
     
     for i in range(500):
         keyword = random.choice(scam_keywords)
-        upi_id = f"{keyword}_{i}@paytm"
-        name = f"Fake Scheme {i}"
-        trust_score = 0
-        status = "Blacklisted"
-        category = "Fraud"
-        merchants_data.append((upi_id, name, trust_score, status, category))
+        merchants_data.append({
+            "upi_id": f"{keyword}_{i}@paytm",
+            "legal_name": f"Fake Scheme {i}",
+            "trust_score": 0,
+            "category": "Fraud",
+            "is_verified": False,
+        })
 
-    # Bulk Insert
+    # Bulk upsert through the ingestion pipeline (creates the schema if needed)
     print("💾 Saving to Database...")
-    cursor.executemany('''
-        INSERT OR IGNORE INTO merchants (upi_id, name, trust_score, status, category)
-        VALUES (?, ?, ?, ?, ?)
-    ''', merchants_data)
-    
-    conn.commit()
-    
-    # Verify count
-    count = cursor.execute("SELECT COUNT(*) FROM merchants").fetchone()[0]
-    print(f"✅ Success! Database contains {count} records.")
+    stats = ingest_records(merchants_data, quiet=True)
     
-    conn.close()
+    print(f"✅ Success! Upserted {stats.upserted} records ({stats.rejected} rejected).")
 
 if __name__ == "__main__":
     seed_database()
@@ -1,10 +1,14 @@
-import sqlite3
-from database import init_db, add_merchant, get_db_connection, DB_NAME
+import os
+from database import init_db, get_db_connection, DB_NAME
+from ingest import ingest_records
+
+FIELDS = ("upi_id", "legal_name", "trust_score", "category", "is_verified")
 
 def seed_production():
     # Reset DB for fresh start with new schema
-    if os.path.exists(DB_NAME):
-        os.remove(DB_NAME)
+    for path in (DB_NAME, DB_NAME + "-wal", DB_NAME + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
     
     init_db()
     
@@ -79,18 +83,19 @@ def seed_production():
     ]
 
     # Populate Verified
-    for upi, name, score, cat in trusted:
-        add_merchant(upi, name, score, cat, True)
+    rows = [(upi, name, score, cat, True) for upi, name, score, cat in trusted]
 
     # Populate Scams
-    for upi, name, score, cat in scams:
-        add_merchant(upi, name, score, cat, False)
+    rows += [(upi, name, score, cat, False) for upi, name, score, cat in scams]
 
     # Fill rest with generated local shops for volume
     for i in range(40):
         name = f"Local Kirana Store {i}"
         upi = f"shop_{i}@paytm"
-        add_merchant(upi, name, 90, "Retail", True)
+        rows.append((upi, name, 90, "Retail", True))
+
+    # One bulk transaction through the ingestion pipeline
+    ingest_records((dict(zip(FIELDS, row)) for row in rows), quiet=True)
 
     conn = get_db_connection()
     count = conn.execute("SELECT COUNT(*) FROM merchants").fetchone()[0]
@@ -98,6 +103,5 @@ def seed_production():
     
     print(f"✅ Production Database Seeded with {count} verified records.")
 
-import os
 if __name__ == "__main__":
     seed_production()
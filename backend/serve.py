@@ -0,0 +1,145 @@
+"""Run SmartShield as N worker processes plus one SQLite writer process.
+
+  python serve.py --workers 4 [--host 127.0.0.1] [--port 8000]
+
+The supervisor binds the listening socket once and hands it to every
+worker, so the kernel spreads connections across them. Each worker is a
+full uvicorn + main:app process with its own cache, Bloom prefilter and
+read pool (shared nothing); the memory-mapped snapshot is shared by the OS.
+The supervisor creates or upgrades the schema once before starting anyone.
+All writes are routed to the writer process (see writer.py), which
+broadcasts the changed IDs back to every worker. Workers that die are
+restarted. Ctrl-C / SIGTERM stops the workers first (they drain their
+write-behind queues through the writer), then the writer.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+RESTART_DELAY = 1.0   # Seconds between restarts of a crashing worker
+STOP_TIMEOUT = 15.0   # Seconds to wait for a worker's graceful shutdown
+# Seconds uvicorn lets open responses (live feed streams) run on shutdown before
+# cancelling them, so the lifespan drain still happens well inside STOP_TIMEOUT
+STREAM_GRACE = 3.0
+
+
+def run_worker(worker_id, sock, requests, inbox, log_level):
+    # Connect before main is imported so no write can take the local path
+    import writer
+    writer.connect(worker_id, requests, inbox)
+
+    import uvicorn
+    config = uvicorn.Config("main:app", log_level=log_level, timeout_graceful_shutdown=STREAM_GRACE)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def run_writer(requests, inboxes):
+    # Ctrl-C reaches the whole process group; the writer must outlive the workers' drain
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    import writer
+    writer.run_writer(requests, inboxes)
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    def __init__(self, workers, host, port, log_level="warning"):
+        self.ctx = multiprocessing.get_context("spawn")  # Fresh interpreters: no inherited SQLite handles
+        self.worker_count = workers
+        self.log_level = log_level
+        self.sock = bind_socket(host, port)
+        self.requests = self.ctx.Queue()
+        self.inboxes = {i: self.ctx.Queue() for i in range(workers)}
+        self.writer = None
+        self.workers = {}
+        self.restarts = 0
+        self._stopping = False
+
+    def start_writer(self):
+        self.writer = self.ctx.Process(target=run_writer, args=(self.requests, self.inboxes),
+                                       name="smartshield-writer")
+        self.writer.start()
+
+    def start_worker(self, worker_id):
+        process = self.ctx.Process(
+            target=run_worker, args=(worker_id, self.sock, self.requests, self.inboxes[worker_id], self.log_level),
+            name=f"smartshield-worker-{worker_id}",
+        )
+        process.start()
+        self.workers[worker_id] = process
+
+    def init_db(self):
+        """Schema DDL, once, before the writer or any worker opens the database."""
+        import database
+        database.init_db()
+        database.close_pool()
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        host, port = self.sock.getsockname()[:2]
+        self.init_db()
+        self.start_writer()
+        for worker_id in range(self.worker_count):
+            self.start_worker(worker_id)
+        print(f"🚀 SmartShield serving on http://{host}:{port} with {self.worker_count} workers "
+              f"(supervisor pid {os.getpid()})")
+
+        while not self._stopping:
+            time.sleep(0.5)
+            if not self.writer.is_alive():
+                print("❌ Writer process exited; shutting down.")
+                break
+            for worker_id, process in list(self.workers.items()):
+                if not process.is_alive() and not self._stopping:
+                    print(f"⚠️  Worker {worker_id} exited with code {process.exitcode}; restarting.")
+                    self.restarts += 1
+                    time.sleep(RESTART_DELAY)
+                    self.start_worker(worker_id)
+        self.stop()
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def stop(self):
+        print("🛑 Stopping workers...")
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()  # SIGTERM: uvicorn runs the lifespan shutdown
+        for process in self.workers.values():
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+        self.requests.put(None)
+        self.writer.join(STOP_TIMEOUT)
+        if self.writer.is_alive():
+            self.writer.kill()
+        self.sock.close()
+        print("✅ Stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SmartShield with N workers and one writer",
+                                     epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+    Supervisor(args.workers, args.host, args.port, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Single-flight coalescing of concurrent work for the same key.
+
+When a viral QR is scanned thousands of times in a burst, every request
+misses the cache at once and would each run the same SQLite read and the
+same scoring pass. A SingleFlight lets the first caller
+for a key do the work while concurrent callers for that key await its
+result. Nothing is cached: once the call finishes the next caller starts a
+new one, so this never serves anything staler than the work itself.
+
+Per event loop (i.e. per process). Registrations don't go through here:
+write_behind.queue already holds one pending row per ID.
+"""
+import asyncio
+import os
+
+SINGLEFLIGHT_ENABLED = os.environ.get("SMARTSHIELD_SINGLEFLIGHT", "1") != "0"
+
+
+class SingleFlight:
+    def __init__(self, name, enabled=SINGLEFLIGHT_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._inflight = {}  # key -> Task
+        self.calls = 0       # Calls that did the work
+        self.shared = 0      # Calls that joined one already in flight
+
+    async def do(self, key, fn, *args):
+        """Await fn(*args), or the in-flight call for `key` if there is one."""
+        if not self.enabled:
+            self.calls += 1
+            return await fn(*args)
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            self.shared += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded: a caller that gives up (client disconnect) doesn't cancel the others' result
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self):
+        total = self.calls + self.shared
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "shared": self.shared,
+            "shared_ratio": round(self.shared / total, 4) if total else 0.0,
+        }
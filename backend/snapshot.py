@@ -0,0 +1,271 @@
+"""Read-only merchant snapshot: a hashed, packed index of `merchants` that
+every worker memory-maps, so all processes on a host share the same pages.
+
+File layout (little-endian):
+  header   magic, format version, record count, max rowid, built-at time,
+           hash table size, offset of the categories table
+  slots    open-addressing hash table (crc32 of the key, linear probing):
+           record index + 1 per slot, 0 = empty
+  records  one fixed-size record per merchant, sorted by upi_id bytes:
+           key offset/length, name offset/length, category index,
+           trust_score, flags (bit 0 = verified)
+  strings  upi_ids and legal names, UTF-8, unterminated
+  categories  JSON list, indexed by the records' category index
+
+Build and publish (atomic rename over the live file):
+  python snapshot.py [--output merchants.snapshot]
+
+Workers notice a new file by inode/mtime and swap to it; readers holding
+the old mapping keep using it until they drop it. Every upi_id this process
+invalidates (its own writes, and the serve.py writer's broadcasts) is
+marked dirty and skipped in the snapshot until a file built after the mark
+is loaded, so changed rows are read from SQLite. Writes made outside the
+server (ingest.py, manual SQL) are not seen until the next publish, so
+re-publish after them. Reputation-managed merchants are left out.
+"""
+import argparse
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+import database
+import reputation
+
+SNAPSHOT_FILE = os.environ.get("SMARTSHIELD_SNAPSHOT", "merchants.snapshot")
+RELOAD_CHECK_INTERVAL = 2.0  # Seconds between stat() checks for a newer snapshot
+
+MAGIC = b"SSNAP\x00\x00\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIqdII")
+SLOT = struct.Struct("<I")
+RECORD = struct.Struct("<IIHHHBB")
+FLAG_VERIFIED = 1
+MAX_PACKED_LENGTH = 0xFFFF  # upi_id / legal_name bytes (RECORD's H fields)
+MAX_PACKED_SCORE = 0xFF     # trust_score (RECORD's first B field)
+
+
+# --- BUILD ---
+
+def build_snapshot(db_name, output_path):
+    """Export merchants from `db_name` and atomically replace `output_path`. Returns the record count."""
+    built_at = time.time()  # Before the read, so writes marked dirty after this aren't in the file
+    conn = sqlite3.connect(db_name)
+    try:
+        # Reputation-managed scores (unverified, 1-99) change continuously, so those rows
+        # stay in SQLite; the snapshot holds the verified and blacklisted sets
+        rows = conn.execute(
+            "SELECT upi_id, legal_name, trust_score, category, is_verified FROM merchants "
+            "WHERE is_verified = 1 OR trust_score NOT BETWEEN ? AND ?",
+            (reputation.MIN_SCORE, reputation.MAX_SCORE),
+        ).fetchall()
+        max_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM merchants").fetchone()[0]
+    finally:
+        conn.close()
+
+    # RECORD packs lengths as u16 and trust_score as u8, and the schema doesn't bound either:
+    # a row that doesn't fit is left out (and so read from SQLite) instead of failing the build
+    entries = []
+    skipped = 0
+    for upi_id, name, score, category, verified in rows:
+        key, name = upi_id.encode("utf-8"), str(name).encode("utf-8")
+        if (type(score) is not int or not 0 <= score <= MAX_PACKED_SCORE
+                or len(key) > MAX_PACKED_LENGTH or len(name) > MAX_PACKED_LENGTH):
+            skipped += 1
+            continue
+        entries.append((key, name, score, category, verified))
+    entries.sort(key=lambda entry: entry[0])
+    if skipped:
+        print(f"⚠️  Left {skipped:,} merchants out of the snapshot (score or name out of range)")
+
+    # Load factor <= 0.5 keeps probe chains to one or two slots
+    slot_count = 1
+    while slot_count < 2 * len(entries):
+        slot_count *= 2
+    slots = [0] * slot_count
+    for i, entry in enumerate(entries):
+        slot = zlib.crc32(entry[0]) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = i + 1
+
+    categories = {}
+    records_offset = HEADER.size + SLOT.size * slot_count
+    strings_offset = records_offset + RECORD.size * len(entries)
+    records = bytearray()
+    strings = bytearray()
+    for key, name, score, category, verified in entries:
+        category_index = categories.setdefault(category, len(categories))
+        key_offset = strings_offset + len(strings)
+        strings += key
+        name_offset = strings_offset + len(strings)
+        strings += name
+        records += RECORD.pack(key_offset, name_offset, len(key), len(name), category_index,
+                               score, FLAG_VERIFIED if verified else 0)
+
+    categories_offset = strings_offset + len(strings)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(entries), max_rowid, built_at,
+                         slot_count, categories_offset)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(struct.pack(f"<{slot_count}I", *slots))
+        f.write(records)
+        f.write(strings)
+        f.write(json.dumps(list(categories)).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_path)  # Readers see either the old file or the new one, never a mix
+    return len(entries)
+
+
+# --- READ ---
+
+class Snapshot:
+    """One memory-mapped snapshot file. Immutable once opened."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.max_rowid, self.built_at, self._slot_count, categories_offset = \
+            HEADER.unpack_from(self._mm, 0)
+        self._records_offset = HEADER.size + SLOT.size * self._slot_count
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} merchant snapshot")
+        self.categories = json.loads(self._mm[categories_offset:])
+
+    def get(self, upi_id):
+        """Merchant dict (same shape as a merchants row) or None if not in the snapshot."""
+        if not self.count:
+            return None
+        mm = self._mm
+        key = upi_id.encode("utf-8")
+        mask = self._slot_count - 1
+        slot = zlib.crc32(key) & mask
+        while True:
+            index = SLOT.unpack_from(mm, HEADER.size + slot * SLOT.size)[0]
+            if not index:
+                return None
+            key_offset, name_offset, key_length, name_length, category_index, score, flags = \
+                RECORD.unpack_from(mm, self._records_offset + (index - 1) * RECORD.size)
+            if key_length == len(key) and mm[key_offset:key_offset + key_length] == key:
+                break
+            slot = (slot + 1) & mask
+        return {
+            "upi_id": upi_id,
+            "legal_name": self._mm[name_offset:name_offset + name_length].decode("utf-8"),
+            "trust_score": score,
+            "category": self.categories[category_index],
+            "is_verified": flags & FLAG_VERIFIED,
+        }
+
+    def __len__(self):
+        return self.count
+
+
+class SnapshotStore:
+    """Holds the live Snapshot and swaps in a new one when the file is republished."""
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self.current = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._dirty = {}  # upi_id -> time.time() of the write that made its snapshot row stale
+        self.hits = 0
+        self.misses = 0
+        self.dirty_skips = 0
+        self.reload()
+
+    def reload(self):
+        """Map the file at `path` if it changed. Keeps the current snapshot if the file is bad."""
+        with self._lock:
+            if not self.path:
+                self.current = None
+                return False
+            try:
+                stat = os.stat(self.path)
+                if self.current and self.current.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+                    return False
+                snapshot = Snapshot(self.path)
+            except FileNotFoundError:
+                self.current = None
+                return False
+            except (OSError, ValueError, struct.error) as e:
+                print(f"⚠️  Could not load merchant snapshot {self.path}: {e}")
+                return False
+            self.current = snapshot  # Atomic reference swap; the old mapping closes when unreferenced
+            # Keys changed before the new file was built are current in it
+            self._dirty = {upi_id: marked for upi_id, marked in self._dirty.items() if marked >= snapshot.built_at}
+            print(f"📦 Merchant snapshot loaded: {len(snapshot):,} merchants from {self.path}")
+            return True
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + RELOAD_CHECK_INTERVAL
+        return self.reload()
+
+    def use(self, path):
+        """Point the store at another file (None disables it)."""
+        self.path = path
+        self.current = None
+        self._next_check = 0.0
+        return self.reload()
+
+    def mark_dirty(self, upi_id):
+        """A write changed upi_id: answer it from SQLite until a newer snapshot is loaded."""
+        if self.current is not None:
+            self._dirty[upi_id] = time.time()
+
+    def get(self, upi_id):
+        self.reload_if_changed()
+        snapshot = self.current
+        if snapshot is None:
+            return None
+        if upi_id in self._dirty:
+            self.dirty_skips += 1
+            return None
+        merchant = snapshot.get(upi_id)
+        if merchant is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return merchant
+
+    def stats(self):
+        snapshot = self.current
+        return {
+            "path": self.path,
+            "loaded": snapshot is not None,
+            "merchants": len(snapshot) if snapshot else 0,
+            "max_rowid": snapshot.max_rowid if snapshot else None,
+            "built_at": snapshot.built_at if snapshot else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "dirty": len(self._dirty),
+            "dirty_skips": self.dirty_skips,
+        }
+
+
+store = SnapshotStore()
+database.invalidation_listeners.append(store.mark_dirty)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish a read-only merchant snapshot")
+    parser.add_argument("--output", default=SNAPSHOT_FILE)
+    args = parser.parse_args()
+    database.init_db()
+    start = time.perf_counter()
+    count = build_snapshot(database.DB_NAME, args.output)
+    print(f"✅ Published {count:,} merchants to {args.output} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,145 @@
+"""One-time process startup: schema, prefilter, cache warm-up, timings.
+
+Under uvicorn and serve.py this runs from the FastAPI lifespan. Hosts that
+don't deliver lifespan events to the app (the Azure Functions ASGI adapter,
+see function_app.py) get the same work from StartupMiddleware, which runs it
+before the first request is handled. Either way it runs once per process.
+
+Every step is timed, along with importing main and the first request, and
+served at /startup/stats (bench_cold_start.py measures the whole path).
+"""
+import asyncio
+import os
+import time
+
+import async_db
+import dashboard
+import database
+import event_log
+import live_feed
+import scoring
+import snapshot
+import trust_sync
+import write_behind
+import writer
+
+STARTED_AT = time.perf_counter()  # main imports this module first
+
+# Whitelisted/blacklisted merchants to preload into the cache (0 = off)
+WARM_CACHE_ENTRIES = int(os.environ.get("SMARTSHIELD_WARM_CACHE_ENTRIES", "50000"))
+# Load the scoring model during startup instead of on the first unknown ID
+PRELOAD_MODEL = os.environ.get("SMARTSHIELD_PRELOAD_MODEL", "1") != "0"
+
+timings = {}  # step -> milliseconds
+_state = {"started": False, "stopped": False, "first_request": False, "warming": None, "warmed": 0}
+_lock = None
+
+
+def _elapsed_ms(since):
+    return round((time.perf_counter() - since) * 1000, 2)
+
+
+def mark_imported():
+    """Called at the end of main's import."""
+    timings.setdefault("import", _elapsed_ms(STARTED_AT))
+
+
+async def _step(name, fn, *args):
+    started = time.perf_counter()
+    result = await async_db.run_in_db_thread(fn, *args)
+    timings[name] = _elapsed_ms(started)
+    return result
+
+
+async def start():
+    """Run startup once; concurrent callers wait for the first one to finish."""
+    global _lock
+    if _state["started"]:
+        return
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        if _state["started"]:
+            return
+        started = time.perf_counter()
+        # Creates the table, the /merchants filter indexes and the search index if missing.
+        # serve.py workers skip it: the supervisor ran it once before starting them
+        if not writer.is_worker():
+            await _step("init_db", database.init_db)
+        # Build the "definitely not a known merchant" prefilter before taking traffic
+        await _step("load_filter", database.load_merchant_filter)
+        # Verified handles that unknown IDs are checked against for typosquats
+        await _step("load_lookalike", database.load_lookalike_index)
+        # This process's saved dashboard scan counters, and the other processes'
+        await _step("load_stats", dashboard.scans.load)
+        # Clients further behind than the kept trust list changes get the full lists
+        await _step("prune_sync_log", trust_sync.prune)
+        if PRELOAD_MODEL:
+            await _step("load_engine", scoring.get_engine)
+        write_behind.queue.start()
+        write_behind.reputation_events.start()
+        event_log.log.start()
+        dashboard.scans.start()
+        trust_sync.pruner.start()
+        # Threats relayed from other workers are published onto this loop
+        live_feed.feed.bind(asyncio.get_running_loop())
+        timings["startup"] = _elapsed_ms(started)
+        timings["ready"] = _elapsed_ms(STARTED_AT)
+        _state["started"] = True
+        print(f"⚡ Ready in {timings['ready']:.0f} ms (import {timings.get('import', 0):.0f} ms, "
+              f"startup {timings['startup']:.0f} ms)")
+        # A published snapshot already answers listed merchants without the cache. Otherwise
+        # preload them in the background: requests are served meanwhile, just not all from memory
+        if WARM_CACHE_ENTRIES and snapshot.store.current is None:
+            _state["warming"] = asyncio.create_task(_warm_cache())
+
+
+async def _warm_cache():
+    _state["warmed"] = await _step("warm_cache", database.warm_cache, WARM_CACHE_ENTRIES)
+
+
+def stop():
+    """Drain pending registrations (so reported IDs exist), then reputation events,
+    then save the dashboard scan counters and let queued DB work finish before the
+    process exits. The scan event log's segment is closed last."""
+    if not _state["started"] or _state["stopped"]:
+        return
+    _state["stopped"] = True
+    write_behind.queue.stop()
+    write_behind.reputation_events.stop()
+    dashboard.scans.stop()
+    trust_sync.pruner.stop()
+    async_db.shutdown()
+    event_log.log.stop()
+
+
+def stats():
+    return {
+        "pid": os.getpid(),
+        "started": _state["started"],
+        "warmed_merchants": _state["warmed"],
+        "scoring_engine_loaded": scoring.engine is not None,
+        "timings_ms": timings,
+    }
+
+
+class StartupMiddleware:
+    """Runs start() before the first request when the host skipped the lifespan, and times that request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (_state["first_request"] and _state["started"]):
+            return await self.app(scope, receive, send)
+        if _state["first_request"]:
+            await start()  # A request that arrived while the first one was starting up
+            return await self.app(scope, receive, send)
+        _state["first_request"] = True
+        started = time.perf_counter()
+        await start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            timings["first_request"] = _elapsed_ms(started)
+            timings["first_response"] = _elapsed_ms(STARTED_AT)
@@ -1,99 +1,336 @@
-import requests
-import concurrent.futures
-import time
+"""SmartShield load generator and benchmark harness.
+
+Drives /scan_qr with a configurable traffic mix and records latency
+histograms, throughput and error rates to JSON (draw them with
+generate_charts.py).
+
+Targets:
+  (default)        the FastAPI app in-process, against a seeded temp DB
+  --spawn-uvicorn  a local uvicorn subprocess, against a seeded temp DB
+  --spawn-serve    a local serve.py (N workers + one writer process), same temp DB
+  --url URL        an already-running server
+
+Load models:
+  --mode closed    N clients, each sending its next request when the last returns
+  --mode open      constant arrival rate; latency is measured from each request's
+                   scheduled send time, so a stalled server can't hide its queueing
+
+Examples:
+  python stress_test.py --mode open --rate 500 --duration 30 --output bench_results/open_500.json
+  python stress_test.py --mode closed --concurrency 50 --mix known_safe=0.5,unknown_clean=0.5
+  python stress_test.py --url http://127.0.0.1:8000 --checks
+"""
+import argparse
+import asyncio
 import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+from bench_utils import LatencyHistogram, UNLIMITED_ENV, temp_database, synthetic_upi_id
+
+DEFAULT_MIX = "known_safe=0.6,known_fraud=0.1,unknown_clean=0.2,unknown_suspicious=0.1"
+SEED_ROWS = 20000
+
+
+# --- TRAFFIC MIX ---
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    unknown = set(mix) - {"known_safe", "known_fraud", "unknown_clean", "unknown_suspicious"}
+    if unknown:
+        raise SystemExit(f"Unknown traffic kinds in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class TrafficGenerator:
+    """Picks request payloads according to the mix. Unknown IDs are unique per run."""
+
+    def __init__(self, mix, known_safe, known_fraud, seed=42):
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.known_safe = known_safe
+        self.known_fraud = known_fraud
+        self.rng = random.Random(seed)
+        self.run_id = f"{int(time.time()) % 100000}_{seed}"  # Parallel clients use distinct seeds
+        self.counter = 0
+
+    def next(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        self.counter += 1
+        if kind == "known_safe" and self.known_safe:
+            qr_text = self.rng.choice(self.known_safe)
+        elif kind == "known_fraud" and self.known_fraud:
+            qr_text = self.rng.choice(self.known_fraud)
+        elif kind == "unknown_suspicious":
+            qr_text = f"upi://pay?pa=prize_claim_{self.run_id}_{self.counter}@ybl&pn=Lottery"
+        else:
+            qr_text = f"upi://pay?pa=newshop_{self.run_id}_{self.counter}@okaxis&pn=Shop"
+        return kind, {"qr_text": qr_text}
+
+
+def local_known_ids(rows):
+    # bench_utils.seed_synthetic_merchants makes every 10th merchant a known fraud
+    safe = [synthetic_upi_id(i) for i in range(rows) if i % 10]
+    fraud = [synthetic_upi_id(i) for i in range(rows) if not i % 10]
+    return safe, fraud
+
+
+async def remote_known_ids(client, limit=2000):
+    """Collect known-safe and known-fraud IDs from a running server's /merchants."""
+    async def collect(**filters):
+        ids, cursor = [], None
+        while len(ids) < limit:
+            params = {"limit": 200, **filters}
+            if cursor is not None:
+                params["cursor"] = cursor
+            page = (await client.get("/merchants", params=params)).json()
+            ids += [m["upi_id"] for m in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        return ids
+    return await collect(min_score=100), await collect(max_score=0)
+
+
+# --- TARGETS ---
+
+@asynccontextmanager
+async def in_process_target(seed_rows):
+    import main
+    with temp_database(seed_rows):
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://inprocess") as client:
+                yield client, local_known_ids(seed_rows)
+
+
+@asynccontextmanager
+async def server_target(seed_rows, workers, serve=False):
+    with temp_database(seed_rows) as db_path:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        env = dict(os.environ, SMARTSHIELD_DB=db_path, **UNLIMITED_ENV)
+        if serve:
+            command = [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers)]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+                       "--log-level", "warning"]
+        server = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=10) as client:
+                for _ in range(100):
+                    try:
+                        await client.get("/cache/stats")
+                        break
+                    except httpx.TransportError:
+                        await asyncio.sleep(0.1)
+                else:
+                    raise SystemExit("❌ Server did not start")
+                yield client, local_known_ids(seed_rows)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
 
-API_URL = "http://127.0.0.1:8000/scan_qr"
 
-def send_request(payload):
+@asynccontextmanager
+async def url_target(url):
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=url, timeout=10, limits=limits) as client:
+        yield client, await remote_known_ids(client)
+
+
+# --- RECORDING ---
+
+class Recorder:
+    def __init__(self, warmup):
+        self.started = time.perf_counter()
+        self.measure_from = self.started + warmup
+        self.overall = LatencyHistogram()
+        self.by_kind = {}
+        self.statuses = {}
+        self.errors = {}
+        self.timeline = {}  # second -> completed requests
+
+    def record(self, kind, scheduled, status, error=None):
+        now = time.perf_counter()
+        if scheduled < self.measure_from:
+            return
+        micros = (now - scheduled) * 1e6
+        self.overall.record(micros)
+        self.by_kind.setdefault(kind, LatencyHistogram()).record(micros)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        else:
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        second = int(now - self.measure_from)
+        self.timeline[second] = self.timeline.get(second, 0) + 1
+
+    def results(self, config):
+        elapsed = max(1e-9, time.perf_counter() - self.measure_from)
+        failed = sum(self.errors.values()) + sum(c for s, c in self.statuses.items() if not s.startswith("2"))
+        return {
+            "config": config,
+            "elapsed_s": elapsed,
+            "requests": self.overall.count,
+            "throughput_rps": self.overall.count / elapsed,
+            "error_rate": failed / self.overall.count if self.overall.count else 0.0,
+            "statuses": self.statuses,
+            "errors": self.errors,
+            "latency_ms": self.overall.summary_ms(),
+            "latency_ms_by_kind": {k: h.summary_ms() for k, h in self.by_kind.items()},
+            "histogram": self.overall.to_dict(),
+            "timeline_rps": [self.timeline.get(s, 0) for s in range(int(elapsed) + 1)],
+        }
+
+
+async def send(client, recorder, kind, payload, scheduled):
     try:
-        start = time.time()
-        response = requests.post(API_URL, json=payload, timeout=5)
-        latency = (time.time() - start) * 1000
-        return response.status_code, latency, response.json() if response.status_code < 500 else response.text
-    except Exception as e:
-        return 0, 0, str(e)
-
-def run_stress_test():
-    print("🚀 STARTING STRESS TEST on http://127.0.0.1:8000/scan_qr\n")
-
-    # 1. HAPPY PATH
-    print("--- 1. HAPPY PATH CHECK ---")
-    status, lat, data = send_request({"qr_text": "starbucks@okhdfc"})
-    print(f"Status: {status}, Latency: {lat:.2f}ms, Response: {data}")
-    if status == 200: print("✅ Passed")
-    else: print("❌ Failed")
-    print()
-
-    # 2. MALFORMED INPUT (Missing Field)
-    print("--- 2. MALFORMED INPUT (Missing 'qr_text') ---")
-    status, lat, data = send_request({"wrong_field": "test"})
-    print(f"Status: {status} (Expected 422)")
-    if status == 422: print("✅ Passed (Properly Rejected)")
-    else: print(f"❌ Failed (Got {status})")
-    print()
-
-    # 3. TYPE MISMATCH
-    print("--- 3. TYPE MISMATCH (Int instead of Str) ---")
-    status, lat, data = send_request({"qr_text": 12345})
-    print(f"Status: {status} (Expected 422 or 200 via auto-cast)")
-    # Pydantic might auto-cast int to str, so 200 is also acceptable if it handles it.
-    if status in [422, 200]: print("✅ Passed (Handled Gracefully)")
-    else: print(f"❌ Failed (Got {status})")
-    print()
-
-    # 4. EXTREME VALUE (Large Payload)
-    print("--- 4. EXTREME VALUE (1MB String) ---")
-    large_payload = {"qr_text": "A" * 1000000}
-    status, lat, data = send_request(large_payload)
-    print(f"Status: {status}, Latency: {lat:.2f}ms")
-    if status == 200: print("✅ Passed (Handled Large Input)")
-    else: print(f"❌ Failed (Got {status})")
-    print()
-
-    # 5. HIGH VOLUME (Concurrency)
-    print("--- 5. HIGH VOLUME (100 concurrent requests) ---")
-    payloads = [{"qr_text": f"test_user_{i}@upi"} for i in range(100)]
-    start_time = time.time()
-    
-    success_count = 0
-    fail_count = 0
-    latencies = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=50) as executor:
-        results = list(executor.map(send_request, payloads))
-    
-    total_time = time.time() - start_time
-    
-    for status, lat, _ in results:
-        if status == 200:
-            success_count += 1
-            latencies.append(lat)
+        response = await client.post("/scan_qr", json=payload)
+        recorder.record(kind, scheduled, response.status_code)
+    except httpx.HTTPError as e:
+        recorder.record(kind, scheduled, None, error=type(e).__name__)
+
+
+async def closed_loop(client, generator, recorder, concurrency, deadline):
+    async def worker():
+        while time.perf_counter() < deadline:
+            kind, payload = generator.next()
+            await send(client, recorder, kind, payload, time.perf_counter())
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(client, generator, recorder, rate, deadline, max_inflight):
+    start = time.perf_counter()
+    tasks = set()
+    sent = 0
+    while True:
+        scheduled = start + sent / rate
+        if scheduled >= deadline:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind, payload = generator.next()
+        if len(tasks) >= max_inflight:
+            # The server is this far behind; count it instead of queueing without bound
+            recorder.record(kind, scheduled, None, error="client_backlog")
         else:
-            fail_count += 1
-
-    avg_lat = sum(latencies) / len(latencies) if latencies else 0
-    
-    print(f"Total Requests: 100")
-    print(f"Total Time: {total_time:.2f}s")
-    print(f"Success: {success_count}")
-    print(f"Failed: {fail_count}")
-    print(f"Avg Latency: {avg_lat:.2f}ms")
-    print(f"Requests/Sec: {100/total_time:.2f}")
-    
-    if fail_count == 0: print("✅ Passed High Volume")
-    else: print("⚠️ Passed with some failures")
-    print()
-    
-    # 6. SQL INJECTION / SPECIAL CHARS
-    print("--- 6. INJECTION ATTEMPT ---")
-    injection_payload = {"qr_text": "'; DROP TABLE merchants; --"}
-    status, lat, data = send_request(injection_payload)
-    print(f"Payload: {injection_payload['qr_text']}")
-    print(f"Response: {data}")
-    # Should be treated as a string, no error.
-    if status == 200: print("✅ Passed (Sanitized/Treated as String)")
-    else: print("❌ Failed")
+            task = asyncio.create_task(send(client, recorder, kind, payload, scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        sent += 1
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def run_load(args):
+    if args.url:
+        target = url_target(args.url)
+    elif args.spawn_uvicorn or args.spawn_serve:
+        target = server_target(args.seed_rows, args.workers, serve=args.spawn_serve)
+    else:
+        target = in_process_target(args.seed_rows)
+
+    async with target as (client, (known_safe, known_fraud)):
+        generator = TrafficGenerator(parse_mix(args.mix), known_safe, known_fraud, seed=args.seed)
+        recorder = Recorder(args.warmup)
+        deadline = recorder.measure_from + args.duration
+        if args.mode == "open":
+            await open_loop(client, generator, recorder, args.rate, deadline, args.max_inflight)
+        else:
+            await closed_loop(client, generator, recorder, args.concurrency, deadline)
+
+    target_name = args.url or ("uvicorn" if args.spawn_uvicorn else "serve" if args.spawn_serve else "inprocess")
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "checks")}
+    config["target"] = target_name
+    return recorder.results(config)
+
+
+def print_summary(results):
+    lat = results["latency_ms"]
+    print(f"\n📊 {results['requests']} requests in {results['elapsed_s']:.1f}s "
+          f"→ {results['throughput_rps']:.0f} req/s, error rate {results['error_rate']:.2%}")
+    print(f"   latency ms: p50 {lat['p50']:.2f}  p90 {lat['p90']:.2f}  p99 {lat['p99']:.2f}  "
+          f"p99.9 {lat['p99_9']:.2f}  max {lat['max']:.2f}")
+    for kind, summary in sorted(results["latency_ms_by_kind"].items()):
+        print(f"   {kind:<20} n={summary['count']:<7} p50 {summary['p50']:.2f}  p99 {summary['p99']:.2f}")
+    if results["errors"]:
+        print(f"   errors: {results['errors']}")
+
+
+# --- EDGE-CASE CHECKS (the original stress test cases) ---
+
+async def run_checks(client):
+    cases = [
+        ("Happy path", {"qr_text": "starbucks@okhdfc"}, {200}),
+        ("Missing 'qr_text'", {"wrong_field": "test"}, {422}),
+        ("Int instead of str", {"qr_text": 12345}, {200, 422}),
+        ("1MB payload", {"qr_text": "A" * 1000000}, {413}),
+        ("Injection attempt", {"qr_text": "'; DROP TABLE merchants; --"}, {200}),
+    ]
+    passed = 0
+    for name, payload, expected in cases:
+        response = await client.post("/scan_qr", json=payload)
+        ok = response.status_code in expected
+        passed += ok
+        print(f"{'✅' if ok else '❌'} {name}: HTTP {response.status_code} (expected {sorted(expected)})")
+    print(f"\n{passed}/{len(cases)} checks passed")
+    return passed == len(cases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartShield load generator", epilog=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Benchmark an already-running server")
+    target.add_argument("--spawn-uvicorn", action="store_true", help="Start a local uvicorn on a temp DB")
+    target.add_argument("--spawn-serve", action="store_true", help="Start serve.py (workers + writer) on a temp DB")
+    parser.add_argument("--workers", type=int, default=1, help="Server workers with --spawn-uvicorn/--spawn-serve")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=50, help="Clients in closed-loop mode")
+    parser.add_argument("--rate", type=float, default=500, help="Requests/sec in open-loop mode")
+    parser.add_argument("--max-inflight", type=int, default=5000, help="Open-loop cap on outstanding requests")
+    parser.add_argument("--duration", type=float, default=10, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds of traffic excluded from results")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Traffic mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--seed-rows", type=int, default=SEED_ROWS, help="Merchants seeded into the temp DB")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--checks", action="store_true", help="Run the edge-case checks instead of a load test")
+    args = parser.parse_args()
+
+    if args.checks:
+        async def checks():
+            if args.url:
+                async with httpx.AsyncClient(base_url=args.url, timeout=10) as client:
+                    return await run_checks(client)
+            async with in_process_target(0) as (client, _):
+                return await run_checks(client)
+        sys.exit(0 if asyncio.run(checks()) else 1)
+
+    target_name = args.url or ("uvicorn" if args.spawn_uvicorn else "serve.py" if args.spawn_serve else "in-process app")
+    print(f"🚀 {args.mode}-loop load against {target_name} "
+          f"for {args.duration:.0f}s (+{args.warmup:.0f}s warmup)")
+    results = asyncio.run(run_load(args))
+    print_summary(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
 
 if __name__ == "__main__":
-    run_stress_test()
+    main()
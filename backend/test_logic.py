@@ -1,5 +1,7 @@
 import requests
 import sys
+import time
+import uuid
 
 # ANSI Colors
 GREEN = '\033[92m'
@@ -37,6 +39,31 @@ def test_endpoint(name, payload, expected_status):
         print(f"\n{RED}❌ FAIL: Error {e}{RESET}")
         return False
 
+def test_single_report():
+    """One fraud report (one client) must not flip a fresh merchant to FRAUD."""
+    name = "Reputation (one fraud report stays SAFE)"
+    upi_id = f"shop_{uuid.uuid4().hex[:8]}@okaxis"
+    print(f"Testing {name}...", end=" ")
+    try:
+        requests.post(f"{BASE_URL}/scan_qr", json={"qr_text": f"upi://pay?pa={upi_id}"})
+        time.sleep(0.5)  # Registration is write-behind
+        report = requests.post(f"{BASE_URL}/report", json={"qr_text": upi_id, "verdict": "fraud"})
+        if not report.ok or not report.json().get("accepted"):
+            print(f"\n{RED}❌ FAIL: {name}: report not accepted (HTTP {report.status_code}){RESET}")
+            return False
+        time.sleep(2.5)  # Reputation events are flushed every second
+        status = requests.post(f"{BASE_URL}/scan_qr", json={"qr_text": f"upi://pay?pa={upi_id}"}).json().get("status")
+    except requests.exceptions.ConnectionError:
+        print(f"\n{RED}❌ FAIL: Could not connect to {BASE_URL}. Is the server running?{RESET}")
+        return False
+    if status == "SAFE":
+        print(f"\r{GREEN}✅ PASS: {name} {RESET}")
+        return True
+    print(f"\n{RED}❌ FAIL: {name}{RESET}")
+    print(f"   Expected: SAFE")
+    print(f"   Got:      {status}")
+    return False
+
 def main():
     print(f"{BOLD}🔍 Starting SmartShield.AI Logic Verification{RESET}\n")
     
@@ -50,8 +77,10 @@ def main():
     for name, payload, expected in tests:
         if test_endpoint(name, payload, expected):
             passed += 1
+    if test_single_report():
+        passed += 1
             
-    print(f"\n{BOLD}Results: {passed}/{len(tests)} Tests Passed{RESET}")
+    print(f"\n{BOLD}Results: {passed}/{len(tests) + 1} Tests Passed{RESET}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,158 @@
+"""Train the n-gram scoring model (scoring.NgramScorer) and write its artifact.
+
+Labels come from the merchants table (trust_score 0 = fraud, verified = clean)
+topped up with synthetic handles, since the seed data alone is tiny.
+
+Usage:
+  python train_model.py [--output scoring_model.npz] [--synthetic 40000] [--epochs 300]
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+import numpy as np
+
+import database
+import keywords
+import scoring
+
+MODEL_VERSION = "v1"
+HASH_DIM = 1 << 14
+NGRAM_RANGE = (2, 4)
+
+FIRST_NAMES = ["rahul", "priya", "amit", "neha", "vikram", "anjali", "suresh", "kavya", "arjun", "pooja",
+               "rohan", "sneha", "karan", "divya", "manish", "isha", "deepak", "meera", "sanjay", "ritu"]
+LAST_NAMES = ["sharma", "verma", "patel", "reddy", "iyer", "singh", "gupta", "nair", "das", "joshi"]
+SHOP_WORDS = ["store", "mart", "traders", "medicals", "kirana", "foods", "cafe", "enterprises", "stores", "agency"]
+BRAND_WORDS = ["starbucks", "zomato", "swiggy", "uber", "ola", "dmart", "reliance", "tanishq", "croma", "bigbasket",
+               "nykaa", "myntra", "decathlon", "irctc", "airtel", "jio", "apollo", "shell", "dominos", "bata"]
+SCAM_FILLERS = ["helpdesk", "support", "care", "desk", "official", "verify", "update", "team", "center", "service"]
+PSPS = sorted(scoring.COMMON_PSPS)
+
+
+def synthetic_examples(count, rng):
+    """(upi_id, label) pairs, roughly half of each class."""
+    scam_words = [k for k, _ in keywords.parse_keywords_file(keywords.KEYWORDS_FILE)] or keywords.DEFAULT_KEYWORDS
+    examples = []
+    for _ in range(count // 2):
+        kind = rng.random()
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        if kind < 0.35:
+            handle = rng.choice([f"{first}.{last}", f"{first}{last}", f"{first}{rng.randint(1, 99)}", f"{first}_{last}"])
+        elif kind < 0.6:
+            handle = str(rng.randint(6000000000, 9999999999))
+        elif kind < 0.8:
+            brand = rng.choice(BRAND_WORDS)
+            handle = rng.choice([brand, f"{brand}.in", f"{brand}pay", f"{brand}{rng.randint(1, 999)}", f"{brand}.{last}"])
+        else:
+            handle = rng.choice([f"{last}{rng.choice(SHOP_WORDS)}", f"{first}.{rng.choice(SHOP_WORDS)}",
+                                 f"{rng.choice(SHOP_WORDS)}{rng.randint(1, 999)}"])
+        examples.append((f"{handle}@{rng.choice(PSPS)}", 0))
+
+    for _ in range(count - count // 2):
+        kind = rng.random()
+        word = rng.choice(scam_words)
+        if kind < 0.5:
+            handle = rng.choice([f"{word}.{rng.choice(SCAM_FILLERS)}", f"{word}{rng.randint(1, 9999)}",
+                                 f"{rng.choice(SCAM_FILLERS)}-{word}", f"{word}_{rng.choice(SCAM_FILLERS)}{rng.randint(1, 99)}"])
+        elif kind < 0.8:
+            handle = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(rng.randint(9, 16)))
+        else:
+            handle = f"{rng.choice(SCAM_FILLERS)}.{rng.choice(SCAM_FILLERS)}{rng.randint(100, 99999)}"
+        psp = rng.choice(PSPS) if rng.random() < 0.6 else rng.choice(["okaxis1", "pay", "upid", "apl2", "bank"])
+        examples.append((f"{handle}@{psp}", 1))
+    return examples
+
+
+def labelled_merchants(db_name):
+    conn = sqlite3.connect(db_name)
+    try:
+        rows = conn.execute(
+            "SELECT upi_id, trust_score FROM merchants WHERE trust_score = 0 OR is_verified = 1"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+    return [(upi_id, 1 if trust_score == 0 else 0) for upi_id, trust_score in rows]
+
+
+def train(upi_ids, labels, epochs=300, learning_rate=0.5, l2=1e-4):
+    """Full-batch logistic regression with Adam on the sparse feature matrix."""
+    features = scoring.extract_features(upi_ids, HASH_DIM, *NGRAM_RANGE)
+    rows, cols, values = features
+    y = np.asarray(labels, dtype=np.float64)
+    n = len(y)
+    dim = HASH_DIM + scoring.DENSE_FEATURES
+    weights = np.zeros(dim)
+    bias = 0.0
+    m_w, v_w = np.zeros(dim), np.zeros(dim)
+    m_b = v_b = 0.0
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for step in range(1, epochs + 1):
+        error = scoring.predict_proba(weights, bias, features, n) - y
+        grad_w = np.bincount(cols, weights=values * error[rows], minlength=dim) / n + l2 * weights
+        grad_b = error.mean()
+        m_w = beta1 * m_w + (1 - beta1) * grad_w
+        v_w = beta2 * v_w + (1 - beta2) * grad_w ** 2
+        m_b = beta1 * m_b + (1 - beta1) * grad_b
+        v_b = beta2 * v_b + (1 - beta2) * grad_b ** 2
+        correction1, correction2 = 1 - beta1 ** step, 1 - beta2 ** step
+        weights -= learning_rate * (m_w / correction1) / (np.sqrt(v_w / correction2) + eps)
+        bias -= learning_rate * (m_b / correction1) / (np.sqrt(v_b / correction2) + eps)
+    return weights, bias
+
+
+def evaluate(weights, bias, upi_ids, labels, threshold=0.5):
+    features = scoring.extract_features(upi_ids, HASH_DIM, *NGRAM_RANGE)
+    predicted = scoring.predict_proba(weights, bias, features, len(upi_ids)) >= threshold
+    actual = np.asarray(labels, dtype=bool)
+    tp = int((predicted & actual).sum())
+    fp = int((predicted & ~actual).sum())
+    fn = int((~predicted & actual).sum())
+    return {
+        "accuracy": float((predicted == actual).mean()),
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the n-gram scoring model")
+    parser.add_argument("--output", default=scoring.MODEL_FILE)
+    parser.add_argument("--synthetic", type=int, default=40000, help="Synthetic examples to add")
+    parser.add_argument("--epochs", type=int, default=300)
+    # A flagged unknown is registered as a blacklisted merchant, so err towards precision
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    examples = labelled_merchants(database.DB_NAME) + synthetic_examples(args.synthetic, rng)
+    rng.shuffle(examples)
+    split = int(len(examples) * 0.8)
+    train_set, test_set = examples[:split], examples[split:]
+    print(f"🧠 Training on {len(train_set):,} examples ({sum(l for _, l in train_set):,} fraud), "
+          f"holding out {len(test_set):,}...")
+
+    start = time.perf_counter()
+    weights, bias = train([u for u, _ in train_set], [l for _, l in train_set], epochs=args.epochs)
+    print(f"   trained in {time.perf_counter() - start:.1f}s")
+    metrics = evaluate(weights, bias, [u for u, _ in test_set], [l for _, l in test_set], args.threshold)
+    print("   held-out: " + ", ".join(f"{k} {v:.3f}" for k, v in metrics.items()))
+
+    np.savez(
+        args.output,
+        weights=weights.astype(np.float32),
+        bias=np.float64(bias),
+        hash_dim=np.int64(HASH_DIM),
+        ngram_range=np.asarray(NGRAM_RANGE),
+        threshold=np.float64(args.threshold),
+        version=np.asarray(MODEL_VERSION),
+    )
+    print(f"✅ Model written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Versioned sync of the blacklist and whitelist so clients can verify scans offline.
+
+  change log  trust_list_changes gets (version, upi_id) from triggers on
+              merchants whenever an ID joins, leaves or is renamed within the
+              trust_score 0 or 100 lists, in the same transaction as the write
+              (add_merchant, ingest.py, the serve.py writer, any score update).
+              Unknown IDs the server flagged itself (database.AUTO_FLAGGED_NAME)
+              are left out: clients only get curated entries
+  delta       a client at version v asks for ?since=v and gets the current
+              state of every ID changed after v: a range scan of the log's
+              primary key joined to merchants, so it costs what changed, not
+              what's listed
+  snapshot    no ?since, or one older than the log reaches, gets both lists
+              in full. Clients replace their copy with it
+  ETag        the current version. If-None-Match with it is a 304 that costs
+              one primary key seek
+  bodies      gzipped JSON, built once per (since, version) and cached, so a
+              fleet of clients polling from the same version costs one query
+
+The log is pruned to the newest SYNC_LOG_KEEP entries at startup and every
+SYNC_PRUNE_INTERVAL seconds after.
+"""
+import collections
+import gzip
+import json
+import os
+import threading
+import time
+
+import database
+import writer
+
+SYNC_LOG_KEEP = int(os.environ.get("SMARTSHIELD_SYNC_LOG_KEEP", "100000"))
+SYNC_CACHE_SIZE = int(os.environ.get("SMARTSHIELD_SYNC_CACHE_SIZE", "64"))  # Bodies kept for the current version
+SYNC_PRUNE_INTERVAL = float(os.environ.get("SMARTSHIELD_SYNC_PRUNE_INTERVAL", "300"))
+COMPRESS_LEVEL = 9  # Built once per version, so the slowest level is affordable
+
+BLOCKED_SCORE = 0
+VERIFIED_SCORE = 100
+
+
+def etag(version):
+    return f'"{version}"'
+
+
+def encode(version, full, rows):
+    """Gzipped response body: added/updated entries as [upi_id, legal_name] per list, and removed IDs."""
+    blocked, verified, removed = [], [], []
+    for upi_id, trust_score, legal_name in sorted(rows):
+        if trust_score == BLOCKED_SCORE:
+            blocked.append([upi_id, legal_name])
+        elif trust_score == VERIFIED_SCORE:
+            verified.append([upi_id, legal_name])
+        else:
+            removed.append(upi_id)
+    body = {"version": version, "full": full, "blocked": blocked, "verified": verified}
+    if not full:
+        body["removed"] = removed
+    raw = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode()
+    return gzip.compress(raw, COMPRESS_LEVEL, mtime=0), len(raw)
+
+
+class TrustListSync:
+    """Builds and caches /sync/trust_list bodies. Called from DB threads."""
+
+    def __init__(self, cache_size=SYNC_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._version = None
+        self._bodies = collections.OrderedDict()  # since (None = full) -> (full, gzipped body)
+        self.served = collections.Counter()
+        self.built = 0
+        self.raw_bytes = 0
+        self.gzip_bytes = 0
+
+    def get(self, since=None, if_none_match=None):
+        """(version, full, gzipped body), or (version, None, None) when if_none_match is already current."""
+        version, oldest = database.get_trust_list_version()
+        if if_none_match is not None and etag(version) in if_none_match:
+            self.served["not_modified"] += 1
+            return version, None, None
+        # Every `since` the log can't answer gets the same full body
+        if since is not None and (since > version or (oldest is not None and since + 1 < oldest)):
+            since = None
+        with self._lock:
+            if self._version != version:
+                self._version = version
+                self._bodies.clear()
+            cached = self._bodies.get(since)
+            if cached is not None:
+                self._bodies.move_to_end(since)
+        if cached is None:
+            built_version, full, rows = database.get_trust_list(since)
+            body, raw_size = encode(built_version, full, rows)
+            cached = (full, body)
+            with self._lock:
+                self.built += 1
+                self.raw_bytes += raw_size
+                self.gzip_bytes += len(body)
+                if built_version == self._version:
+                    self._bodies[since] = cached
+                    while len(self._bodies) > self.cache_size:
+                        self._bodies.popitem(last=False)
+            version = built_version
+        full, body = cached
+        self.served["full" if full else "delta"] += 1
+        return version, full, body
+
+    def stats(self):
+        return {
+            "version": self._version,
+            "cached_bodies": len(self._bodies),
+            "built": self.built,
+            "compression_ratio": round(self.raw_bytes / self.gzip_bytes, 2) if self.gzip_bytes else None,
+            "served": dict(self.served),
+            "log_keep": SYNC_LOG_KEEP,
+            "pruned": pruner.pruned,
+            "pruned_at": pruner.pruned_at,
+        }
+
+
+lists = TrustListSync()
+
+
+def prune():
+    """Trim the change log to SYNC_LOG_KEEP entries (at startup and from the pruner thread)."""
+    return writer.call("prune_trust_list_changes", SYNC_LOG_KEEP)
+
+
+class LogPruner:
+    """Background thread that keeps the change log trimmed while the server runs."""
+
+    def __init__(self, interval=SYNC_PRUNE_INTERVAL):
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self.pruned = 0
+        self.pruned_at = None
+        self.errors = 0
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="smartshield-sync-prune", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.pruned += prune()
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️  Pruning the trust list change log failed: {e}")
+                continue
+            self.pruned_at = time.time()
+
+    def stop(self):
+        thread = self._thread
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        self._thread = None
+
+
+pruner = LogPruner()
@@ -0,0 +1,78 @@
+"""Parser for `upi://pay?...` deep links and bare VPAs.
+
+Every scan goes through parse(), so it avoids urllib and regex on the common
+path: one partition for the scheme, one split for the query, and
+percent-decoding only for values that actually contain escapes.
+"""
+import re
+from urllib.parse import unquote_plus
+
+UPI_SCHEME = "upi://"
+MAX_VPA_LENGTH = 255
+
+# name@handle, e.g. starbucks@bank, laxmi_chit_fund@ybl, 9876543210@paytm
+_VPA_RE = re.compile(r"[a-z0-9][a-z0-9._\-]*@[a-z0-9][a-z0-9._\-]*")
+_vpa_fullmatch = _VPA_RE.fullmatch
+
+
+class UPIPayload:
+    """Structured view of a scanned QR text."""
+
+    __slots__ = ("vpa", "name", "amount", "currency", "note", "params", "is_uri", "canonical_id")
+
+    def __init__(self, vpa, name, amount, currency, note, params, is_uri, canonical_id):
+        self.vpa = vpa                    # Canonical payee address, or None if there isn't a valid one
+        self.name = name                  # pn
+        self.amount = amount              # am, as float
+        self.currency = currency          # cu
+        self.note = note                  # tn
+        self.params = params              # Every decoded query parameter, keys lowercased
+        self.is_uri = is_uri
+        self.canonical_id = canonical_id  # Key for lookups, cache and inserts
+
+    def __repr__(self):
+        return f"UPIPayload(vpa={self.vpa!r}, name={self.name!r}, amount={self.amount!r}, canonical_id={self.canonical_id!r})"
+
+
+def canonical_vpa(text):
+    """Lowercased, trimmed VPA if `text` is one, else None."""
+    vpa = text.strip().lower()
+    if len(vpa) <= MAX_VPA_LENGTH and _vpa_fullmatch(vpa):
+        return vpa
+    return None
+
+
+def _decode(value):
+    return unquote_plus(value) if "%" in value or "+" in value else value
+
+
+def _parse_amount(value):
+    if value is None:
+        return None
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    return amount if amount >= 0 and amount != float("inf") else None
+
+
+def parse(text):
+    """Parse raw QR text. Never raises; unrecognised input gets vpa=None."""
+    stripped = text.strip()
+    if stripped[:6].lower() != UPI_SCHEME:
+        vpa = canonical_vpa(stripped)
+        return UPIPayload(vpa, None, None, None, None, None, False, vpa or stripped.lower())
+
+    path, _, query = stripped[6:].partition("?")
+    params = {}
+    if query:
+        for pair in query.split("&"):
+            key, _, value = pair.partition("=")
+            if key:
+                params.setdefault(key.lower(), _decode(value))
+
+    # upi://pay?pa=x@y is the standard form; upi://x@y shows up on hand-made stickers
+    pa = params.get("pa")
+    vpa = canonical_vpa(pa) if pa is not None else canonical_vpa(_decode(path))
+    get = params.get
+    return UPIPayload(vpa, get("pn"), _parse_amount(get("am")), get("cu"), get("tn"), params, True, vpa or stripped.lower())
@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+
+import metrics
+import reputation
+import writer
+
+# Flush whichever comes first: FLUSH_INTERVAL seconds or FLUSH_BATCH_SIZE pending IDs.
+FLUSH_INTERVAL = float(os.environ.get("SMARTSHIELD_FLUSH_INTERVAL", "0.05"))
+FLUSH_BATCH_SIZE = int(os.environ.get("SMARTSHIELD_FLUSH_BATCH_SIZE", "500"))
+# Reputation events are coalesced per upi_id, so a longer window means fewer, denser writes.
+REPUTATION_FLUSH_INTERVAL = float(os.environ.get("SMARTSHIELD_REPUTATION_FLUSH_INTERVAL", "1.0"))
+REPUTATION_FLUSH_IDS = int(os.environ.get("SMARTSHIELD_REPUTATION_FLUSH_IDS", "5000"))
+
+
+class WriteBehindQueue:
+    """Collects "new unknown merchant" registrations and writes them in batches.
+
+    Pending entries are deduplicated by upi_id and stay visible through get()
+    until their batch has committed, so readers never miss a registration.
+    """
+
+    def __init__(self, flush_fn=None, interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE):
+        # Default: the bulk insert, run locally or by the serve.py writer process
+        self.flush_fn = flush_fn or (lambda merchants: writer.call("add_merchants_bulk", merchants))
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = {}    # upi_id -> (merchant dict, log line)
+        self._in_flight = {}  # batch currently being written
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.submitted = 0
+        self.deduplicated = 0
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="smartshield-write-behind", daemon=True)
+                self._thread.start()
+
+    def submit(self, merchant, log_line=None):
+        """Queue a merchant for insertion. Never blocks on SQLite."""
+        if self._thread is None:
+            self.start()
+        upi_id = merchant["upi_id"]
+        with self._cond:
+            self.submitted += 1
+            if upi_id in self._pending or upi_id in self._in_flight:
+                self.deduplicated += 1
+                return
+            self._pending[upi_id] = (merchant, log_line)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def get(self, upi_id):
+        """The not-yet-committed merchant for upi_id, or None."""
+        entry = self._pending.get(upi_id) or self._in_flight.get(upi_id)
+        return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self._pending) + len(self._in_flight)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.interval
+                while not self._stopping and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self):
+        """Write everything pending in one transaction."""
+        with self._cond:
+            if not self._pending:
+                return 0
+            self._in_flight, self._pending = self._pending, {}
+            batch = self._in_flight
+        try:
+            started = metrics.now_ns()
+            inserted = self.flush_fn([merchant for merchant, _ in batch.values()])
+            metrics.SCAN_STAGE_SECONDS.observe("insert", metrics.now_ns() - started)
+            self.flushed += len(batch)
+            self.batches += 1
+            for upi_id, (merchant, log_line) in batch.items():
+                if log_line:
+                    metrics.event(log_line, upi_id=upi_id, trust_score=merchant["trust_score"])
+            return inserted
+        except Exception as e:
+            self.errors += 1
+            metrics.error("write_behind_flush_failed", merchants=len(batch), error=str(e))
+            # Put the batch back so the next flush retries it
+            with self._cond:
+                for upi_id, entry in batch.items():
+                    self._pending.setdefault(upi_id, entry)
+            return 0
+        finally:
+            with self._cond:
+                self._in_flight = {}
+
+    def stop(self):
+        """Stop the flusher thread after draining everything still pending."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._cond:
+            self._thread = None
+
+    def stats(self):
+        return {
+            "pending": len(self),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+
+class ReputationBuffer:
+    """Coalesces scan/report events per upi_id and applies them in batches.
+
+    Each flush is one apply_reputation_deltas call (decay + add + rescore),
+    however many events arrived for an ID in the window.
+    """
+
+    def __init__(self, flush_fn=None, interval=REPUTATION_FLUSH_INTERVAL, max_ids=REPUTATION_FLUSH_IDS):
+        self.flush_fn = flush_fn or (lambda deltas, now: writer.call("apply_reputation_deltas", deltas, now))
+        self.interval = interval
+        self.max_ids = max_ids
+        self._pending = {}  # upi_id -> [scans, fraud_reports, safe_reports]
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.events = 0
+        self.flushed_ids = 0
+        self.rescored = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="smartshield-reputation", daemon=True)
+                self._thread.start()
+
+    def record(self, upi_id, kind, count=1):
+        """Count an event ("scan", "fraud_report" or "safe_report"). Never blocks on SQLite."""
+        index = reputation.EVENT_KINDS.index(kind)
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            self.events += count
+            counters = self._pending.get(upi_id)
+            if counters is None:
+                counters = self._pending[upi_id] = [0, 0, 0]
+                if len(self._pending) >= self.max_ids:
+                    self._cond.notify()
+            counters[index] += count
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.interval
+                while not self._stopping and len(self._pending) < self.max_ids:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self):
+        with self._cond:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+        deltas = [(upi_id, *counters) for upi_id, counters in batch.items()]
+        try:
+            rescored = self.flush_fn(deltas, time.time())
+        except Exception as e:
+            self.errors += 1
+            metrics.error("reputation_flush_failed", merchants=len(deltas), error=str(e))
+            # Merge the batch back so the next flush retries it
+            with self._cond:
+                for upi_id, counters in batch.items():
+                    pending = self._pending.setdefault(upi_id, [0, 0, 0])
+                    for i, count in enumerate(counters):
+                        pending[i] += count
+            return 0
+        self.batches += 1
+        self.flushed_ids += len(deltas)
+        self.rescored += rescored
+        return rescored
+
+    def stop(self):
+        """Stop the flusher thread after applying everything still pending."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._cond:
+            self._thread = None
+
+    def stats(self):
+        return {
+            "pending_ids": len(self._pending),
+            "events": self.events,
+            "flushed_ids": self.flushed_ids,
+            "rescored": self.rescored,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+
+queue = WriteBehindQueue()
+reputation_events = ReputationBuffer()
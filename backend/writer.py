@@ -0,0 +1,213 @@
+"""Single-writer routing for multi-worker mode (see serve.py).
+
+Every database write goes through `call(op, ...)`. In a plain single
+process that just runs the `database` function. Under serve.py each worker
+is connected to the writer process instead: the op is sent over an IPC
+queue, the writer runs it on its own connection (so only one process ever
+takes SQLite's write lock), and then broadcasts what changed to every
+worker, which drops those cache entries and adds the rows to its Bloom
+prefilter and lookalike index. Live feed events take the same route, so a
+threat detected by one worker reaches dashboards connected to any of them.
+
+What changed is captured generically. The database write functions already
+keep `merchant_cache` and `merchant_filter` in sync, so in the writer
+process both are replaced by recorders and whatever a write touched is
+what gets broadcast.
+"""
+import itertools
+import os
+import threading
+
+import database
+from cache import MerchantCache
+
+# Database functions a worker may ask the writer to run
+WRITE_OPS = frozenset(["add_merchant", "add_merchants_bulk", "apply_reputation_deltas", "save_scan_stats",
+                       "prune_trust_list_changes"])
+CALL_TIMEOUT = 30.0  # Seconds a worker waits for the writer before failing the write
+
+_client = None
+_feed_handlers = []
+
+
+def call(op, *args, **kwargs):
+    """Run a database write here, or in the writer process when this is a serve.py worker."""
+    if op not in WRITE_OPS:
+        raise ValueError(f"{op} is not a write operation")
+    if _client is not None:
+        return _client.call(op, args, kwargs)
+    return getattr(database, op)(*args, **kwargs)
+
+
+# --- WORKER SIDE ---
+
+class WriterClient:
+    """A worker's connection to the writer: sends ops, waits for acks, applies broadcasts."""
+
+    def __init__(self, worker_id, requests, inbox):
+        self.worker_id = worker_id
+        self.requests = requests
+        self.inbox = inbox
+        self._ids = itertools.count()
+        self._waiting = {}  # call id -> [threading.Event, result, error]
+        self._lock = threading.Lock()
+        self.invalidations = 0
+        self._thread = threading.Thread(target=self._listen, name="smartshield-writer-inbox", daemon=True)
+        self._thread.start()
+
+    def call(self, op, args, kwargs):
+        call_id = (os.getpid(), next(self._ids))  # Unique even across a restarted worker's inbox
+        slot = [threading.Event(), None, None]
+        with self._lock:
+            self._waiting[call_id] = slot
+        self.requests.put(("call", self.worker_id, call_id, op, args, kwargs))
+        if not slot[0].wait(CALL_TIMEOUT):
+            with self._lock:
+                self._waiting.pop(call_id, None)
+            raise TimeoutError(f"Writer process did not answer {op} within {CALL_TIMEOUT}s")
+        if slot[2] is not None:
+            raise RuntimeError(f"Writer process failed {op}: {slot[2]}")
+        return slot[1]
+
+    def _listen(self):
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                return
+            kind = message[0]
+            if kind == "changed":
+                apply_changes(message[1], message[2])
+            elif kind == "feed":
+                for handler in _feed_handlers:
+                    handler(message[1], message[2], message[3])
+            elif kind == "result":
+                _, call_id, result, error = message
+                with self._lock:
+                    slot = self._waiting.pop(call_id, None)
+                if slot is not None:
+                    slot[1], slot[2] = result, error
+                    slot[0].set()
+
+    def stats(self):
+        return {"worker_id": self.worker_id, "waiting": len(self._waiting), "invalidations": self.invalidations}
+
+
+def apply_changes(invalidated, inserted):
+    """Make another process's committed write visible to this worker."""
+    for upi_id in invalidated:
+        database.invalidate_merchant(upi_id)
+    for upi_id, trust_score in inserted:
+        database.note_inserted(upi_id, trust_score)
+    if _client is not None:
+        _client.invalidations += len(invalidated)
+
+
+def connect(worker_id, requests, inbox):
+    """Route this process's writes to the writer process. Call before serving traffic."""
+    global _client
+    _client = WriterClient(worker_id, requests, inbox)
+
+
+def is_worker():
+    """Whether this is a serve.py worker, whose writes go to the writer process."""
+    return _client is not None
+
+
+def stats():
+    return _client.stats() if _client is not None else {"mode": "local"}
+
+
+# --- LIVE FEED RELAY ---
+# Every worker has its own live_feed hub; events go through the writer so all of them see each one
+
+def on_feed(handler):
+    """Register handler(kind, data, event_id) for feed events relayed to this worker (called on the inbox thread).
+
+    The writer numbers the events, so every worker's feed uses the same ids and a
+    client can resume with Last-Event-ID on whichever worker it reconnects to.
+    """
+    _feed_handlers.append(handler)
+
+
+def relays_feed():
+    return _client is not None
+
+
+def publish_feed(kind, data):
+    """Send a feed event to every worker, this one included."""
+    _client.requests.put(("feed", kind, data))
+
+
+# --- WRITER SIDE ---
+
+class RecordingCache(MerchantCache):
+    """Stands in for merchant_cache in the writer: remembers every key a write touched."""
+
+    def __init__(self):
+        super().__init__(max_entries=1)
+        self.touched = []
+
+    def put(self, upi_id, merchant):
+        self.touched.append(upi_id)
+
+    def put_missing(self, upi_id):
+        pass
+
+    def invalidate(self, upi_id):
+        self.touched.append(upi_id)
+
+
+class RecordingFilter:
+    """Stands in for merchant_filter in the writer: remembers inserted rows."""
+
+    loaded = True
+
+    def __init__(self):
+        self.inserted = []
+
+    def add(self, upi_id, trust_score, rowid=None):
+        self.inserted.append((upi_id, trust_score))
+
+    def reset(self):
+        pass
+
+
+def run_writer(requests, inboxes):
+    """Writer process main loop. `inboxes` maps worker id -> that worker's queue."""
+    recorder_cache = RecordingCache()
+    recorder_filter = RecordingFilter()
+    database.merchant_cache = recorder_cache
+    database.merchant_filter = recorder_filter
+    print(f"✍️  Writer process ready for {len(inboxes)} workers.")
+    feed_id = 0  # Live feed event ids, shared by every worker
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        if message[0] == "feed":
+            feed_id += 1
+            for inbox in inboxes.values():
+                inbox.put(message + (feed_id,))
+            continue
+        _, worker_id, call_id, op, args, kwargs = message
+        result = error = None
+        try:
+            if op not in WRITE_OPS:
+                raise ValueError(f"{op} is not a write operation")
+            result = getattr(database, op)(*args, **kwargs)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        invalidated, inserted = list(dict.fromkeys(recorder_cache.touched)), recorder_filter.inserted
+        recorder_cache.touched, recorder_filter.inserted = [], []
+
+        # Broadcast before acking, so the caller's own cache is already clean when its write returns
+        if invalidated or inserted:
+            for inbox in inboxes.values():
+                inbox.put(("changed", invalidated, inserted))
+        inboxes[worker_id].put(("result", call_id, result, error))
+
+    database.close_pool()
+    for inbox in inboxes.values():
+        inbox.put(None)
+
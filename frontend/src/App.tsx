@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import {
   ShieldCheck,
@@ -24,6 +24,7 @@ import {
 import { motion, AnimatePresence } from 'framer-motion';
 import toast, { Toaster } from 'react-hot-toast';
 import LiveScanner from './components/LiveScanner';
+import type { LocalVerdict } from './trustList';
 
 // --- Configuration ---
 const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
@@ -36,31 +37,87 @@ interface ScanResult {
   timestamp?: string; // Client-side timestamp
 }
 
-// --- Mock Data ---
-const MOCK_RECENT_ACTIVITY = [
-  { id: 1, type: 'block', message: 'Calculated High Risk Transaction', amount: '$450.00', time: '2 mins ago' },
-  { id: 2, type: 'verify', message: 'Identity Verified: Starbucks Corp', amount: '$12.50', time: '5 mins ago' },
-  { id: 3, type: 'block', message: 'Suspicious Keyword "Winner"', amount: 'N/A', time: '12 mins ago' },
-];
+interface DashboardStats {
+  merchants: { total: number; blacklisted: number; risky: number; fraud_ratio: number; threats_added_today: number };
+  scans: { total: number; today: { date: string; scans: number; blocked: number } };
+}
+
+interface ThreatEvent {
+  id: string;
+  upi_id: string;
+  score: number;
+  message: string;
+  ts: number;
+}
+
+const LIVE_FEED_SIZE = 20;
 
 function App() {
   const [view, setView] = useState<'dashboard' | 'scanner' | 'database' | 'settings' | 'map'>('dashboard');
 
   // --- Live Database State ---
   const [merchants, setMerchants] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<number | null>(null);
+  const [searchTerm, setSearchTerm] = useState('');
+
+  const merchantsRequest = useRef<AbortController | null>(null);
+
+  // Fetch a page of merchants; search runs server-side over the whole table.
+  // A new fetch aborts the one in flight, so a slow stale response can't replace newer results
+  const fetchMerchants = (cursor: number | null = null) => {
+    merchantsRequest.current?.abort();
+    const controller = new AbortController();
+    merchantsRequest.current = controller;
+    const params: Record<string, string | number> = { limit: 50 };
+    if (searchTerm.trim()) params.q = searchTerm.trim();
+    if (cursor !== null) params.cursor = cursor;
+    axios.get(`${API_URL}/merchants`, { params, signal: controller.signal })
+      .then(res => {
+        setMerchants(prev => cursor === null ? res.data.items : [...prev, ...res.data.items]);
+        setNextCursor(res.data.next_cursor);
+      })
+      .catch(e => {
+        if (!axios.isCancel(e)) console.error("Failed to fetch merchants:", e);
+      });
+  };
 
-  // Fetch Merchants when 'database' view is active
+  // Fetch Merchants when 'database' view is active (debounced while typing a search)
   useEffect(() => {
-    if (view === 'database') {
-      axios.get(`${API_URL}/merchants`)
-        .then(res => setMerchants(res.data))
-        .catch(e => console.error("Failed to fetch merchants:", e));
-    }
+    if (view !== 'database') return;
+    const timer = setTimeout(() => fetchMerchants(), 250);
+    return () => {
+      clearTimeout(timer);
+      merchantsRequest.current?.abort();
+    };
+  }, [view, searchTerm]);
+
+  // Dashboard totals from /stats (incrementally maintained counters, cheap to refetch)
+  const [stats, setStats] = useState<DashboardStats | null>(null);
+
+  useEffect(() => {
+    if (view !== 'dashboard') return;
+    axios.get(`${API_URL}/stats`)
+      .then(res => setStats(res.data))
+      .catch(e => console.error("Failed to fetch stats:", e));
   }, [view]);
+
+  // Live Feed: new threats pushed by the server over SSE (EventSource reconnects and catches up by itself)
+  const [threats, setThreats] = useState<ThreatEvent[]>([]);
+
+  useEffect(() => {
+    if (view !== 'dashboard') return;
+    const source = new EventSource(`${API_URL}/feed/threats`);
+    source.addEventListener('threat', (e) => {
+      const event = e as MessageEvent;
+      const threat = { id: event.lastEventId, ...JSON.parse(event.data) };
+      setThreats(prev => [threat, ...prev].slice(0, LIVE_FEED_SIZE));
+    });
+    return () => source.close();
+  }, [view]);
+
   const [scanResult, setScanResult] = useState<ScanResult | null>(null);
   const [isScanModalOpen, setIsScanModalOpen] = useState(false);
   const [loading, setLoading] = useState(false);
-  const [searchTerm, setSearchTerm] = useState('');
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
 
   // Settings State
@@ -112,14 +169,15 @@ function App() {
 
 
   // Handle Backend Verification
-  const verifyQrCode = async (qrText: string) => {
+  const verifyQrCode = async (qrText: string, local: LocalVerdict | null = null) => {
     setLoading(true);
     setView('dashboard'); // Switch back to dashboard to show result
     setIsScanModalOpen(true); // Open result modal
 
     try {
-      const response = await axios.post(`${API_URL}/scan_qr`, { qr_text: qrText });
-      const result = { ...response.data, timestamp: new Date().toLocaleTimeString() };
+      // Verified and blacklisted merchants are decided from the synced trust list, without a round trip
+      const verdict = local ?? (await axios.post(`${API_URL}/scan_qr`, { qr_text: qrText })).data;
+      const result = { ...verdict, timestamp: new Date().toLocaleTimeString() };
       setScanResult(result);
 
       // Voice Alert & Toast Notification
@@ -133,6 +191,17 @@ function App() {
         toast.error('High Risk Threat Blocked!', {
           style: { background: '#1e293b', color: '#ef4444', border: '1px solid #ef4444' }
         });
+      } else if (result.status === 'SUSPICIOUS') {
+        // Looks like a verified merchant's ID: a warning, not a block
+        if (voiceAlerts) {
+          const utterance = new SpeechSynthesisUtterance("Caution. This payee imitates a known merchant.");
+          window.speechSynthesis.speak(utterance);
+        }
+
+        toast('Possible Impersonation: Check the Payee', {
+          icon: '⚠️',
+          style: { background: '#1e293b', color: '#eab308', border: '1px solid #eab308' }
+        });
       } else {
         // Voice Alert
         if (voiceAlerts) {
@@ -176,10 +245,8 @@ function App() {
     setScanResult(null);
   };
 
-  const filteredMerchants = merchants.filter(m =>
-    m.legal_name?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    m.upi_id?.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  // Already filtered by the backend (`q` parameter)
+  const filteredMerchants = merchants;
 
   return (
     <div className="flex h-screen bg-slate-950 text-slate-200 font-sans overflow-hidden selection:bg-blue-500/30">
@@ -287,6 +354,7 @@ function App() {
       {view === 'scanner' ? (
         <div className="flex-1 relative bg-black">
           <LiveScanner
+            apiUrl={API_URL}
             onScan={verifyQrCode}
             onClose={() => setView('dashboard')}
           />
@@ -340,24 +408,24 @@ function App() {
                   <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
                     <StatsCard
                       title="Total Scans"
-                      value="1,240"
+                      value={stats ? stats.scans.total.toLocaleString() : '—'}
                       icon={Activity}
                       color="blue"
-                      trend="+12% today"
+                      trend={stats ? `+${stats.scans.today.scans.toLocaleString()} today` : ''}
                     />
                     <StatsCard
-                      title="Fraud Prevented"
-                      value="$45,000"
+                      title="Threats Blocked Today"
+                      value={stats ? stats.scans.today.blocked.toLocaleString() : '—'}
                       icon={ShieldAlert}
                       color="indigo"
-                      trend="+$2.4k saved"
+                      trend={stats ? `${stats.merchants.threats_added_today} new threats found` : ''}
                     />
                     <StatsCard
-                      title="Active Threats"
-                      value="2"
+                      title="Known Threats"
+                      value={stats ? (stats.merchants.blacklisted + stats.merchants.risky).toLocaleString() : '—'}
                       icon={Scan}
                       color="red"
-                      trend="Low Level"
+                      trend={stats ? `${(stats.merchants.fraud_ratio * 100).toFixed(1)}% of merchants` : ''}
                     />
                   </div>
 
@@ -405,23 +473,21 @@ function App() {
                         Live Feed
                       </h3>
                       <div className="flex-1 space-y-4 overflow-y-auto pr-2 custom-scrollbar">
-                        {MOCK_RECENT_ACTIVITY.map((activity) => (
-                          <div key={activity.id} className="p-3 rounded-lg bg-slate-950 border border-slate-800/50 hover:border-slate-700 transition-colors">
+                        {threats.map((threat) => (
+                          <div key={threat.id} className="p-3 rounded-lg bg-slate-950 border border-slate-800/50 hover:border-slate-700 transition-colors">
                             <div className="flex justify-between items-start mb-1">
-                              <span className={`text-xs font-bold px-2 py-0.5 rounded ${activity.type === 'block'
-                                ? 'bg-red-500/10 text-red-500 border border-red-500/20'
-                                : 'bg-green-500/10 text-green-500 border border-green-500/20'
-                                }`}>
-                                {activity.type === 'block' ? 'BLOCKED' : 'VERIFIED'}
+                              <span className="text-xs font-bold px-2 py-0.5 rounded bg-red-500/10 text-red-500 border border-red-500/20">
+                                BLOCKED
                               </span>
-                              <span className="text-[10px] text-slate-500">{activity.time}</span>
+                              <span className="text-[10px] text-slate-500">{new Date(threat.ts * 1000).toLocaleTimeString()}</span>
                             </div>
-                            <p className="text-sm font-medium text-slate-300 line-clamp-1">{activity.message}</p>
-                            {activity.amount !== 'N/A' && (
-                              <p className="text-xs text-slate-500 mt-1">{activity.amount}</p>
-                            )}
+                            <p className="text-sm font-medium text-slate-300 line-clamp-1">{threat.upi_id}</p>
+                            <p className="text-xs text-slate-500 mt-1 line-clamp-1">{threat.message}</p>
                           </div>
                         ))}
+                        {threats.length === 0 && (
+                          <p className="text-sm text-slate-500 text-center py-8">Watching for new threats…</p>
+                        )}
                       </div>
                     </div>
                   </div>
@@ -479,6 +545,7 @@ function App() {
                       <input
                         type="text"
                         placeholder="Search merchants..."
+                        title="One or two characters match the start of an ID or name; three or more match anywhere"
                         value={searchTerm}
                         onChange={(e) => setSearchTerm(e.target.value)}
                         className="bg-slate-900 border border-slate-700 rounded-lg pl-10 pr-4 py-2 text-sm focus:outline-none focus:border-blue-500/50 w-full md:w-64 text-white"
@@ -536,6 +603,14 @@ function App() {
                         </tbody>
                       </table>
                     </div>
+                    {nextCursor !== null && (
+                      <button
+                        onClick={() => fetchMerchants(nextCursor)}
+                        className="w-full py-3 text-sm font-medium text-blue-400 hover:bg-slate-800/50 border-t border-slate-800 transition-colors"
+                      >
+                        Load more
+                      </button>
+                    )}
                   </div>
                 </div>
               ) : view === 'settings' ? (
@@ -776,14 +851,17 @@ function App() {
                   </div>
                 ) : scanResult ? (
                   <div>
-                    <div className={`w-20 h-20 rounded-full mx-auto mb-6 flex items-center justify-center ${scanResult.status === 'FRAUD' ? 'bg-red-500/10 text-red-500' : 'bg-emerald-500/10 text-emerald-500'
+                    <div className={`w-20 h-20 rounded-full mx-auto mb-6 flex items-center justify-center ${scanResult.status === 'FRAUD' ? 'bg-red-500/10 text-red-500'
+                      : scanResult.status === 'SUSPICIOUS' ? 'bg-yellow-500/10 text-yellow-500' : 'bg-emerald-500/10 text-emerald-500'
                       }`}>
-                      {scanResult.status === 'FRAUD' ? <ShieldAlert className="w-10 h-10" /> : <ShieldCheck className="w-10 h-10" />}
+                      {scanResult.status === 'SAFE' ? <ShieldCheck className="w-10 h-10" /> : <ShieldAlert className="w-10 h-10" />}
                     </div>
 
-                    <h2 className={`text-2xl font-bold mb-2 ${scanResult.status === 'FRAUD' ? 'text-red-500' : 'text-emerald-400'
+                    <h2 className={`text-2xl font-bold mb-2 ${scanResult.status === 'FRAUD' ? 'text-red-500'
+                      : scanResult.status === 'SUSPICIOUS' ? 'text-yellow-500' : 'text-emerald-400'
                       }`}>
-                      {scanResult.status === 'FRAUD' ? 'THREAT DETECTED' : 'TRANSACTION VERIFIED'}
+                      {scanResult.status === 'FRAUD' ? 'THREAT DETECTED'
+                        : scanResult.status === 'SUSPICIOUS' ? 'POSSIBLE IMPERSONATION' : 'TRANSACTION VERIFIED'}
                     </h2>
 
                     <p className="text-slate-300 font-medium text-lg mb-6">{scanResult.message}</p>
@@ -795,7 +873,8 @@ function App() {
                       </div>
                       <div className="w-full h-2 bg-slate-800 rounded-full overflow-hidden">
                         <div
-                          className={`h-full transition-all duration-1000 ${scanResult.status === 'FRAUD' ? 'bg-red-500' : 'bg-emerald-500'
+                          className={`h-full transition-all duration-1000 ${scanResult.status === 'FRAUD' ? 'bg-red-500'
+                            : scanResult.status === 'SUSPICIOUS' ? 'bg-yellow-500' : 'bg-emerald-500'
                             }`}
                           style={{ width: `${scanResult.score}%` }}
                         ></div>
@@ -1,18 +1,28 @@
 import { Scanner } from '@yudiel/react-qr-scanner';
 import { X, Camera, Zap } from 'lucide-react';
 import { motion } from 'framer-motion';
+import { useEffect } from 'react';
+import { localVerdict, syncTrustList, type LocalVerdict } from '../trustList';
 
 interface LiveScannerProps {
-    onScan: (data: string) => void;
+    apiUrl: string;
+    // `local` is the verdict from the synced trust list, or null when the server has to decide
+    onScan: (data: string, local: LocalVerdict | null) => void;
     onClose: () => void;
 }
 
-export default function LiveScanner({ onScan, onClose }: LiveScannerProps) {
+export default function LiveScanner({ apiUrl, onScan, onClose }: LiveScannerProps) {
+
+    // Catch up on blacklist/whitelist changes while the camera starts (a 304 if nothing changed)
+    useEffect(() => {
+        syncTrustList(apiUrl).catch(e => console.warn("Trust list sync failed:", e));
+    }, [apiUrl]);
 
     const handleScan = (result: any[]) => {
         if (result && result.length > 0) {
             // Optional: Play beep sound here if desired
-            onScan(result[0].rawValue);
+            const raw = result[0].rawValue;
+            onScan(raw, localVerdict(raw));
         }
     };
 
@@ -0,0 +1,114 @@
+// Offline copy of the server's blacklist and whitelist (trust_score 0 and 100),
+// kept current with /sync/trust_list deltas so scans of listed merchants need no round trip.
+
+const STORAGE_KEY = 'smartshield.trustList';
+const VPA_RE = /^[a-z0-9][a-z0-9._-]*@[a-z0-9][a-z0-9._-]*$/;
+const MAX_VPA_LENGTH = 255;
+
+interface TrustList {
+  version: number;
+  blocked: Record<string, string>; // upi_id -> legal name
+  verified: Record<string, string>;
+}
+
+interface TrustListResponse {
+  version: number;
+  full: boolean;
+  blocked: [string, string][];
+  verified: [string, string][];
+  removed?: string[];
+}
+
+export interface LocalVerdict {
+  status: string;
+  score: number;
+  message: string;
+}
+
+let list: TrustList | null = load();
+
+function load(): TrustList | null {
+  try {
+    const saved = localStorage.getItem(STORAGE_KEY);
+    return saved ? JSON.parse(saved) : null;
+  } catch {
+    return null;
+  }
+}
+
+function apply(current: TrustList | null, update: TrustListResponse): TrustList {
+  const next: TrustList = update.full || !current
+    ? { version: update.version, blocked: {}, verified: {} }
+    : { version: update.version, blocked: { ...current.blocked }, verified: { ...current.verified } };
+  for (const upiId of update.removed ?? []) {
+    delete next.blocked[upiId];
+    delete next.verified[upiId];
+  }
+  // An ID moving between lists arrives once, under the list it is in now
+  for (const [upiId, name] of update.blocked) {
+    delete next.verified[upiId];
+    next.blocked[upiId] = name;
+  }
+  for (const [upiId, name] of update.verified) {
+    delete next.blocked[upiId];
+    next.verified[upiId] = name;
+  }
+  return next;
+}
+
+// Fetch what changed since our version (the full lists the first time); an unchanged list is a bodiless 304
+export async function syncTrustList(apiUrl: string): Promise<void> {
+  const headers: Record<string, string> = {};
+  let url = `${apiUrl}/sync/trust_list`;
+  if (list) {
+    url += `?since=${list.version}`;
+    headers['If-None-Match'] = `"${list.version}"`;
+  }
+  const response = await fetch(url, { headers });
+  if (response.status === 304 || !response.ok) return;
+  list = apply(list, await response.json());
+  try {
+    localStorage.setItem(STORAGE_KEY, JSON.stringify(list));
+  } catch {
+    // Storage full or unavailable: keep the in-memory copy for this session
+  }
+}
+
+// Mirrors backend/upi_parser.py: the pa= of a upi:// link (or its path), else the bare text
+export function canonicalUpiId(qrText: string): string | null {
+  const text = qrText.trim();
+  let candidate = text;
+  if (text.slice(0, 6).toLowerCase() === 'upi://') {
+    const rest = text.slice(6);
+    const mark = rest.indexOf('?');
+    const query = mark === -1 ? '' : rest.slice(mark + 1);
+    candidate = mark === -1 ? rest : rest.slice(0, mark);
+    for (const pair of query.split('&')) {
+      const [key, ...value] = pair.split('=');
+      if (key.toLowerCase() === 'pa') {
+        candidate = value.join('=');
+        break;
+      }
+    }
+    try {
+      candidate = decodeURIComponent(candidate.replace(/\+/g, ' '));
+    } catch {
+      return null;
+    }
+  }
+  const vpa = candidate.trim().toLowerCase();
+  return vpa.length <= MAX_VPA_LENGTH && VPA_RE.test(vpa) ? vpa : null;
+}
+
+// Same verdicts /scan_qr gives listed merchants, or null when only the server can decide
+export function localVerdict(qrText: string): LocalVerdict | null {
+  const upiId = list && canonicalUpiId(qrText);
+  if (!list || !upiId) return null;
+  if (upiId in list.verified) {
+    return { status: 'SAFE', score: 100, message: `SAFE - Verified Merchant: ${list.verified[upiId]}` };
+  }
+  if (upiId in list.blocked) {
+    return { status: 'FRAUD', score: 0, message: `DANGER - Known Fraud: ${list.blocked[upiId]}` };
+  }
+  return null;
+}